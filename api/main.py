@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from api.routes import users, keys, coupons, servers, tariffs, gifts, referrals, misc
+from api.routes import users, keys, coupons, servers, tariffs, gifts, referrals, misc, exports
 
 app = FastAPI(
     title="SoloBot API (preAlpha)",
@@ -18,6 +18,7 @@ app.include_router(tariffs.router, prefix="/api/tariffs", tags=["Tariffs"])
 app.include_router(gifts.router, prefix="/api/gifts", tags=["Gifts"])
 app.include_router(referrals.router, prefix="/api/referrals", tags=["Referrals"])
 app.include_router(misc.router, prefix="/api")
+app.include_router(exports.router, prefix="/api/exports", tags=["Exports"])
 
 
 @app.get("/api", include_in_schema=False)
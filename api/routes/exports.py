@@ -0,0 +1,69 @@
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from api.depends import verify_admin_token
+from database import async_session_maker
+from utils.csv_export import (
+    HOT_LEADS_HEADER,
+    KEYS_HEADER,
+    PAYMENTS_HEADER,
+    USERS_HEADER,
+    format_key_row,
+    hot_leads_export_query,
+    iter_csv_chunks,
+    keys_export_query,
+    payments_export_query,
+    users_export_query,
+)
+
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+
+def stream_export(
+    query: Select,
+    header: Sequence[str],
+    filename: str,
+    compress: bool,
+    row_formatter: Callable[[Any], Sequence[Any]] | None = None,
+) -> StreamingResponse:
+    async def body() -> AsyncIterator[bytes]:
+        async with async_session_maker() as session:
+            async for chunk in iter_csv_chunks(session, query, header, row_formatter, compress):
+                yield chunk
+
+    if compress:
+        filename = f"{filename}.gz"
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip" if compress else "text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/users.csv")
+async def export_users(gzip: bool = Query(False, description="Сжать файл gzip")):
+    return stream_export(users_export_query(), USERS_HEADER, "users_export.csv", gzip)
+
+
+@router.get("/payments.csv")
+async def export_payments(
+    tg_id: int | None = Query(None, alias="user_tg_id", description="Только платежи пользователя"),
+    gzip: bool = Query(False, description="Сжать файл gzip"),
+):
+    filename = f"payments_export_{tg_id}.csv" if tg_id else "payments_export.csv"
+    return stream_export(payments_export_query(tg_id), PAYMENTS_HEADER, filename, gzip)
+
+
+@router.get("/hot_leads.csv")
+async def export_hot_leads(gzip: bool = Query(False, description="Сжать файл gzip")):
+    return stream_export(hot_leads_export_query(), HOT_LEADS_HEADER, "hot_leads_export.csv", gzip)
+
+
+@router.get("/keys.csv")
+async def export_keys(gzip: bool = Query(False, description="Сжать файл gzip")):
+    return stream_export(keys_export_query(), KEYS_HEADER, "keys_export.csv", gzip, row_formatter=format_key_row)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
+from collections.abc import AsyncGenerator
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -24,6 +26,14 @@ from database.models import (
     TemporaryData,
     TrackingSource,
 )
+from utils.identity_cache import invalidate_ban
+
+
+async def invalidate_ban_on_write(request: Request) -> AsyncGenerator[None, None]:
+    yield
+    if request.method != "GET":
+        tg_id = request.path_params.get("tg_id", "")
+        invalidate_ban(int(tg_id) if tg_id.isdigit() else None)
 
 
 router = APIRouter()
@@ -96,7 +106,7 @@ router.include_router(
     ),
     prefix="/manual-bans",
     tags=["Bans"],
-    dependencies=[Depends(verify_admin_token)],
+    dependencies=[Depends(verify_admin_token), Depends(invalidate_ban_on_write)],
 )
 
 router.include_router(
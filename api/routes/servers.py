@@ -1,16 +1,29 @@
-from fastapi import APIRouter
+from collections.abc import AsyncGenerator
+
+from fastapi import APIRouter, Depends, Request
 
 from api.routes.base_crud import generate_crud_router
 from api.schemas import ServerBase, ServerResponse, ServerUpdate
+from database import invalidate_servers_cache
 from database.models import Server
 
 
-router: APIRouter = generate_crud_router(
-    model=Server,
-    schema_response=ServerResponse,
-    schema_create=ServerBase,
-    schema_update=ServerUpdate,
-    identifier_field="server_name",
-    parameter_name="server_name",
-    enabled_methods=["get_all", "get_one", "create", "update", "delete"],
+async def invalidate_servers_on_write(request: Request) -> AsyncGenerator[None, None]:
+    yield
+    if request.method != "GET":
+        invalidate_servers_cache()
+
+
+router = APIRouter(dependencies=[Depends(invalidate_servers_on_write)])
+
+router.include_router(
+    generate_crud_router(
+        model=Server,
+        schema_response=ServerResponse,
+        schema_create=ServerBase,
+        schema_update=ServerUpdate,
+        identifier_field="server_name",
+        parameter_name="server_name",
+        enabled_methods=["get_all", "get_one", "create", "update", "delete"],
+    )
 )
@@ -1,6 +1,8 @@
 import asyncio
 
-from fastapi import Depends, HTTPException, Path
+from collections.abc import AsyncGenerator
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -11,15 +13,27 @@ from database import delete_user_data, get_servers
 from database.models import Key, User
 from handlers.keys.operations import delete_key_from_cluster
 from logger import logger
+from utils.identity_cache import invalidate_user
+
+
+async def invalidate_user_on_write(request: Request) -> AsyncGenerator[None, None]:
+    yield
+    if request.method != "GET":
+        tg_id = request.path_params.get("tg_id", "")
+        invalidate_user(int(tg_id) if tg_id.isdigit() else None)
+
 
+router = APIRouter(dependencies=[Depends(invalidate_user_on_write)])
 
-router = generate_crud_router(
-    model=User,
-    schema_response=UserResponse,
-    schema_create=UserBase,
-    schema_update=UserUpdate,
-    identifier_field="tg_id",
-    enabled_methods=["get_all", "get_one", "get_by_email", "create", "update"],
+router.include_router(
+    generate_crud_router(
+        model=User,
+        schema_response=UserResponse,
+        schema_create=UserBase,
+        schema_update=UserUpdate,
+        identifier_field="tg_id",
+        enabled_methods=["get_all", "get_one", "get_by_email", "create", "update"],
+    )
 )
 
 
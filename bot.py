@@ -9,16 +9,23 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BufferedInputFile, ErrorEvent
 from aiogram.utils.markdown import hbold
 
+import config as cfg
+
 from config import ADMIN_ID, API_TOKEN
 from database import async_session_maker
 from filters.private import IsPrivateFilter
 from logger import logger
+from utils.fsm_storage import PostgresStorage
 from utils.modules_loader import load_modules_from_folder, modules_hub
 
 
 bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-storage = MemoryStorage()
+# FSM_STORAGE = "postgres" хранит состояния FSM в таблице fsm_states: они переживают перезапуск и общие для
+# нескольких воркеров. По умолчанию "memory" — MemoryStorage в памяти процесса. Для "postgres" также
+# читаются FSM_CACHE_TTL (60 с), FSM_FLUSH_INTERVAL (0.5 с) и FSM_STATE_TTL_DAYS (7 дней).
+storage = PostgresStorage() if getattr(cfg, "FSM_STORAGE", "memory") == "postgres" else MemoryStorage()
 dp = Dispatcher(bot=bot, storage=storage)
+dp.shutdown.register(storage.close)
 
 dp.include_router(modules_hub)
 
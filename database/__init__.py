@@ -1,15 +1,21 @@
 from .bans import *
+from .broadcasts import *
 from .coupons import *
 from .db import async_session_maker
+from .fsm_states import *
+from .fx_rates import *
 from .gifts import *
 from .hot_leads import *
 from .init_db import *
 from .keys import *
+from .media_files import *
 from .notifications import *
+from .payment_events import *
 from .payments import *
 from .referrals import *
 from .servers import *
 from .statistics import *
+from .sync_jobs import *
 from .tariffs import *
 from .temporary_data import *
 from .tracking_sources import *
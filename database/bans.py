@@ -8,3 +8,15 @@ async def create_blocked_user(session: AsyncSession, tg_id: int):
     stmt = insert(BlockedUser).values(tg_id=tg_id).on_conflict_do_nothing(index_elements=[BlockedUser.tg_id])
     await session.execute(stmt)
     await session.commit()
+
+
+async def create_blocked_users(session: AsyncSession, tg_ids: list[int]):
+    if not tg_ids:
+        return
+    stmt = (
+        insert(BlockedUser)
+        .values([{"tg_id": tg_id} for tg_id in set(tg_ids)])
+        .on_conflict_do_nothing(index_elements=[BlockedUser.tg_id])
+    )
+    await session.execute(stmt)
+    await session.commit()
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import BroadcastJob, BroadcastRecipient
+from logger import logger
+
+
+BROADCAST_ACTIVE_STATUSES = ("running", "paused")
+BROADCAST_INSERT_CHUNK = 5000
+
+
+async def create_broadcast_job(
+    session: AsyncSession,
+    tg_ids: list[int],
+    text: str,
+    photo: str | None = None,
+    keyboard: dict | None = None,
+    send_to: str = "all",
+    cluster_name: str | None = None,
+    created_by: int | None = None,
+) -> int:
+    job = BroadcastJob(
+        status="running",
+        send_to=send_to,
+        cluster_name=cluster_name,
+        text=text,
+        photo=photo,
+        keyboard=keyboard,
+        total=len(tg_ids),
+        created_by=created_by,
+    )
+    session.add(job)
+    await session.flush()
+
+    for i in range(0, len(tg_ids), BROADCAST_INSERT_CHUNK):
+        chunk = tg_ids[i : i + BROADCAST_INSERT_CHUNK]
+        stmt = insert(BroadcastRecipient).values([{"job_id": job.id, "tg_id": tg_id} for tg_id in chunk])
+        await session.execute(stmt.on_conflict_do_nothing())
+
+    await session.commit()
+    logger.info(f"[Broadcast] Создана рассылка #{job.id} на {len(tg_ids)} получателей")
+    return job.id
+
+
+async def get_broadcast_job(session: AsyncSession, job_id: int) -> BroadcastJob | None:
+    result = await session.execute(select(BroadcastJob).where(BroadcastJob.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def get_broadcast_job_status(session: AsyncSession, job_id: int) -> str | None:
+    result = await session.execute(select(BroadcastJob.status).where(BroadcastJob.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def get_active_broadcast_jobs(session: AsyncSession) -> list[BroadcastJob]:
+    result = await session.execute(
+        select(BroadcastJob).where(BroadcastJob.status.in_(BROADCAST_ACTIVE_STATUSES)).order_by(BroadcastJob.id)
+    )
+    return result.scalars().all()
+
+
+async def set_broadcast_job_status(session: AsyncSession, job_id: int, status: str):
+    values = {"status": status, "updated_at": datetime.utcnow()}
+    if status in ("completed", "cancelled"):
+        values["finished_at"] = datetime.utcnow()
+    await session.execute(update(BroadcastJob).where(BroadcastJob.id == job_id).values(**values))
+    await session.commit()
+    logger.info(f"[Broadcast] Статус рассылки #{job_id}: {status}")
+
+
+async def get_pending_broadcast_recipients(
+    session: AsyncSession, job_id: int, limit: int, after_tg_id: int | None = None
+) -> list[int]:
+    stmt = select(BroadcastRecipient.tg_id).where(
+        BroadcastRecipient.job_id == job_id, BroadcastRecipient.status == "pending"
+    )
+    if after_tg_id is not None:
+        stmt = stmt.where(BroadcastRecipient.tg_id > after_tg_id)
+    result = await session.execute(stmt.order_by(BroadcastRecipient.tg_id).limit(limit))
+    return list(result.scalars().all())
+
+
+async def save_broadcast_results(session: AsyncSession, job_id: int, sent_ids: list[int], failed_ids: list[int]):
+    for status, ids in (("sent", sent_ids), ("failed", failed_ids)):
+        if ids:
+            await session.execute(
+                update(BroadcastRecipient)
+                .where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.tg_id.in_(ids))
+                .values(status=status)
+            )
+    await session.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.id == job_id)
+        .values(
+            sent=BroadcastJob.sent + len(sent_ids),
+            failed=BroadcastJob.failed + len(failed_ids),
+            updated_at=datetime.utcnow(),
+        )
+    )
+    await session.commit()
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import String, bindparam, delete, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import FsmState
+
+
+FSM_NOTIFY_CHANNEL = "fsm_states"
+
+_notify_stmt = text("SELECT pg_notify(:channel, :sender || ' ' || key) FROM unnest(:keys) AS key").bindparams(
+    bindparam("keys", type_=ARRAY(String))
+)
+
+
+async def get_fsm_record(session: AsyncSession, key: str) -> tuple[str | None, dict[str, Any]] | None:
+    result = await session.execute(select(FsmState.state, FsmState.data).where(FsmState.key == key))
+    row = result.one_or_none()
+    if row is None:
+        return None
+    return row.state, row.data or {}
+
+
+async def save_fsm_records(
+    session: AsyncSession,
+    states: dict[str, str | None],
+    data: dict[str, dict[str, Any]],
+    sender: str = "",
+):
+    """
+    Сохраняет состояния и данные FSM одной транзакцией.
+
+    Состояние и данные обновляются отдельными колонками, поэтому запись одного не затирает другое,
+    записанное другим воркером. Строки без состояния и данных удаляются. Об изменённых ключах
+    сообщается через NOTIFY в канал FSM_NOTIFY_CHANNEL с префиксом sender.
+    """
+    now = datetime.utcnow()
+
+    if states:
+        stmt = insert(FsmState).values([
+            {"key": key, "state": state, "data": {}, "updated_at": now} for key, state in states.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={"state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at},
+        )
+        await session.execute(stmt)
+
+    if data:
+        stmt = insert(FsmState).values([
+            {"key": key, "state": None, "data": values, "updated_at": now} for key, values in data.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        )
+        await session.execute(stmt)
+
+    keys = sorted(states.keys() | data.keys())
+    if keys:
+        await session.execute(
+            delete(FsmState).where(FsmState.key.in_(keys), FsmState.state.is_(None), FsmState.data == {})
+        )
+        await session.execute(_notify_stmt, {"channel": FSM_NOTIFY_CHANNEL, "sender": sender, "keys": keys})
+    await session.commit()
+
+
+async def delete_expired_fsm_records(session: AsyncSession, older_than: datetime) -> int:
+    result = await session.execute(delete(FsmState).where(FsmState.updated_at < older_than))
+    await session.commit()
+    return result.rowcount or 0
@@ -0,0 +1,37 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import FxRate
+from logger import logger
+
+
+async def get_fx_rates(session: AsyncSession) -> tuple[dict[str, Decimal], datetime | None]:
+    """Последний сохранённый снимок курсов ЦБ: рублей за единицу валюты и время загрузки."""
+    result = await session.execute(select(FxRate.code, FxRate.rub_per_unit, FxRate.fetched_at))
+    rows = result.all()
+    rates = {code: Decimal(str(rub_per_unit)) for code, rub_per_unit, _ in rows}
+    fetched_at = min((fetched_at for _, _, fetched_at in rows), default=None)
+    return rates, fetched_at
+
+
+async def save_fx_rates(session: AsyncSession, rates: dict[str, Decimal], fetched_at: datetime):
+    if not rates:
+        return
+    try:
+        stmt = insert(FxRate).values([
+            {"code": code, "rub_per_unit": rub_per_unit, "fetched_at": fetched_at} for code, rub_per_unit in rates.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FxRate.code],
+            set_={"rub_per_unit": stmt.excluded.rub_per_unit, "fetched_at": stmt.excluded.fetched_at},
+        )
+        await session.execute(stmt)
+        await session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"❌ Ошибка при сохранении курсов валют: {e}")
+        await session.rollback()
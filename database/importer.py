@@ -1,123 +1,280 @@
+import asyncio
 import json
 import sqlite3
 import time
 
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
 from datetime import datetime
 from itertools import cycle
 
-from sqlalchemy import select
-from sqlalchemy.exc import SQLAlchemyError
+from dateutil import parser
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, and_, exists, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import USE_COUNTRY_SELECTION
 from database.models import Key, Server, User
+from logger import logger
 
 
-async def import_keys_from_3xui_db(db_path: str, session: AsyncSession) -> tuple[int, int]:
-    imported = 0
-    skipped = 0
+IMPORT_BATCH_SIZE = 5000
 
-    if USE_COUNTRY_SELECTION:
-        result = await session.execute(
-            select(Server.server_name).where(Server.enabled.is_(True), Server.panel_type == "3x-ui")
-        )
-    else:
-        result = await session.execute(
-            select(Server.cluster_name)
-            .where(Server.enabled.is_(True), Server.panel_type == "3x-ui", Server.cluster_name.isnot(None))
-            .distinct()
-        )
+ImportProgress = Callable[[int, int], Awaitable[None]]
 
-    server_ids = [row[0] for row in result.fetchall()]
-    if not server_ids:
-        raise RuntimeError("❌ Не найдено доступных серверов или кластеров для 3x-ui")
+_stage = Table(
+    "import_keys_stage",
+    MetaData(),
+    Column("tg_id", BigInteger),
+    Column("client_id", String),
+    Column("email", String),
+    Column("created_at", BigInteger),
+    Column("expiry_time", BigInteger),
+    Column("server_id", String),
+    Column("remnawave_link", String),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта или пробного прогона: сколько записей прочитано и что изменится в базе."""
+
+    total: int = 0
+    new_users: int = 0
+    new_keys: int = 0
+    existing_keys: int = 0
+    conflicts: int = 0
+    dry_run: bool = False
+
+    @property
+    def skipped(self) -> int:
+        return self.existing_keys + self.conflicts
 
-    server_cycle = cycle(server_ids)
 
+def read_3xui_clients(db_path: str) -> list[dict]:
+    """Читает клиентов из SQLite-базы 3x-ui. Блокирующая функция, вызывается в отдельном потоке."""
     try:
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, remark, settings FROM inbounds")
-        inbounds = cursor.fetchall()
+        try:
+            inbounds = conn.execute("SELECT id, remark, settings FROM inbounds").fetchall()
+        finally:
+            conn.close()
     except Exception as e:
         raise RuntimeError(f"Не удалось прочитать SQLite: {e}")
-    finally:
-        conn.close()
 
-    parsed_clients = []
-    for inbound_id, _remark, settings_raw in inbounds:
+    now_ts = int(time.time() * 1000)
+    rows = []
+    for _inbound_id, _remark, settings_raw in inbounds:
         try:
-            settings = json.loads(settings_raw)
-            clients = settings.get("clients", [])
-            for c in clients:
-                expiry = c.get("expiryTime")
-                c["expiryTime"] = int(float(expiry)) if expiry else 0
-                c["limitIp"] = int(c.get("limitIp", 0) or 0)
-                c["inbound_id"] = inbound_id
-                parsed_clients.append(c)
+            clients = json.loads(settings_raw).get("clients", [])
         except Exception:
             continue
+        for c in clients:
+            tg_id = c.get("tgId")
+            client_id = c.get("id")
+            if not tg_id or not client_id:
+                continue
+            try:
+                expiry = c.get("expiryTime")
+                rows.append({
+                    "tg_id": int(tg_id),
+                    "client_id": str(client_id),
+                    "email": c.get("email"),
+                    "created_at": now_ts,
+                    "expiry_time": int(float(expiry)) if expiry else now_ts,
+                    "remnawave_link": None,
+                })
+            except (TypeError, ValueError):
+                continue
+    return rows
 
-    now_ts = int(time.time() * 1000)
-
-    for c in parsed_clients:
-        tg_id = c.get("tgId")
-        client_id = str(c.get("id"))
-        email = c.get("email")
-        expiry_time = int(c.get("expiryTime") or now_ts)
-        created_at = now_ts
-        server_id = next(server_cycle)
 
+def parse_remnawave_users(users: list[dict]) -> list[dict]:
+    """Приводит пользователей Remnawave к строкам импорта ключей."""
+    now_ts = int(time.time() * 1000)
+    rows = []
+    for user in users:
+        tg_id = user.get("telegramId")
+        client_id = user.get("uuid")
         if not tg_id or not client_id:
+            logger.warning(f"[Import] Пропущен клиент: tg_id={tg_id}, client_id={client_id}")
             continue
+        try:
+            created_at = user.get("createdAt")
+            expire_at = user.get("expireAt")
+            rows.append({
+                "tg_id": int(tg_id),
+                "client_id": str(client_id),
+                "email": user.get("email") or user.get("username"),
+                "created_at": int(parser.isoparse(created_at).timestamp() * 1000) if created_at else now_ts,
+                "expiry_time": int(parser.isoparse(expire_at).timestamp() * 1000) if expire_at else now_ts,
+                "remnawave_link": user.get("subscriptionUrl"),
+            })
+        except (TypeError, ValueError) as e:
+            logger.error(f"[Import] Ошибка разбора клиента {client_id}: {e}")
+    return rows
 
-        user_exists = await session.execute(select(User).where(User.tg_id == tg_id))
-        if not user_exists.scalar():
-            try:
-                session.add(
-                    User(
-                        tg_id=tg_id,
-                        username=None,
-                        first_name=None,
-                        last_name=None,
-                        language_code=None,
-                        is_bot=False,
-                        balance=0.0,
-                        trial=1,
-                        source_code=None,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow(),
-                    )
-                )
-            except SQLAlchemyError:
-                continue
 
-        key_exists = await session.execute(select(Key).where(Key.client_id == client_id))
-        if key_exists.scalar():
-            skipped += 1
-            continue
+async def bulk_import_keys(
+    session: AsyncSession,
+    rows: list[dict],
+    dry_run: bool = False,
+    progress: ImportProgress | None = None,
+) -> ImportResult:
+    """
+    Импортирует пользователей и ключи пачками через временную таблицу.
 
-        try:
-            session.add(
-                Key(
-                    tg_id=tg_id,
-                    client_id=client_id,
-                    email=email,
-                    created_at=created_at,
-                    expiry_time=expiry_time,
-                    key="",
-                    server_id=server_id,
-                    remnawave_link=None,
-                    tariff_id=None,
-                    is_frozen=False,
-                    alias=None,
-                    notified=False,
-                    notified_24h=False,
-                )
+    Строки загружаются многострочными INSERT во временную таблицу, после чего пользователи и ключи
+    добавляются двумя запросами INSERT ... SELECT ... ON CONFLICT DO NOTHING. Существующие ключи и
+    записи с занятым email не меняются. При dry_run считается только разница, транзакция откатывается.
+    """
+    result = ImportResult(total=len(rows), dry_run=dry_run)
+    if not rows:
+        return result
+
+    try:
+        conn = await session.connection()
+        await conn.run_sync(_stage.create)
+
+        for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+            await session.execute(_stage.insert(), rows[start : start + IMPORT_BATCH_SIZE])
+            if progress:
+                await progress(min(start + IMPORT_BATCH_SIZE, len(rows)), len(rows))
+
+        staged = (
+            select(_stage)
+            .distinct(_stage.c.client_id)
+            .order_by(_stage.c.client_id, _stage.c.expiry_time.desc())
+            .subquery()
+        )
+        key_exists = exists().where(Key.client_id == staged.c.client_id)
+        email_taken = exists().where(Key.email == staged.c.email, Key.client_id != staged.c.client_id)
+
+        result.existing_keys = await session.scalar(select(func.count()).select_from(staged).where(key_exists))
+        result.conflicts = await session.scalar(
+            select(func.count()).select_from(staged).where(~key_exists, email_taken)
+        )
+
+        if dry_run:
+            result.new_users = await session.scalar(
+                select(func.count(func.distinct(_stage.c.tg_id))).where(~exists().where(User.tg_id == _stage.c.tg_id))
             )
-            imported += 1
-        except SQLAlchemyError:
-            continue
+            result.new_keys = await session.scalar(
+                select(func.count()).select_from(staged).where(~key_exists, ~email_taken)
+            )
+            await session.rollback()
+            return result
+
+        now = datetime.utcnow()
+        users_inserted = await session.execute(
+            insert(User)
+            .from_select(
+                ["tg_id", "is_bot", "balance", "trial", "created_at", "updated_at"],
+                select(
+                    _stage.c.tg_id,
+                    literal(False),
+                    literal(0.0),
+                    literal(1),
+                    literal(now),
+                    literal(now),
+                ).distinct(),
+            )
+            .on_conflict_do_nothing(index_elements=[User.tg_id])
+            .returning(User.tg_id)
+        )
+        result.new_users = len(users_inserted.all())
+
+        inserted = await session.execute(
+            insert(Key)
+            .from_select(
+                [
+                    "tg_id",
+                    "client_id",
+                    "email",
+                    "created_at",
+                    "expiry_time",
+                    "key",
+                    "server_id",
+                    "remnawave_link",
+                    "is_frozen",
+                    "notified",
+                    "notified_24h",
+                ],
+                select(
+                    staged.c.tg_id,
+                    staged.c.client_id,
+                    staged.c.email,
+                    staged.c.created_at,
+                    staged.c.expiry_time,
+                    literal(""),
+                    staged.c.server_id,
+                    staged.c.remnawave_link,
+                    literal(False),
+                    literal(False),
+                    literal(False),
+                ).where(and_(~key_exists, ~email_taken)),
+            )
+            .on_conflict_do_nothing()
+            .returning(Key.client_id)
+        )
+        result.new_keys = len(inserted.all())
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    logger.info(
+        f"[Import] Импортировано ключей: {result.new_keys}, пользователей: {result.new_users}, "
+        f"пропущено: {result.skipped} из {result.total}"
+    )
+    return result
+
+
+async def get_3xui_import_targets(session: AsyncSession) -> list[str]:
+    if USE_COUNTRY_SELECTION:
+        result = await session.execute(
+            select(Server.server_name).where(Server.enabled.is_(True), Server.panel_type == "3x-ui")
+        )
+    else:
+        result = await session.execute(
+            select(Server.cluster_name)
+            .where(Server.enabled.is_(True), Server.panel_type == "3x-ui", Server.cluster_name.isnot(None))
+            .distinct()
+        )
+
+    server_ids = [row[0] for row in result.fetchall()]
+    if not server_ids:
+        raise RuntimeError("❌ Не найдено доступных серверов или кластеров для 3x-ui")
+    return server_ids
+
+
+async def import_keys_from_3xui_db(
+    db_path: str,
+    session: AsyncSession,
+    dry_run: bool = False,
+    progress: ImportProgress | None = None,
+) -> ImportResult:
+    """Импортирует ключи из x-ui.db, распределяя их по доступным серверам или кластерам 3x-ui по кругу."""
+    server_ids = await get_3xui_import_targets(session)
+    rows = await asyncio.to_thread(read_3xui_clients, db_path)
+
+    server_cycle = cycle(server_ids)
+    for row in rows:
+        row["server_id"] = next(server_cycle)
+    return await bulk_import_keys(session, rows, dry_run=dry_run, progress=progress)
+
 
-    await session.commit()
-    return imported, skipped
+async def import_remnawave_keys(
+    session: AsyncSession,
+    users: list[dict],
+    server_id: str,
+    dry_run: bool = False,
+    progress: ImportProgress | None = None,
+) -> ImportResult:
+    """Импортирует пользователей и ключи из выгрузки пользователей Remnawave."""
+    rows = await asyncio.to_thread(parse_remnawave_users, users)
+    for row in rows:
+        row["server_id"] = server_id
+    return await bulk_import_keys(session, rows, dry_run=dry_run, progress=progress)
@@ -4,13 +4,15 @@ from sqlalchemy import select
 
 from config import ADMIN_ID
 from database.db import async_session_maker, engine
-from database.models import Admin, Base, User
+from database.models import Admin, Base, Key, User
 from database.tariffs import initialize_all_tariff_weights
 
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for index in Key.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
 
     async with async_session_maker() as session:
         result = await session.execute(select(User).where(User.tg_id == 0))
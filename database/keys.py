@@ -1,6 +1,10 @@
+import asyncio
+import time
+
+from collections.abc import AsyncIterator, Iterable
 from datetime import datetime
 
-from sqlalchemy import delete, func, select, text, update
+from sqlalchemy import ColumnElement, delete, func, or_, select, text, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,6 +12,42 @@ from database.models import Key, User
 from logger import logger
 
 
+KEY_LOAD_CACHE_TTL = 30
+KEY_SCAN_BATCH_SIZE = 500
+
+_key_load_cache: dict[str, int] | None = None
+_key_load_expires_at = 0.0
+_key_load_lock = asyncio.Lock()
+_key_versions: dict[str, int] = {}
+_keys_generation = 0
+_keys_changes = 0
+
+
+def invalidate_key_snapshots(emails: Iterable[str] | None = None):
+    """
+    Отмечает изменение ключей с указанными email: кеши, собранные по их данным, перестраиваются при следующем обращении.
+
+    При emails=None считаются изменёнными все ключи.
+    """
+    global _keys_generation, _keys_changes
+    _keys_changes += 1
+    if emails is None:
+        _keys_generation += 1
+        return
+    for email in emails:
+        if email:
+            _key_versions[email] = _key_versions.get(email, 0) + 1
+
+
+def get_key_version(email: str) -> tuple[int, int]:
+    return _keys_generation, _key_versions.get(email, 0)
+
+
+def get_keys_changes() -> int:
+    """Счётчик всех изменений ключей: по нему видно, что ключи менялись, пока шло чтение из базы."""
+    return _keys_changes
+
+
 async def store_key(
     session: AsyncSession,
     tg_id: int,
@@ -23,6 +63,7 @@ async def store_key(
     try:
         exists = await session.execute(select(Key).where(Key.tg_id == tg_id, Key.client_id == client_id))
         existing_key = exists.scalar_one_or_none()
+        previous_server_id = existing_key.server_id if existing_key else None
         
         if existing_key:
             await session.execute(
@@ -56,6 +97,14 @@ async def store_key(
             logger.info(f"[Store Key] Ключ создан: tg_id={tg_id}, client_id={client_id}, server_id={server_id}")
         
         await session.commit()
+        invalidate_key_snapshots([email, existing_key.email] if existing_key else [email])
+
+        if existing_key:
+            if previous_server_id != server_id:
+                adjust_key_load(previous_server_id, -1)
+                adjust_key_load(server_id, 1)
+        else:
+            adjust_key_load(server_id, 1)
 
     except SQLAlchemyError as e:
         logger.error(f"❌ Ошибка при сохранении ключа: {e}")
@@ -72,6 +121,49 @@ async def get_all_keys(session: AsyncSession):
     return result.scalars().all()
 
 
+async def iter_key_batches(
+    session: AsyncSession, *criteria: ColumnElement[bool], batch_size: int = KEY_SCAN_BATCH_SIZE
+) -> AsyncIterator[list[Key]]:
+    """
+    Потоково выбирает ключи по условиям пачками через серверный курсор.
+
+    Курсор живёт в транзакции сессии, поэтому сессию нельзя коммитить до конца обхода —
+    для записи используйте отдельную сессию.
+    """
+    stmt = select(Key).where(*criteria).order_by(Key.expiry_time).execution_options(yield_per=batch_size)
+    result = await session.stream_scalars(stmt)
+    async for batch in result.partitions():
+        yield batch
+
+
+def iter_expiring_keys(session: AsyncSession, after_ms: int, until_ms: int) -> AsyncIterator[list[Key]]:
+    """Незамороженные ключи, истекающие в окне (after_ms, until_ms]."""
+    return iter_key_batches(
+        session,
+        Key.is_frozen.isnot(True),
+        Key.expiry_time > after_ms,
+        Key.expiry_time <= until_ms,
+    )
+
+
+def iter_expired_keys(session: AsyncSession, before_ms: int) -> AsyncIterator[list[Key]]:
+    """Незамороженные ключи, истекшие до before_ms."""
+    return iter_key_batches(session, Key.is_frozen.isnot(True), Key.expiry_time > 0, Key.expiry_time < before_ms)
+
+
+def iter_unnotified_active_keys(
+    session: AsyncSession, created_before_ms: int, now_ms: int
+) -> AsyncIterator[list[Key]]:
+    """Действующие ключи без отметки notified, созданные раньше created_before_ms."""
+    return iter_key_batches(
+        session,
+        Key.is_frozen.isnot(True),
+        Key.notified.isnot(True),
+        Key.created_at <= created_before_ms,
+        or_(Key.expiry_time.is_(None), Key.expiry_time == 0, Key.expiry_time >= now_ms),
+    )
+
+
 async def get_key_by_server(session: AsyncSession, tg_id: int, client_id: str):
     stmt = select(Key).where(Key.tg_id == tg_id, Key.client_id == client_id)
     result = await session.execute(stmt)
@@ -125,15 +217,27 @@ async def get_key_count(session: AsyncSession, tg_id: int) -> int:
 
 
 async def delete_key(session: AsyncSession, identifier: int | str):
-    stmt = delete(Key).where(Key.tg_id == identifier if str(identifier).isdigit() else Key.client_id == identifier)
-    await session.execute(stmt)
+    stmt = (
+        delete(Key)
+        .where(Key.tg_id == identifier if str(identifier).isdigit() else Key.client_id == identifier)
+        .returning(Key.server_id, Key.email)
+    )
+    result = await session.execute(stmt)
+    deleted = result.all()
     await session.commit()
+    invalidate_key_snapshots(row.email for row in deleted)
+    for row in deleted:
+        adjust_key_load(row.server_id, -1)
     logger.info(f"Ключ с идентификатором {identifier} удалён")
 
 
 async def update_key_expiry(session: AsyncSession, client_id: str, new_expiry_time: int):
-    await session.execute(update(Key).where(Key.client_id == client_id).values(expiry_time=new_expiry_time))
+    result = await session.execute(
+        update(Key).where(Key.client_id == client_id).values(expiry_time=new_expiry_time).returning(Key.email)
+    )
+    emails = result.scalars().all()
     await session.commit()
+    invalidate_key_snapshots(emails)
     logger.info(f"Срок действия ключа {client_id} обновлён до {new_expiry_time}")
 
 
@@ -148,7 +252,7 @@ async def update_key_notified(session: AsyncSession, tg_id: int, client_id: str)
 
 
 async def mark_key_as_frozen(session: AsyncSession, tg_id: int, client_id: str, time_left: int):
-    await session.execute(
+    result = await session.execute(
         text(
             """
             UPDATE keys
@@ -156,14 +260,16 @@ async def mark_key_as_frozen(session: AsyncSession, tg_id: int, client_id: str,
                 is_frozen = TRUE
             WHERE tg_id = :tg_id
               AND client_id = :client_id
+            RETURNING email
         """
         ),
         {"expiry": time_left, "tg_id": tg_id, "client_id": client_id},
     )
+    invalidate_key_snapshots(result.scalars().all())
 
 
 async def mark_key_as_unfrozen(session: AsyncSession, tg_id: int, client_id: str, new_expiry_time: int):
-    await session.execute(
+    result = await session.execute(
         text(
             """
             UPDATE keys
@@ -171,10 +277,12 @@ async def mark_key_as_unfrozen(session: AsyncSession, tg_id: int, client_id: str
                 is_frozen = FALSE
             WHERE tg_id = :tg_id
               AND client_id = :client_id
+            RETURNING email
         """
         ),
         {"expiry": new_expiry_time, "tg_id": tg_id, "client_id": client_id},
     )
+    invalidate_key_snapshots(result.scalars().all())
 
 
 async def update_key_tariff(session: AsyncSession, client_id: str, tariff_id: int):
@@ -191,6 +299,7 @@ async def get_subscription_link(session: AsyncSession, email: str) -> str | None
 async def update_key_client_id(session: AsyncSession, email: str, new_client_id: str):
     await session.execute(update(Key).where(Key.email == email).values(client_id=new_client_id))
     await session.commit()
+    invalidate_key_snapshots([email])
     logger.info(f"client_id обновлён для {email} -> {new_client_id}")
 
 
@@ -199,3 +308,38 @@ async def update_key_link(session: AsyncSession, email: str, link: str) -> bool:
     res = await session.execute(q)
     await session.commit()
     return res.scalar_one_or_none() is not None
+
+
+async def get_key_load_by_server(session: AsyncSession) -> dict[str, int]:
+    """
+    Возвращает количество ключей по значению server_id (кластер или сервер).
+
+    Считается одним GROUP BY запросом и кешируется в процессе на KEY_LOAD_CACHE_TTL секунд.
+    """
+    global _key_load_cache, _key_load_expires_at
+
+    if _key_load_cache is not None and time.monotonic() < _key_load_expires_at:
+        return _key_load_cache
+
+    async with _key_load_lock:
+        if _key_load_cache is not None and time.monotonic() < _key_load_expires_at:
+            return _key_load_cache
+
+        result = await session.execute(select(Key.server_id, func.count()).group_by(Key.server_id))
+        _key_load_cache = {server_id: count for server_id, count in result.all() if server_id is not None}
+        _key_load_expires_at = time.monotonic() + KEY_LOAD_CACHE_TTL
+        return _key_load_cache
+
+
+def adjust_key_load(server_id: str | None, delta: int):
+    """Корректирует закешированную загрузку после создания или удаления ключа."""
+    if _key_load_cache is None or server_id is None:
+        return
+    _key_load_cache[server_id] = max(_key_load_cache.get(server_id, 0) + delta, 0)
+
+
+def invalidate_key_load():
+    """Сбрасывает кеш загрузки, например после массового переноса ключей между серверами."""
+    global _key_load_cache, _key_load_expires_at
+    _key_load_cache = None
+    _key_load_expires_at = 0.0
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import MediaFile
+from logger import logger
+
+
+async def get_media_file_ids(session: AsyncSession) -> dict[tuple[str, str], str]:
+    result = await session.execute(select(MediaFile.path, MediaFile.content_hash, MediaFile.file_id))
+    return {(path, content_hash): file_id for path, content_hash, file_id in result.all()}
+
+
+async def save_media_file_id(session: AsyncSession, path: str, content_hash: str, file_id: str, media_type: str):
+    try:
+        stmt = (
+            insert(MediaFile)
+            .values(
+                path=path,
+                content_hash=content_hash,
+                file_id=file_id,
+                media_type=media_type,
+                updated_at=datetime.utcnow(),
+            )
+            .on_conflict_do_update(
+                index_elements=[MediaFile.path, MediaFile.content_hash],
+                set_={"file_id": file_id, "media_type": media_type, "updated_at": datetime.utcnow()},
+            )
+        )
+        await session.execute(stmt)
+        await session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"❌ Ошибка при сохранении file_id для {path}: {e}")
+        await session.rollback()
+
+
+async def delete_media_file_id(session: AsyncSession, path: str, content_hash: str):
+    await session.execute(delete(MediaFile).where(MediaFile.path == path, MediaFile.content_hash == content_hash))
+    await session.commit()
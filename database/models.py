@@ -11,6 +11,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
@@ -63,13 +64,13 @@ class User(DictLikeMixin, Base):
 class Key(DictLikeMixin, Base):
     __tablename__ = "keys"
 
-    tg_id = Column(BigInteger, ForeignKey("users.tg_id"), nullable=False)
+    tg_id = Column(BigInteger, ForeignKey("users.tg_id"), nullable=False, index=True)
     client_id = Column(String, primary_key=True)
     email = Column(String, unique=True)
     created_at = Column(BigInteger)
-    expiry_time = Column(BigInteger)
+    expiry_time = Column(BigInteger, index=True)
     key = Column(String)
-    server_id = Column(String)
+    server_id = Column(String, index=True)
     remnawave_link = Column(String)
     tariff_id = Column(Integer, ForeignKey("tariffs.id", ondelete="SET NULL"))
     is_frozen = Column(Boolean, default=False)
@@ -233,6 +234,108 @@ class TemporaryData(DictLikeMixin, Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
 
 
+class BroadcastJob(DictLikeMixin, Base):
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False, default="running", index=True)
+    send_to = Column(String)
+    cluster_name = Column(String, nullable=True)
+    text = Column(Text)
+    photo = Column(String, nullable=True)
+    keyboard = Column(JSON, nullable=True)
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_by = Column(BigInteger)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BroadcastRecipient(DictLikeMixin, Base):
+    __tablename__ = "broadcast_recipients"
+
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), primary_key=True)
+    tg_id = Column(BigInteger, primary_key=True)
+    status = Column(String, nullable=False, default="pending")
+
+    __table_args__ = (Index("ix_broadcast_recipients_job_status", "job_id", "status", "tg_id"),)
+
+
+class SyncJob(DictLikeMixin, Base):
+    __tablename__ = "sync_jobs"
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String, nullable=False, default="cluster")
+    target = Column(String, nullable=False)
+    cluster_name = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="running", index=True)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    created = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    deleted = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    last_client_id = Column(String, nullable=True)
+    created_by = Column(BigInteger)
+    chat_id = Column(BigInteger, nullable=True)
+    message_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class PaymentEvent(DictLikeMixin, Base):
+    __tablename__ = "payment_events"
+
+    id = Column(Integer, primary_key=True)
+    payment_system = Column(String, nullable=False)
+    payment_id = Column(String(128), nullable=False)
+    tg_id = Column(BigInteger, nullable=False)
+    amount = Column(Float, nullable=False)
+    currency = Column(String(10), nullable=False, server_default="RUB")
+    payload = Column(JSONB, nullable=True)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("payment_system", "payment_id", name="uq_payment_event"),
+        Index("ix_payment_events_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+
+class MediaFile(DictLikeMixin, Base):
+    __tablename__ = "media_files"
+
+    path = Column(String, primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    file_id = Column(String, nullable=False)
+    media_type = Column(String, nullable=False, default="photo")
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class FxRate(DictLikeMixin, Base):
+    __tablename__ = "fx_rates"
+
+    code = Column(String(10), primary_key=True)
+    rub_per_unit = Column(Numeric(18, 8), nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
+
+
+class FsmState(DictLikeMixin, Base):
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(JSONB, nullable=False, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
 class BlockedUser(DictLikeMixin, Base):
     __tablename__ = "blocked_users"
 
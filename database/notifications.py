@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy import and_, delete, func, select
+from sqlalchemy import and_, delete, func, select, tuple_
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -32,6 +32,29 @@ async def add_notification(session: AsyncSession, tg_id: int, notification_type:
         await session.rollback()
 
 
+async def add_notifications_bulk(session: AsyncSession, notifications: list[tuple[int, str]]):
+    """Фиксирует время отправки сразу для пачки пар (tg_id, notification_type) одним запросом."""
+    rows = list(dict.fromkeys(notifications))
+    if not rows:
+        return
+    try:
+        now = datetime.utcnow()
+        stmt = insert(Notification).values([
+            {"tg_id": tg_id, "notification_type": notification_type, "last_notification_time": now}
+            for tg_id, notification_type in rows
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Notification.tg_id, Notification.notification_type],
+            set_={"last_notification_time": stmt.excluded.last_notification_time},
+        )
+        await session.execute(stmt)
+        await session.commit()
+        logger.info(f"✅ Добавлено {len(rows)} уведомлений")
+    except SQLAlchemyError as e:
+        logger.error(f"❌ Ошибка при пакетном добавлении уведомлений: {e}")
+        await session.rollback()
+
+
 async def delete_notification(session: AsyncSession, tg_id: int, notification_type: str):
     await session.execute(
         delete(Notification).where(
@@ -48,12 +71,29 @@ async def check_notification_time(session: AsyncSession, tg_id: int, notificatio
         Notification.tg_id == tg_id, Notification.notification_type == notification_type
     )
     result = await session.execute(stmt)
-    last_time = result.scalar_one_or_none()
+    return is_notification_due(result.scalar_one_or_none(), hours)
+
+
+def is_notification_due(last_time: datetime | None, hours: int) -> bool:
     if not last_time:
         return True
     return datetime.utcnow() - last_time > timedelta(hours=hours)
 
 
+async def get_last_notification_times(
+    session: AsyncSession, notifications: list[tuple[int, str]]
+) -> dict[tuple[int, str], datetime]:
+    """Возвращает время последней отправки для пачки пар (tg_id, notification_type) одним запросом."""
+    pairs = list(dict.fromkeys(notifications))
+    if not pairs:
+        return {}
+    stmt = select(Notification.tg_id, Notification.notification_type, Notification.last_notification_time).where(
+        tuple_(Notification.tg_id, Notification.notification_type).in_(pairs)
+    )
+    result = await session.execute(stmt)
+    return {(row.tg_id, row.notification_type): row.last_notification_time for row in result}
+
+
 async def get_last_notification_time(session: AsyncSession, tg_id: int, notification_type: str) -> int | None:
     stmt = select(Notification.last_notification_time).where(
         Notification.tg_id == tg_id, Notification.notification_type == notification_type
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Payment, PaymentEvent, User
+from database.payments import MOSCOW_TZ
+from logger import logger
+
+
+async def save_payment_event(
+    session: AsyncSession,
+    payment_system: str,
+    payment_id: str,
+    tg_id: int,
+    amount: float,
+    currency: str = "RUB",
+    payload: dict | None = None,
+) -> int | None:
+    """
+    Сохраняет подтверждённое событие оплаты во входящую очередь.
+
+    Возвращает id нового события или None, если событие с таким (payment_system, payment_id) уже есть.
+    """
+    stmt = (
+        insert(PaymentEvent)
+        .values(
+            payment_system=payment_system,
+            payment_id=payment_id,
+            tg_id=tg_id,
+            amount=amount,
+            currency=currency,
+            payload=payload,
+            status="pending",
+        )
+        .on_conflict_do_nothing(index_elements=[PaymentEvent.payment_system, PaymentEvent.payment_id])
+        .returning(PaymentEvent.id)
+    )
+    event_id = (await session.execute(stmt)).scalar_one_or_none()
+    await session.commit()
+    if event_id is None:
+        logger.info(f"[PaymentInbox] Повторный вебхук {payment_system} {payment_id} пропущен")
+    return event_id
+
+
+async def get_due_payment_event_ids(session: AsyncSession, limit: int) -> list[int]:
+    result = await session.execute(
+        select(PaymentEvent.id)
+        .where(PaymentEvent.status == "pending", PaymentEvent.next_attempt_at <= datetime.utcnow())
+        .order_by(PaymentEvent.next_attempt_at, PaymentEvent.id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def fulfil_payment_event(session: AsyncSession, event_id: int) -> PaymentEvent | None:
+    """
+    Зачисляет оплату по событию в одной транзакции: статус платежа, баланс и отметка события.
+
+    Строка события блокируется на время транзакции, поэтому повторная обработка уже выполненного
+    события или платежа со статусом success ничего не зачисляет. Возвращает событие, если баланс
+    был пополнен сейчас, иначе None.
+    """
+    event = (
+        await session.execute(select(PaymentEvent).where(PaymentEvent.id == event_id).with_for_update())
+    ).scalar_one_or_none()
+    if not event or event.status != "pending":
+        await session.rollback()
+        return None
+
+    payment = (
+        await session.execute(
+            select(Payment)
+            .where(Payment.payment_id == event.payment_id, Payment.payment_system == event.payment_system)
+            .order_by(Payment.id)
+            .limit(1)
+            .with_for_update()
+        )
+    ).scalar_one_or_none()
+
+    credited = payment is None or payment.status != "success"
+    if payment is None:
+        session.add(
+            Payment(
+                tg_id=event.tg_id,
+                amount=event.amount,
+                payment_system=event.payment_system,
+                status="success",
+                created_at=datetime.now(MOSCOW_TZ).replace(tzinfo=None),
+                currency=event.currency,
+                payment_id=event.payment_id,
+            )
+        )
+    elif credited:
+        payment.status = "success"
+
+    if credited:
+        await session.execute(
+            update(User)
+            .where(User.tg_id == event.tg_id)
+            .values(balance=func.coalesce(User.balance, 0) + event.amount)
+        )
+
+    event.status = "done"
+    event.attempts += 1
+    event.last_error = None
+    event.processed_at = datetime.utcnow()
+    await session.commit()
+
+    if not credited:
+        logger.info(f"[PaymentInbox] Платёж {event.payment_id} уже был обработан ранее")
+        return None
+    logger.info(
+        f"[PaymentInbox] Платёж {event.payment_system} {event.payment_id} зачислен: "
+        f"пользователь {event.tg_id}, сумма {event.amount}"
+    )
+    return event
+
+
+async def retry_payment_event(
+    session: AsyncSession, event_id: int, error: str, max_attempts: int, backoff_base: float, backoff_max: float
+) -> str:
+    """Откладывает событие с экспоненциальной задержкой после ошибки; после max_attempts попыток помечает его failed."""
+    event = await session.get(PaymentEvent, event_id)
+    if not event:
+        return "missing"
+
+    event.attempts += 1
+    event.last_error = error
+    if event.attempts >= max_attempts:
+        event.status = "failed"
+        logger.error(f"[PaymentInbox] Событие #{event_id} ({event.payment_id}) не обработано за {event.attempts} попыток")
+    else:
+        backoff = min(backoff_base * 2 ** (event.attempts - 1), backoff_max)
+        event.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+    await session.commit()
+    return event.status
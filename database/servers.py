@@ -1,7 +1,13 @@
+import asyncio
+import time
+
+from types import MappingProxyType
+
 from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from database.keys import invalidate_key_load
 from database.models import Key, Server, ServerSpecialgroup, ServerSubgroup, Tariff
 from logger import logger
 
@@ -24,6 +30,7 @@ async def create_server(
         )
         await session.execute(stmt)
         await session.commit()
+        invalidate_servers_cache()
         logger.info(f"✅ Сервер {server_name} добавлен в кластер {cluster_name}")
     except SQLAlchemyError as e:
         logger.error(f"❌ Ошибка при добавлении сервера {server_name}: {e}")
@@ -36,6 +43,7 @@ async def delete_server(session: AsyncSession, server_name: str):
         stmt = delete(Server).where(Server.server_name == server_name)
         await session.execute(stmt)
         await session.commit()
+        invalidate_servers_cache()
         logger.info(f"🗑 Сервер {server_name} удалён")
     except SQLAlchemyError as e:
         logger.error(f"❌ Ошибка при удалении сервера {server_name}: {e}")
@@ -43,55 +51,156 @@ async def delete_server(session: AsyncSession, server_name: str):
         raise
 
 
-async def get_servers(session: AsyncSession, include_enabled: bool = False) -> dict:
-    from handlers.utils import ALLOWED_GROUP_CODES
+SERVERS_CACHE_TTL = 600
 
-    try:
-        stmt = select(Server)
-        result = await session.execute(stmt)
-        servers = result.scalars().all()
 
-        ids = [s.id for s in servers]
-        subs_map = {}
-        if ids:
-            r = await session.execute(
-                select(ServerSubgroup.server_id, ServerSubgroup.subgroup_title).where(ServerSubgroup.server_id.in_(ids))
-            )
-            for sid, sg in r.all():
-                subs_map.setdefault(sid, []).append(sg)
-
-        groups_map = {}
-        if ids:
-            r2 = await session.execute(
-                select(ServerSpecialgroup.server_id, ServerSpecialgroup.group_code).where(
-                    ServerSpecialgroup.server_id.in_(ids)
-                )
-            )
-            for sid, gc in r2.all():
-                groups_map.setdefault(sid, []).append(gc)
+class ServerTopology:
+    """
+    Неизменяемый снимок серверов и кластеров с поиском за O(1).
+
+    Содержит все серверы, включая отключённые; get_servers() по умолчанию отфильтровывает выключенные.
+    """
 
-        allowed = set(ALLOWED_GROUP_CODES)
+    def __init__(self, servers: list[dict], version: int) -> None:
+        self.version = version
+        self.created_at = time.monotonic()
 
+        clusters: dict[str, list[MappingProxyType]] = {}
+        by_name: dict[str, MappingProxyType] = {}
+        by_api_url: dict[str, list[MappingProxyType]] = {}
+        for server in servers:
+            frozen = MappingProxyType(server)
+            clusters.setdefault(server["cluster_name"], []).append(frozen)
+            by_name[server["server_name"]] = frozen
+            by_api_url.setdefault(server["api_url"], []).append(frozen)
+
+        self.clusters = MappingProxyType({name: tuple(items) for name, items in clusters.items()})
+        self.servers = MappingProxyType(by_name)
+        self.api_urls = MappingProxyType({url: tuple(items) for url, items in by_api_url.items()})
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self.created_at < SERVERS_CACHE_TTL
+
+    def get_cluster(self, cluster_name: str) -> tuple[MappingProxyType, ...]:
+        return self.clusters.get(cluster_name, ())
+
+    def get_server(self, server_name: str) -> MappingProxyType | None:
+        return self.servers.get(server_name)
+
+    def get_servers_by_api_url(self, api_url: str) -> tuple[MappingProxyType, ...]:
+        return self.api_urls.get(api_url, ())
+
+    def resolve(self, server_id: str) -> tuple[MappingProxyType, ...]:
+        """Серверы по значению Key.server_id, которое может быть именем кластера или сервера."""
+        if server_id in self.clusters:
+            return self.clusters[server_id]
+        server = self.servers.get(server_id)
+        return (server,) if server else ()
+
+    def as_dict(self, include_enabled: bool = False) -> dict[str, list[dict]]:
+        """Изменяемая копия в формате get_servers(): кластер -> список словарей серверов."""
         grouped = {}
-        for s in servers:
-            if not include_enabled and not s.enabled:
-                continue
-            cluster = s.cluster_name
-            special = sorted({g for g in groups_map.get(s.id, []) if g in allowed})
-            grouped.setdefault(cluster, []).append({
-                "server_name": s.server_name,
-                "api_url": s.api_url,
-                "subscription_url": s.subscription_url,
-                "inbound_id": s.inbound_id,
-                "panel_type": s.panel_type,
-                "enabled": s.enabled,
-                "max_keys": s.max_keys,
-                "tariff_group": s.tariff_group,
-                "tariff_subgroups": subs_map.get(s.id, []),
-                "special_groups": special,
-                "cluster_name": cluster,
-            })
+        for cluster, servers in self.clusters.items():
+            for server in servers:
+                if not include_enabled and not server["enabled"]:
+                    continue
+                grouped.setdefault(cluster, []).append({
+                    **server,
+                    "tariff_subgroups": list(server["tariff_subgroups"]),
+                    "special_groups": list(server["special_groups"]),
+                })
         return grouped
+
+
+_topology: ServerTopology | None = None
+_topology_version = 0
+_topology_lock = asyncio.Lock()
+
+
+def invalidate_servers_cache():
+    """Сбрасывает снимок серверов; вызывать после любого изменения серверов, кластеров и их групп."""
+    global _topology, _topology_version
+    _topology_version += 1
+    _topology = None
+
+
+def get_servers_version() -> int:
+    return _topology_version
+
+
+async def _load_servers(session: AsyncSession) -> list[dict]:
+    from handlers.utils import ALLOWED_GROUP_CODES
+
+    stmt = select(Server)
+    result = await session.execute(stmt)
+    servers = result.scalars().all()
+
+    ids = [s.id for s in servers]
+    subs_map = {}
+    if ids:
+        r = await session.execute(
+            select(ServerSubgroup.server_id, ServerSubgroup.subgroup_title).where(ServerSubgroup.server_id.in_(ids))
+        )
+        for sid, sg in r.all():
+            subs_map.setdefault(sid, []).append(sg)
+
+    groups_map = {}
+    if ids:
+        r2 = await session.execute(
+            select(ServerSpecialgroup.server_id, ServerSpecialgroup.group_code).where(
+                ServerSpecialgroup.server_id.in_(ids)
+            )
+        )
+        for sid, gc in r2.all():
+            groups_map.setdefault(sid, []).append(gc)
+
+    allowed = set(ALLOWED_GROUP_CODES)
+
+    return [
+        {
+            "server_name": s.server_name,
+            "api_url": s.api_url,
+            "subscription_url": s.subscription_url,
+            "inbound_id": s.inbound_id,
+            "panel_type": s.panel_type,
+            "enabled": s.enabled,
+            "max_keys": s.max_keys,
+            "tariff_group": s.tariff_group,
+            "tariff_subgroups": tuple(subs_map.get(s.id, [])),
+            "special_groups": tuple(sorted({g for g in groups_map.get(s.id, []) if g in allowed})),
+            "cluster_name": s.cluster_name,
+        }
+        for s in servers
+    ]
+
+
+async def get_server_topology(session: AsyncSession) -> ServerTopology:
+    """
+    Возвращает снимок серверов из памяти, перечитывая БД только после invalidate_servers_cache()
+    или по истечении SERVERS_CACHE_TTL (на случай изменений в обход админки).
+    """
+    global _topology
+    topology = _topology
+    if topology and topology.is_fresh:
+        return topology
+
+    async with _topology_lock:
+        topology = _topology
+        if topology and topology.is_fresh:
+            return topology
+
+        version = _topology_version
+        topology = ServerTopology(await _load_servers(session), version)
+        if version == _topology_version:
+            _topology = topology
+        return topology
+
+
+async def get_servers(session: AsyncSession, include_enabled: bool = False) -> dict:
+    try:
+        topology = await get_server_topology(session)
+        return topology.as_dict(include_enabled=include_enabled)
     except SQLAlchemyError as e:
         logger.error(f"Ошибка при получении серверов: {e}")
         return {}
@@ -163,6 +272,7 @@ async def update_server_field(session: AsyncSession, server_name: str, field: st
         stmt = update(Server).where(Server.server_name == server_name).values(**{field: value})
         await session.execute(stmt)
         await session.commit()
+        invalidate_servers_cache()
         logger.info(f"✅ Поле {field} сервера {server_name} обновлено на {value}")
         return True
     except SQLAlchemyError as e:
@@ -188,6 +298,8 @@ async def update_server_name_with_keys(session: AsyncSession, old_name: str, new
         await session.execute(stmt_keys)
 
         await session.commit()
+        invalidate_key_load()
+        invalidate_servers_cache()
         logger.info(f"✅ Сервер переименован с {old_name} на {new_name}")
         return True
     except SQLAlchemyError as e:
@@ -246,6 +358,9 @@ async def update_server_cluster(session: AsyncSession, server_name: str, new_clu
             )
 
         await session.commit()
+        invalidate_servers_cache()
+        if remaining_servers == 0:
+            invalidate_key_load()
         logger.info(
             f"✅ Сервер {server_name} перемещен в кластер {new_cluster} с обновлением тарифной группы и привязок подгрупп"
         )
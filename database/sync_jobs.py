@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Key, SyncJob
+from logger import logger
+
+
+SYNC_ACTIVE_STATUSES = ("running", "paused")
+
+
+def _sync_keys_criteria(cluster_name: str) -> tuple:
+    return Key.server_id == cluster_name, Key.is_frozen.isnot(True)
+
+
+async def create_sync_job(
+    session: AsyncSession,
+    scope: str,
+    target: str,
+    cluster_name: str,
+    created_by: int | None = None,
+    chat_id: int | None = None,
+    message_id: int | None = None,
+) -> int:
+    total = await session.scalar(select(func.count()).select_from(Key).where(*_sync_keys_criteria(cluster_name)))
+    job = SyncJob(
+        scope=scope,
+        target=target,
+        cluster_name=cluster_name,
+        status="running",
+        total=total or 0,
+        created_by=created_by,
+        chat_id=chat_id,
+        message_id=message_id,
+    )
+    session.add(job)
+    await session.commit()
+    logger.info(f"[Sync] Создана синхронизация #{job.id} ({scope} {target}) на {job.total} ключей")
+    return job.id
+
+
+async def get_sync_job(session: AsyncSession, job_id: int) -> SyncJob | None:
+    result = await session.execute(select(SyncJob).where(SyncJob.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def get_sync_job_status(session: AsyncSession, job_id: int) -> str | None:
+    result = await session.execute(select(SyncJob.status).where(SyncJob.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def get_active_sync_jobs(
+    session: AsyncSession, scope: str | None = None, target: str | None = None
+) -> list[SyncJob]:
+    stmt = select(SyncJob).where(SyncJob.status.in_(SYNC_ACTIVE_STATUSES))
+    if scope is not None:
+        stmt = stmt.where(SyncJob.scope == scope)
+    if target is not None:
+        stmt = stmt.where(SyncJob.target == target)
+    result = await session.execute(stmt.order_by(SyncJob.id))
+    return result.scalars().all()
+
+
+async def set_sync_job_status(session: AsyncSession, job_id: int, status: str):
+    values = {"status": status, "updated_at": datetime.utcnow()}
+    if status in ("completed", "cancelled", "failed"):
+        values["finished_at"] = datetime.utcnow()
+    await session.execute(update(SyncJob).where(SyncJob.id == job_id).values(**values))
+    await session.commit()
+    logger.info(f"[Sync] Статус синхронизации #{job_id}: {status}")
+
+
+async def get_sync_keys_batch(
+    session: AsyncSession, cluster_name: str, limit: int, after_client_id: str | None = None
+) -> list[Key]:
+    stmt = select(Key).where(*_sync_keys_criteria(cluster_name))
+    if after_client_id is not None:
+        stmt = stmt.where(Key.client_id > after_client_id)
+    result = await session.execute(stmt.order_by(Key.client_id).limit(limit))
+    return list(result.scalars().all())
+
+
+async def save_sync_progress(session: AsyncSession, job_id: int, last_client_id: str, counters: dict[str, int]):
+    """Сохраняет курсор и счётчики после обработанной пачки, чтобы синхронизация продолжилась с этого места."""
+    await session.execute(
+        update(SyncJob)
+        .where(SyncJob.id == job_id)
+        .values(
+            last_client_id=last_client_id,
+            processed=SyncJob.processed + counters.get("processed", 0),
+            created=SyncJob.created + counters.get("created", 0),
+            updated=SyncJob.updated + counters.get("updated", 0),
+            deleted=SyncJob.deleted + counters.get("deleted", 0),
+            failed=SyncJob.failed + counters.get("failed", 0),
+            updated_at=datetime.utcnow(),
+        )
+    )
+    await session.commit()
@@ -86,6 +86,18 @@ async def get_tariff_by_id(session: AsyncSession, tariff_id: int):
         return None
 
 
+async def get_tariffs_by_ids(session: AsyncSession, tariff_ids) -> dict[int, dict]:
+    ids = {tariff_id for tariff_id in tariff_ids if tariff_id}
+    if not ids:
+        return {}
+    try:
+        result = await session.execute(select(Tariff).where(Tariff.id.in_(ids)))
+        return {tariff.id: dict(tariff.__dict__) for tariff in result.scalars().all()}
+    except SQLAlchemyError as e:
+        logger.error(f"[TARIFF] Ошибка при пакетном получении тарифов {sorted(ids)}: {e}")
+        return {}
+
+
 async def get_tariffs_for_cluster(session: AsyncSession, cluster_name: str):
     try:
         server_row = await session.execute(
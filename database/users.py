@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import delete, exists, func, or_, select, update
+from sqlalchemy import BigInteger, Boolean, DateTime, String, column, delete, exists, func, or_, select, update, values
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -177,6 +177,62 @@ async def upsert_user(
         raise
 
 
+async def get_user_row(session: AsyncSession, tg_id: int) -> dict | None:
+    user = await session.get(User, tg_id)
+    return user.to_dict() if user else None
+
+
+async def update_user_profiles(session: AsyncSession, profiles: list[dict]) -> None:
+    """
+    Обновляет профили существующих пользователей одним UPDATE ... FROM (VALUES ...).
+
+    Каждый профиль содержит tg_id, username, first_name, last_name, language_code, is_bot и updated_at.
+    Пустые поля профиля не затирают значения в базе, отсутствующие пользователи пропускаются.
+    """
+    if not profiles:
+        return
+    rows = values(
+        column("tg_id", BigInteger),
+        column("username", String),
+        column("first_name", String),
+        column("last_name", String),
+        column("language_code", String),
+        column("is_bot", Boolean),
+        column("updated_at", DateTime),
+        name="profiles",
+    ).data([
+        (
+            p["tg_id"],
+            p["username"],
+            p["first_name"],
+            p["last_name"],
+            p["language_code"],
+            p["is_bot"],
+            p["updated_at"],
+        )
+        for p in profiles
+    ])
+    try:
+        await session.execute(
+            update(User)
+            .where(User.tg_id == rows.c.tg_id)
+            .values(
+                username=func.coalesce(func.nullif(rows.c.username, ""), User.username),
+                first_name=func.coalesce(func.nullif(rows.c.first_name, ""), User.first_name),
+                last_name=func.coalesce(func.nullif(rows.c.last_name, ""), User.last_name),
+                language_code=func.coalesce(func.nullif(rows.c.language_code, ""), User.language_code),
+                is_bot=rows.c.is_bot,
+                updated_at=rows.c.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"[DB] Ошибка при обновлении профилей пользователей ({len(profiles)}): {e}")
+        await session.rollback()
+        raise
+
+
 async def delete_user_data(session: AsyncSession, tg_id: int):
     try:
         await session.execute(delete(Notification).where(Notification.tg_id == tg_id))
@@ -0,0 +1,119 @@
+import asyncio
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker
+from logger import logger
+
+
+class BackgroundJobs:
+    """
+    Фоновые задачи админки, состояние которых хранится в БД (рассылки, синхронизации).
+
+    Задача выполняется в этом процессе, пока её статус в БД "running": пауза и отмена только меняют статус,
+    а run сам останавливается на ближайшей проверке. Прерванные перезапуском задачи продолжаются в resume.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        title: str,
+        run: Callable[[Bot, int], Awaitable[None]],
+        get_job: Callable[[AsyncSession, int], Awaitable[Any]],
+        get_active_jobs: Callable[[AsyncSession], Awaitable[list[Any]]],
+        set_status: Callable[[AsyncSession, int, str], Awaitable[None]],
+        status_titles: dict[str, str],
+        format_details: Callable[[Any], str],
+        build_progress_kb: Callable[[int, str], InlineKeyboardMarkup],
+    ) -> None:
+        self.name = name
+        self.title = title
+        self.run = run
+        self.get_job = get_job
+        self.get_active_jobs = get_active_jobs
+        self.set_status = set_status
+        self.status_titles = status_titles
+        self.format_details = format_details
+        self.build_progress_kb = build_progress_kb
+        self._running: dict[int, asyncio.Task] = {}
+
+    def is_running(self, job_id: int) -> bool:
+        task = self._running.get(job_id)
+        return task is not None and not task.done()
+
+    def start(self, bot: Bot, job_id: int) -> bool:
+        """Запускает задачу в фоне, если она ещё не выполняется в этом процессе."""
+        if self.is_running(job_id):
+            return False
+        self._running[job_id] = asyncio.create_task(self._execute(bot, job_id))
+        return True
+
+    async def _execute(self, bot: Bot, job_id: int):
+        try:
+            await self.run(bot, job_id)
+        except asyncio.CancelledError:
+            logger.info(f"[{self.name}] {self.title} #{job_id} прервана, продолжится после перезапуска")
+            raise
+        except Exception as e:
+            logger.error(f"[{self.name}] {self.title} #{job_id} завершилась с ошибкой: {e}")
+        finally:
+            self._running.pop(job_id, None)
+
+    async def resume(self, bot: Bot):
+        """Продолжает задачи со статусом "running", прерванные перезапуском бота."""
+        try:
+            async with async_session_maker() as session:
+                jobs = await self.get_active_jobs(session)
+        except Exception as e:
+            logger.error(f"[{self.name}] Не удалось загрузить незавершённые задачи: {e}")
+            return
+
+        for job in jobs:
+            if job.status == "running" and self.start(bot, job.id):
+                logger.info(f"[{self.name}] {self.title} #{job.id} возобновлена после перезапуска")
+
+    async def stop(self):
+        """Останавливает фоновые задачи; их статус в БД не меняется, и после перезапуска они продолжатся."""
+        tasks = [task for task in self._running.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def render(self, job) -> dict[str, Any]:
+        """Текст и клавиатура сообщения с прогрессом задачи."""
+        title = self.status_titles.get(job.status, job.status)
+        return {
+            "text": f"<b>{title}</b> (#{job.id})\n\n{self.format_details(job)}",
+            "reply_markup": self.build_progress_kb(job.id, job.status),
+        }
+
+    async def handle_control(self, callback_query: CallbackQuery, session: AsyncSession, job_id: int, action: str):
+        """Обрабатывает кнопки прогресса: пауза, продолжение, отмена и обновление."""
+        job = await self.get_job(session, job_id)
+        if not job:
+            await callback_query.answer(f"{self.title} не найдена.", show_alert=True)
+            return
+
+        if action == "pause" and job.status == "running":
+            await self.set_status(session, job_id, "paused")
+        elif action == "resume" and job.status == "paused":
+            await self.set_status(session, job_id, "running")
+            self.start(callback_query.bot, job_id)
+        elif action == "cancel" and job.status in ("running", "paused"):
+            await self.set_status(session, job_id, "cancelled")
+        elif action == "resume" and job.status == "running" and not self.is_running(job_id):
+            self.start(callback_query.bot, job_id)
+
+        await session.refresh(job)
+        try:
+            await callback_query.message.edit_text(**self.render(job))
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        await callback_query.answer()
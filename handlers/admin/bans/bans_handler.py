@@ -15,6 +15,7 @@ from database import delete_user_data
 from database.models import ManualBan
 from filters.admin import IsAdminFilter
 from logger import logger
+from utils.identity_cache import invalidate_ban, invalidate_user
 
 from ..panel.keyboard import AdminPanelCallback, build_admin_back_kb
 from .keyboard import build_bans_kb
@@ -83,6 +84,7 @@ async def handle_bans_delete_banned(callback_query: CallbackQuery, session: Asyn
 
         for tg_id in blocked_ids:
             await delete_user_data(session, tg_id)
+            invalidate_user(tg_id)
 
         await session.execute(
             text("DELETE FROM blocked_users WHERE tg_id = ANY(:blocked_ids)"),
@@ -134,6 +136,7 @@ async def handle_delete_manual_banned(callback_query: CallbackQuery, session: As
     try:
         await session.execute(delete(ManualBan))
         await session.commit()
+        invalidate_ban()
         await callback_query.message.edit_text(
             "🗑️ Вручную забаненные пользователи удалены.",
             reply_markup=build_bans_kb(),
@@ -196,6 +199,7 @@ async def handle_preemptive_ids_input(message: Message, state: FSMContext, sessi
 
     await session.execute(stmt)
     await session.commit()
+    invalidate_ban()
 
     await message.answer(f"✅ Успешно добавлено в теневой бан: <b>{len(tg_ids)}</b> пользователей.")
     await state.clear()
@@ -1,6 +1,4 @@
-import asyncio
-
-from datetime import datetime, timezone
+from datetime import datetime
 from typing import Any
 
 from aiogram import F, Router, types
@@ -14,30 +12,31 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config import (
     ADMIN_PASSWORD,
     ADMIN_USERNAME,
-    HAPP_CRYPTOLINK,
-    REMNAWAVE_LOGIN,
-    REMNAWAVE_PASSWORD,
     USE_COUNTRY_SELECTION,
 )
-from database import check_unique_server_name, get_servers, update_key_expiry
+from database import (
+    check_unique_server_name,
+    create_sync_job,
+    get_active_sync_jobs,
+    get_servers,
+    get_sync_job,
+    invalidate_key_load,
+    invalidate_servers_cache,
+    update_key_expiry,
+)
 from database.models import Key, Server, ServerSpecialgroup, ServerSubgroup, Tariff
 from filters.admin import IsAdminFilter
-from handlers.keys.operations import (
-    create_client_on_server,
-    create_key_on_cluster,
-    delete_key_from_cluster,
-    renew_key_in_cluster,
-)
-from handlers.keys.operations.aggregated_links import make_aggregated_link
+from handlers.keys.operations import renew_key_in_cluster
 from handlers.utils import ALLOWED_GROUP_CODES
 from logger import logger
-from panels.remnawave import RemnawaveAPI
+from panels.online_stats import get_cluster_online
 from utils.backup import create_backup_and_send_to_admins
 
 from ..panel.keyboard import AdminPanelCallback, build_admin_back_kb
 from .keyboard import (
     AdminClusterCallback,
     AdminServerCallback,
+    AdminSyncCallback,
     build_attach_tariff_kb,
     build_cluster_management_kb,
     build_clusters_editor_kb,
@@ -50,6 +49,7 @@ from .keyboard import (
     build_tariff_group_selection_kb,
     build_tariff_subgroup_selection_kb,
 )
+from .sync import sync_jobs
 
 
 router = Router()
@@ -273,6 +273,7 @@ async def handle_panel_type_selection(
 
     session.add(new_server)
     await session.commit()
+    invalidate_servers_cache()
 
     await callback_query.message.edit_text(
         text=f"✅ Сервер <b>{server_name}</b> с панелью <b>{panel_type}</b> успешно добавлен в кластер <b>{cluster_name}</b>!",
@@ -374,70 +375,23 @@ async def handle_cluster_availability(
     total_online_users = 0
     result_text = f"<b>🖥️ Проверка доступности серверов</b>\n\n⚙️ Кластер: <b>{cluster_name}</b>\n\n"
 
-    for server in cluster_servers:
-        server_name = server["server_name"]
-        panel_type = server.get("panel_type", "3x-ui").lower()
-        prefix = "[3x]" if panel_type == "3x-ui" else "[Re]"
-
-        try:
-            if panel_type == "3x-ui":
-                xui = AsyncApi(
-                    server["api_url"],
-                    username=ADMIN_USERNAME,
-                    password=ADMIN_PASSWORD,
-                    logger=None,
-                )
-                await xui.login()
-                inbound_id = int(server["inbound_id"])
-                online_clients = await xui.client.online()
-                online_inbound_users = 0
-
-                for client_email in online_clients:
-                    client = await xui.client.get_by_email(client_email)
-                    if client and client.inbound_id == inbound_id:
-                        online_inbound_users += 1
-
-                total_online_users += online_inbound_users
-                result_text += f"🌍 <b>{prefix} {server_name}</b> - {online_inbound_users} онлайн\n"
-
-            elif panel_type == "remnawave":
-                server_inbound_id = server.get("inbound_id")
-                if not server_inbound_id:
-                    raise Exception("Не указан inbound_id сервера")
-
-                remna = RemnawaveAPI(server["api_url"])
-                nodes_data = await remna.get_all_nodes_with_online(
-                    username=REMNAWAVE_LOGIN, password=REMNAWAVE_PASSWORD, inbound_id=server_inbound_id
-                )
-
-                if nodes_data.get("error"):
-                    raise Exception(nodes_data["error"])
-
-                online_remna_users = nodes_data["total_online"]
-                total_online_users += online_remna_users
-
-                nodes_info = nodes_data["nodes"]
-                result_text += f"🌍 <b>{prefix} {server_name}</b> - {online_remna_users} онлайн\n"
-                seen = set()
-                for node_info in nodes_info:
-                    node_name = node_info.get("name", "Unknown")
-                    if node_name in seen:
-                        continue
-                    seen.add(node_name)
+    for stats in await get_cluster_online(cluster_servers):
+        prefix = "[3x]" if stats.panel_type == "3x-ui" else "[Re]"
 
-                    country_code = node_info.get("country_code", "Unknown")
-                    online_users = node_info.get("online_users", 0)
-
-                    flag = (
-                        "".join(chr(ord(c) + 127397) for c in country_code.upper())
-                        if country_code != "Unknown" and len(country_code) == 2
-                        else country_code
-                    )
-                    result_text += f"  ↳ {flag} ({node_name}): {online_users} онлайн\n"
+        if stats.error:
+            result_text += f"❌ <b>{prefix} {stats.server_name}</b> - ошибка: {stats.error}\n"
+            continue
 
-        except Exception as e:
-            error_text = str(e) or "Сервер недоступен"
-            result_text += f"❌ <b>{prefix} {server_name}</b> - ошибка: {error_text}\n"
+        total_online_users += stats.online
+        result_text += f"🌍 <b>{prefix} {stats.server_name}</b> - {stats.online} онлайн\n"
+        for node_info in stats.nodes:
+            country_code = node_info["country_code"]
+            flag = (
+                "".join(chr(ord(c) + 127397) for c in country_code.upper())
+                if country_code != "Unknown" and len(country_code) == 2
+                else country_code
+            )
+            result_text += f"  ↳ {flag} ({node_info['name']}): {node_info['online_users']} онлайн\n"
 
     result_text += f"\n👥 Всего пользователей онлайн: {total_online_users}"
     await callback_query.message.edit_text(text=result_text, reply_markup=build_admin_back_kb("clusters"))
@@ -500,177 +454,7 @@ async def handle_sync_server(
     callback_data: AdminClusterCallback,
     session: AsyncSession,
 ):
-    server_name = callback_data.data
-
-    try:
-        stmt = (
-            select(
-                Server.api_url,
-                Server.inbound_id,
-                Server.server_name,
-                Server.panel_type,
-                Key.tg_id,
-                Key.client_id,
-                Key.email,
-                Key.expiry_time,
-                Key.tariff_id,
-                Key.remnawave_link,
-            )
-            .join(Key, Server.cluster_name == Key.server_id)
-            .where(Server.server_name == server_name)
-        )
-        result = await session.execute(stmt)
-        keys_to_sync = result.mappings().all()
-
-        if not keys_to_sync:
-            await callback_query.message.edit_text(
-                text=f"❌ Нет ключей для синхронизации в сервере {server_name}.",
-                reply_markup=build_admin_back_kb("clusters"),
-            )
-            return
-
-        await callback_query.message.edit_text(
-            text=f"<b>🔄 Синхронизация сервера {server_name}</b>\n\n🔑 Количество ключей: <b>{len(keys_to_sync)}</b>"
-        )
-
-        semaphore = asyncio.Semaphore(2)
-        for key in keys_to_sync:
-            try:
-                if key["panel_type"] == "remnawave":
-                    tariff = None
-                    if key["tariff_id"]:
-                        tariff = await session.get(Tariff, key["tariff_id"])
-                        if tariff:
-                            servers = await get_servers(session)
-                            server_info = None
-                            for cluster_servers in servers.values():
-                                for s in cluster_servers:
-                                    if s.get("server_name") == server_name:
-                                        server_info = s
-                                        break
-                                if server_info:
-                                    break
-                            
-                            if server_info:
-                                if tariff.subgroup_title and tariff.subgroup_title not in server_info.get("tariff_subgroups", []):
-                                    continue
-
-                                if tariff.group_code and tariff.group_code.lower() in ALLOWED_GROUP_CODES:
-                                    if tariff.group_code.lower() not in server_info.get("special_groups", []):
-                                        continue
-
-                    expire_iso = (
-                        datetime.utcfromtimestamp(key["expiry_time"] / 1000).replace(tzinfo=timezone.utc).isoformat()
-                    )
-
-                    remna = RemnawaveAPI(key["api_url"])
-                    if not await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD):
-                        logger.error(f"Не удалось авторизоваться в Remnawave для сервера {server_name}")
-                        continue
-
-                    traffic_limit_bytes = 0
-                    hwid_limit = 0
-                    if tariff:
-                        if tariff.traffic_limit is not None:
-                            traffic_limit_bytes = int(tariff.traffic_limit * 1024**3)
-                        hwid_limit = tariff.device_limit
-
-                    success = await remna.update_user(
-                        uuid=key["client_id"],
-                        expire_at=expire_iso,
-                        telegram_id=key["tg_id"],
-                        email=f"{key['email']}@fake.local",
-                        active_user_inbounds=[key["inbound_id"]],
-                        traffic_limit_bytes=traffic_limit_bytes,
-                        hwid_device_limit=hwid_limit,
-                    )
-
-                    if success:
-                        try:
-                            sub = await remna.get_subscription_by_username(key["email"])
-                            if sub:
-                                new_remnawave_link = sub.get("subscriptionUrl")
-                                if HAPP_CRYPTOLINK:
-                                    happ = sub.get("happ") or {}
-                                    new_remnawave_link = happ.get("cryptoLink") or happ.get("link") or new_remnawave_link
-                                
-                                if new_remnawave_link:
-                                    server_result = await session.execute(
-                                        select(Server.cluster_name).where(Server.server_name == server_name)
-                                    )
-                                    cluster_name = server_result.scalar()
-                                    
-                                    servers = await get_servers(session)
-                                    cluster_servers = servers.get(cluster_name, [])
-                                    
-                                    key_value = await make_aggregated_link(
-                                        session=session,
-                                        cluster_all=cluster_servers,
-                                        cluster_id=cluster_name,
-                                        email=key["email"],
-                                        client_id=key["client_id"],
-                                        tg_id=key["tg_id"],
-                                        remna_link_override=new_remnawave_link,
-                                        plan=key["tariff_id"],
-                                    )
-                                    
-                                    await session.execute(
-                                        update(Key)
-                                        .where(Key.tg_id == key["tg_id"], Key.client_id == key["client_id"])
-                                        .values(
-                                            remnawave_link=new_remnawave_link,
-                                            key=key_value
-                                        )
-                                    )
-                                    await session.commit()
-                                    logger.info(f"[Sync] Обновлена ссылка для {key['email']}: {new_remnawave_link}")
-                        except Exception as e:
-                            logger.warning(f"[Sync] Не удалось получить ссылку для {key['email']}: {e}")
-
-                    if not success:
-                        logger.warning("[Sync] ошибка обновления, пробуем пересоздать")
-
-                        await delete_key_from_cluster(server_name, key["email"], key["client_id"], session)
-
-                        await create_key_on_cluster(
-                            cluster_id=server_name,
-                            tg_id=key["tg_id"],
-                            client_id=key["client_id"],
-                            email=key["email"],
-                            expiry_timestamp=key["expiry_time"],
-                            plan=key["tariff_id"],
-                            session=session,
-                            remnawave_link=key["remnawave_link"],
-                        )
-                else:
-                    await create_client_on_server(
-                        {
-                            "api_url": key["api_url"],
-                            "inbound_id": key["inbound_id"],
-                            "server_name": key["server_name"],
-                        },
-                        key["tg_id"],
-                        key["client_id"],
-                        key["email"],
-                        key["expiry_time"],
-                        semaphore,
-                        plan=key["tariff_id"],
-                        session=session,
-                    )
-                await asyncio.sleep(0.6)
-            except Exception as e:
-                logger.error(f"Ошибка при синхронизации ключа {key['client_id']} в сервер {server_name}: {e}")
-
-        await callback_query.message.edit_text(
-            text=f"✅ Ключи успешно синхронизированы для сервера {server_name}",
-            reply_markup=build_admin_back_kb("clusters"),
-        )
-    except Exception as e:
-        logger.error(f"Ошибка синхронизации ключей для сервера {server_name}: {e}")
-        await callback_query.message.edit_text(
-            text=f"❌ Произошла ошибка при синхронизации: {e}",
-            reply_markup=build_admin_back_kb("clusters"),
-        )
+    await start_sync_job(callback_query, session, scope="server", target=callback_data.data)
 
 
 @router.callback_query(AdminClusterCallback.filter(F.action == "sync-cluster"), IsAdminFilter())
@@ -679,193 +463,73 @@ async def handle_sync_cluster(
     callback_data: AdminClusterCallback,
     session: AsyncSession,
 ):
-    cluster_name = callback_data.data
+    await start_sync_job(callback_query, session, scope="cluster", target=callback_data.data)
 
-    try:
-        result = await session.execute(
-            select(
-                Key.tg_id,
-                Key.client_id,
-                Key.email,
-                Key.expiry_time,
-                Key.remnawave_link,
-                Key.tariff_id,
-            ).where(Key.server_id == cluster_name, Key.is_frozen.is_(False))
-        )
-        keys_to_sync = result.mappings().all()
 
-        if not keys_to_sync:
-            await callback_query.message.edit_text(
-                text=f"❌ Нет ключей для синхронизации в кластере {cluster_name}.",
-                reply_markup=build_admin_back_kb("clusters"),
-            )
-            return
+async def start_sync_job(callback_query: CallbackQuery, session: AsyncSession, scope: str, target: str):
+    """
+    Ставит синхронизацию сервера или кластера в фоновую задачу и показывает её прогресс.
 
-        servers = await get_servers(session)
-        cluster_servers = servers.get(cluster_name, [])
-        only_remnawave = all(s.get("panel_type") == "remnawave" for s in cluster_servers)
+    Повторное нажатие во время активной синхронизации того же объекта открывает её прогресс вместо новой.
+    """
+    try:
+        cluster_name = target
+        if scope == "server":
+            cluster_name = await session.scalar(select(Server.cluster_name).where(Server.server_name == target))
+
+        jobs = await get_active_sync_jobs(session, scope=scope, target=target)
+        if jobs:
+            job = jobs[0]
+            if job.status == "running":
+                sync_jobs.start(callback_query.bot, job.id)
+        else:
+            object_title = "сервере" if scope == "server" else "кластере"
+            keys_count = await session.scalar(
+                select(func.count()).select_from(Key).where(Key.server_id == cluster_name, Key.is_frozen.isnot(True))
+            )
+            if not cluster_name or not keys_count:
+                await callback_query.message.edit_text(
+                    text=f"❌ Нет ключей для синхронизации в {object_title} {target}.",
+                    reply_markup=build_admin_back_kb("clusters"),
+                )
+                return
+
+            job_id = await create_sync_job(
+                session,
+                scope=scope,
+                target=target,
+                cluster_name=cluster_name,
+                created_by=callback_query.from_user.id,
+                chat_id=callback_query.message.chat.id,
+                message_id=callback_query.message.message_id,
+            )
+            sync_jobs.start(callback_query.bot, job_id)
+            job = await get_sync_job(session, job_id)
 
+        await callback_query.message.edit_text(**sync_jobs.render(job))
+    except Exception as e:
+        logger.error(f"[Sync] Ошибка запуска синхронизации {target}: {e}")
         await callback_query.message.edit_text(
-            text=f"<b>🔄 Синхронизация кластера {cluster_name}</b>\n\n🔑 Количество ключей: <b>{len(keys_to_sync)}</b>"
+            text=f"❌ Произошла ошибка при синхронизации: {e}",
+            reply_markup=build_admin_back_kb("clusters"),
         )
 
-        for key in keys_to_sync:
-            try:
-                if only_remnawave:
-                    expire_iso = (
-                        datetime.utcfromtimestamp(key["expiry_time"] / 1000).replace(tzinfo=timezone.utc).isoformat()
-                    )
 
-                    remna = RemnawaveAPI(cluster_servers[0]["api_url"])
-                    if not await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD):
-                        raise Exception("Не удалось авторизоваться в Remnawave")
-
-                    traffic_limit_bytes = 0
-                    hwid_limit = 0
-                    subgroup_title = None
-                    if key["tariff_id"]:
-                        tariff = await session.get(Tariff, key["tariff_id"])
-                        if tariff:
-                            if tariff.traffic_limit is not None:
-                                traffic_limit_bytes = int(tariff.traffic_limit * 1024**3)
-                            else:
-                                traffic_limit_bytes = 0
-                            hwid_limit = tariff.device_limit
-                            subgroup_title = tariff.subgroup_title
-                        else:
-                            logger.warning(
-                                f"[Sync] Ключ {key['client_id']} с несуществующим тарифом ID={key['tariff_id']} — обновим без лимитов"
-                            )
-
-                    filtered_servers = cluster_servers
-                    if subgroup_title:
-                        filtered_servers = [
-                            s for s in cluster_servers if subgroup_title in s.get("tariff_subgroups", [])
-                        ]
-                        if not filtered_servers:
-                            logger.warning(
-                                f"[Sync] В кластере {cluster_name} не найдено серверов для подгруппы '{subgroup_title}'. Использую весь кластер."
-                            )
-                            filtered_servers = cluster_servers
-
-                    if tariff and tariff.group_code:
-                        group_code = tariff.group_code.lower()
-                        if group_code in ALLOWED_GROUP_CODES:
-                            special_filtered = [
-                                s for s in filtered_servers if group_code in (s.get("special_groups") or [])
-                            ]
-                            if special_filtered:
-                                filtered_servers = special_filtered
-                            else:
-                                logger.warning(
-                                    f"[Sync] В кластере {cluster_name} нет серверов со спецгруппой '{group_code}'. Использую весь кластер."
-                                )
-
-                    inbound_ids = [s["inbound_id"] for s in filtered_servers if s.get("inbound_id")]
-
-                    success = await remna.update_user(
-                        uuid=key["client_id"],
-                        expire_at=expire_iso,
-                        telegram_id=key["tg_id"],
-                        email=f"{key['email']}@fake.local",
-                        active_user_inbounds=inbound_ids,
-                        traffic_limit_bytes=traffic_limit_bytes,
-                        hwid_device_limit=hwid_limit,
-                    )
+@router.callback_query(AdminSyncCallback.filter(), IsAdminFilter())
+async def handle_sync_control(callback_query: CallbackQuery, callback_data: AdminSyncCallback, session: AsyncSession):
+    await sync_jobs.handle_control(callback_query, session, callback_data.job_id, callback_data.action)
 
-                    if success:
-                        try:
-                            sub = await remna.get_subscription_by_username(key["email"])
-                            if sub:
-                                new_remnawave_link = sub.get("subscriptionUrl")
-                                if HAPP_CRYPTOLINK:
-                                    happ = sub.get("happ") or {}
-                                    new_remnawave_link = happ.get("cryptoLink") or happ.get("link") or new_remnawave_link
-                                
-                                if new_remnawave_link:
-                                    servers = await get_servers(session)
-                                    cluster_servers = servers.get(cluster_name, [])
-                                    
-                                    key_value = await make_aggregated_link(
-                                        session=session,
-                                        cluster_all=cluster_servers,
-                                        cluster_id=cluster_name,
-                                        email=key["email"],
-                                        client_id=key["client_id"],
-                                        tg_id=key["tg_id"],
-                                        remna_link_override=new_remnawave_link,
-                                        plan=key["tariff_id"],
-                                    )
-                                    
-                                    await session.execute(
-                                        update(Key)
-                                        .where(Key.tg_id == key["tg_id"], Key.client_id == key["client_id"])
-                                        .values(
-                                            remnawave_link=new_remnawave_link,
-                                            key=key_value
-                                        )
-                                    )
-                                    await session.commit()
-                                    logger.info(f"[Sync] Обновлена ссылка для {key['email']}: {new_remnawave_link}")
-                        except Exception as e:
-                            logger.warning(f"[Sync] Не удалось получить ссылку для {key['email']}: {e}")
-
-                    if not success:
-                        logger.warning("[Sync] ошибка обновления, пробуем пересоздать")
-
-                        await delete_key_from_cluster(cluster_name, key["email"], key["client_id"], session)
-
-                        await session.execute(
-                            delete(Key).where(Key.tg_id == key["tg_id"], Key.client_id == key["client_id"])
-                        )
-
-                        await create_key_on_cluster(
-                            cluster_name,
-                            key["tg_id"],
-                            key["client_id"],
-                            key["email"],
-                            key["expiry_time"],
-                            plan=key["tariff_id"],
-                            session=session,
-                            remnawave_link=key["remnawave_link"],
-                        )
-
-                    await asyncio.sleep(0.1)
-
-                else:
-                    await delete_key_from_cluster(cluster_name, key["email"], key["client_id"], session)
-
-                    await session.execute(
-                        delete(Key).where(Key.tg_id == key["tg_id"], Key.client_id == key["client_id"])
-                    )
 
-                    await create_key_on_cluster(
-                        cluster_name,
-                        key["tg_id"],
-                        key["client_id"],
-                        key["email"],
-                        key["expiry_time"],
-                        plan=key["tariff_id"],
-                        session=session,
-                        remnawave_link=key["remnawave_link"],
-                    )
+@router.startup()
+async def on_startup():
+    from bot import bot
 
-                    await asyncio.sleep(0.5)
+    await sync_jobs.resume(bot)
 
-            except Exception as e:
-                logger.error(f"[Sync] Ошибка при обработке ключа {key['client_id']} в {cluster_name}: {e}")
 
-        await callback_query.message.edit_text(
-            text=f"✅ Ключи успешно синхронизированы для кластера {cluster_name}",
-            reply_markup=build_admin_back_kb("clusters"),
-        )
-
-    except Exception as e:
-        logger.error(f"[Sync] Ошибка синхронизации кластера {cluster_name}: {e}")
-        await callback_query.message.edit_text(
-            text=f"❌ Произошла ошибка при синхронизации: {e}",
-            reply_markup=build_admin_back_kb("clusters"),
-        )
+@router.shutdown()
+async def on_shutdown():
+    await sync_jobs.stop()
 
 
 @router.callback_query(AdminServerCallback.filter(F.action == "add"), IsAdminFilter())
@@ -1048,6 +712,8 @@ async def handle_new_cluster_name_input(message: Message, state: FSMContext, ses
             )
 
         await session.commit()
+        invalidate_key_load()
+        invalidate_servers_cache()
 
         await message.answer(
             text=f"✅ Название кластера успешно изменено с '{old_cluster_name}' на '{new_cluster_name}'!",
@@ -1160,6 +826,8 @@ async def handle_new_server_name_input(message: Message, state: FSMContext, sess
             await session.execute(update(Key).where(Key.server_id == old_server_name).values(server_id=new_server_name))
 
         await session.commit()
+        invalidate_key_load()
+        invalidate_servers_cache()
 
         await message.answer(
             text=f"✅ Название сервера успешно изменено с '{old_server_name}' на '{new_server_name}' в кластере '{cluster_name}'!",
@@ -1196,6 +864,8 @@ async def handle_server_transfer(callback_query: CallbackQuery, state: FSMContex
         )
 
         await session.commit()
+        invalidate_key_load()
+        invalidate_servers_cache()
 
         base_text = f"✅ Ключи успешно перенесены на сервер '{new_server_name}', сервер '{old_server_name}' удален!"
         sync_reminder = '\n\n⚠️ Не забудьте сделать "Синхронизацию".'
@@ -1238,6 +908,8 @@ async def handle_cluster_transfer(callback_query: CallbackQuery, state: FSMConte
         )
 
         await session.commit()
+        invalidate_key_load()
+        invalidate_servers_cache()
 
         await callback_query.message.edit_text(
             text=(
@@ -1294,6 +966,7 @@ async def apply_tariff_group(callback: CallbackQuery, callback_data: AdminCluste
 
         await session.execute(update(Server).where(Server.cluster_name == cluster_name).values(tariff_group=group_code))
         await session.commit()
+        invalidate_servers_cache()
 
         await callback.message.edit_text(
             f"✅ Для кластера <code>{cluster_name}</code> установлена тарифная группа: <b>{group_code}</b>",
@@ -1459,6 +1132,7 @@ async def apply_tariff_subgroup(
                 ServerSubgroup(server_id=sid, group_code=group_code, subgroup_title=subgroup_title) for sid in to_insert
             ])
             await session.commit()
+            invalidate_servers_cache()
 
         await state.update_data({key: []})
 
@@ -1489,6 +1163,7 @@ async def reset_cluster_subgroups(callback: CallbackQuery, callback_data: AdminC
 
         await session.execute(delete(ServerSubgroup).where(ServerSubgroup.server_id.in_(server_ids)))
         await session.commit()
+        invalidate_servers_cache()
 
         servers = await get_servers(session=session, include_enabled=True)
         cluster_servers = servers.get(cluster_name, [])
@@ -1676,6 +1351,7 @@ async def apply_group_to_servers(
         if to_insert:
             session.add_all([ServerSpecialgroup(server_id=sid, group_code=group_code) for sid in to_insert])
             await session.commit()
+            invalidate_servers_cache()
 
         logger.debug(f"[apply_group_to_servers] group={group_code} server_ids={server_ids}")
 
@@ -1705,6 +1381,7 @@ async def reset_cluster_groups(callback: CallbackQuery, callback_data: AdminClus
             return
         await session.execute(delete(ServerSpecialgroup).where(ServerSpecialgroup.server_id.in_(server_ids)))
         await session.commit()
+        invalidate_servers_cache()
         servers = await get_servers(session=session, include_enabled=True)
         cluster_servers = servers.get(cluster_name, [])
         await callback.message.edit_text(
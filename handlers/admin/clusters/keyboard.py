@@ -11,6 +11,11 @@ class AdminClusterCallback(CallbackData, prefix="admin_cluster"):
     data: str | None = None
 
 
+class AdminSyncCallback(CallbackData, prefix="admin_sync"):
+    action: str
+    job_id: int
+
+
 def build_clusters_editor_kb(servers: dict) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
@@ -238,6 +243,43 @@ def build_sync_cluster_kb(cluster_servers: list, cluster_name: str) -> InlineKey
     return builder.as_markup()
 
 
+def build_sync_progress_kb(job_id: int, status: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+
+    if status in ("running", "paused"):
+        builder.row(
+            InlineKeyboardButton(
+                text="🔄 Обновить",
+                callback_data=AdminSyncCallback(action="refresh", job_id=job_id).pack(),
+            )
+        )
+    if status == "running":
+        builder.row(
+            InlineKeyboardButton(
+                text="⏸ Пауза",
+                callback_data=AdminSyncCallback(action="pause", job_id=job_id).pack(),
+            ),
+            InlineKeyboardButton(
+                text="⛔ Остановить",
+                callback_data=AdminSyncCallback(action="cancel", job_id=job_id).pack(),
+            ),
+        )
+    elif status == "paused":
+        builder.row(
+            InlineKeyboardButton(
+                text="▶️ Продолжить",
+                callback_data=AdminSyncCallback(action="resume", job_id=job_id).pack(),
+            ),
+            InlineKeyboardButton(
+                text="⛔ Остановить",
+                callback_data=AdminSyncCallback(action="cancel", job_id=job_id).pack(),
+            ),
+        )
+    builder.row(build_admin_back_btn("clusters"))
+
+    return builder.as_markup()
+
+
 def build_panel_type_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="🌐 3X-UI", callback_data=AdminClusterCallback(action="panel_3xui").pack())
@@ -0,0 +1,381 @@
+import asyncio
+import time
+
+from collections import Counter
+from dataclasses import dataclass, field
+
+import config as cfg
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from config import REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
+from dateutil import parser
+from sqlalchemy import update
+
+from database import (
+    async_session_maker,
+    get_active_sync_jobs,
+    get_servers,
+    get_sync_job,
+    get_sync_job_status,
+    get_sync_keys_batch,
+    get_tariffs_by_ids,
+    invalidate_key_snapshots,
+    save_sync_progress,
+    set_sync_job_status,
+)
+from database.models import Key
+from handlers.keys.operations.aggregated_links import make_aggregated_link
+from handlers.keys.operations.deletion import delete_on_3xui, delete_on_remnawave
+from handlers.keys.operations.subgroup_migration import ensure_on_3xui, ensure_on_remnawave
+from handlers.keys.operations.utils import bytes_from_gb
+from handlers.utils import ALLOWED_GROUP_CODES
+from logger import logger
+from panels._3xui import InboundSnapshot, get_inbound_snapshot, get_xui_instance
+from panels.remnawave_pool import get_remnawave_api
+
+from ..background_jobs import BackgroundJobs
+from .keyboard import build_sync_progress_kb
+
+
+SYNC_CONCURRENCY = getattr(cfg, "SYNC_CONCURRENCY", 5)
+SYNC_CHUNK_SIZE = 200
+SYNC_EXPIRY_TOLERANCE_MS = 60_000
+SYNC_PROGRESS_INTERVAL = 5
+
+_panel_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+@dataclass
+class PanelState:
+    """Фактическое состояние панелей: снимок inbound'ов 3x-ui по имени сервера и пользователи Remnawave по api_url."""
+
+    xui: dict[str, InboundSnapshot] = field(default_factory=dict)
+    remnawave: dict[str, dict[str, dict]] = field(default_factory=dict)
+
+
+def _panel_semaphore(api_url: str) -> asyncio.Semaphore:
+    return _panel_semaphores.setdefault(api_url, asyncio.Semaphore(SYNC_CONCURRENCY))
+
+
+async def load_panel_state(servers: list[dict]) -> PanelState:
+    """Загружает фактическое состояние всех панелей одним запросом на панель; недоступные панели пропускаются."""
+    state = PanelState()
+
+    async def load_xui(server: dict):
+        xui = await get_xui_instance(server["api_url"])
+        state.xui[server["server_name"]] = await get_inbound_snapshot(xui, force=True)
+
+    async def load_remnawave(api_url: str):
+        remna = await get_remnawave_api(api_url)
+        if not remna:
+            raise RuntimeError("не удалось авторизоваться")
+        users = await remna.get_all_users_time(username=REMNAWAVE_LOGIN, password=REMNAWAVE_PASSWORD) or []
+        state.remnawave[api_url] = {str(user["uuid"]): user for user in users if user.get("uuid")}
+
+    tasks = {}
+    for server in servers:
+        if server.get("panel_type", "3x-ui").lower() == "remnawave":
+            tasks.setdefault(server["api_url"], load_remnawave(server["api_url"]))
+        else:
+            tasks[server["server_name"]] = load_xui(server)
+
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    for name, result in zip(tasks, results, strict=False):
+        if isinstance(result, Exception):
+            logger.error(f"[Sync] Не удалось получить состояние панели {name}: {result}")
+    return state
+
+
+def select_target_servers(cluster_servers: list[dict], tariff: dict | None) -> list[dict]:
+    """Серверы, на которых должен быть ключ: с учётом подгруппы и спецгруппы тарифа, как при создании ключа."""
+    servers = [s for s in cluster_servers if s.get("enabled", True)]
+    if not tariff:
+        return servers
+
+    subgroup_title = tariff.get("subgroup_title")
+    if subgroup_title:
+        servers = [s for s in servers if subgroup_title in s.get("tariff_subgroups", [])] or servers
+
+    group_code = (tariff.get("group_code") or "").lower()
+    if group_code in ALLOWED_GROUP_CODES:
+        servers = [s for s in servers if group_code in (s.get("special_groups") or [])] or servers
+    return servers
+
+
+def _expiry_differs(actual_ms: int | None, expected_ms: int) -> bool:
+    return abs((actual_ms or 0) - (expected_ms or 0)) > SYNC_EXPIRY_TOLERANCE_MS
+
+
+def _remnawave_differs(user: dict, expiry_time: int, squads: list, traffic_bytes: int, hwid_limit: int) -> bool:
+    expire_at = user.get("expireAt")
+    actual_expiry = int(parser.isoparse(expire_at).timestamp() * 1000) if expire_at else 0
+    actual_squads = {s.get("uuid") if isinstance(s, dict) else s for s in user.get("activeInternalSquads") or []}
+    return (
+        _expiry_differs(actual_expiry, expiry_time)
+        or actual_squads != set(squads)
+        or (user.get("trafficLimitBytes") or 0) != traffic_bytes
+        or (user.get("hwidDeviceLimit") or 0) != hwid_limit
+    )
+
+
+async def _sync_key(
+    key: dict, tariff: dict | None, cluster_servers: list[dict], scope: set[str], state: PanelState
+) -> tuple[Counter, str | None]:
+    """Сравнивает ключ с состоянием панелей и применяет только отличающиеся создания, обновления и удаления."""
+    counts = Counter()
+    remnawave_link = None
+
+    total_gb = int(tariff["traffic_limit"]) if tariff and tariff.get("traffic_limit") else 0
+    hwid_limit = int(tariff["device_limit"]) if tariff and tariff.get("device_limit") is not None else 0
+    targets = select_target_servers(cluster_servers, tariff)
+    target_names = {s["server_name"] for s in targets}
+
+    remna_urls = {
+        s["api_url"] for s in cluster_servers if s["server_name"] in scope and s.get("panel_type") == "remnawave"
+    }
+    for api_url in remna_urls:
+        users = state.remnawave.get(api_url)
+        if users is None:
+            counts["failed"] += 1
+            continue
+
+        remna_targets = [s for s in targets if s.get("panel_type") == "remnawave" and s["api_url"] == api_url]
+        user = users.get(key["client_id"])
+        async with _panel_semaphore(api_url):
+            if not remna_targets:
+                if user:
+                    await delete_on_remnawave([{"api_url": api_url}], key["client_id"])
+                    counts["deleted"] += 1
+                continue
+
+            squads = [s["inbound_id"] for s in remna_targets if s.get("inbound_id")]
+            if user and not _remnawave_differs(
+                user, key["expiry_time"], squads, bytes_from_gb(total_gb), hwid_limit
+            ):
+                continue
+
+            client_id, link = await ensure_on_remnawave(
+                servers=remna_targets,
+                email=key["email"],
+                client_id=key["client_id"],
+                tg_id=key["tg_id"],
+                new_expiry_time=key["expiry_time"],
+                total_gb=total_gb,
+                hwid_device_limit=hwid_limit,
+                reset_traffic=False,
+                attempt_update_first=user is not None,
+            )
+        if not client_id:
+            counts["failed"] += 1
+        elif user:
+            counts["updated"] += 1
+        else:
+            counts["created"] += 1
+            remnawave_link = link
+
+    for server in cluster_servers:
+        name = server["server_name"]
+        if name not in scope or server.get("panel_type", "3x-ui").lower() != "3x-ui":
+            continue
+        snapshot = state.xui.get(name)
+        if snapshot is None:
+            counts["failed"] += 1
+            continue
+
+        login_email = f"{key['email']}_{name.lower()}" if SUPERNODE else key["email"]
+        found = snapshot.get_client(login_email)
+        client = found[1] if found else None
+
+        async with _panel_semaphore(server["api_url"]):
+            if name not in target_names:
+                if client:
+                    await delete_on_3xui([server], key["email"], key["client_id"])
+                    counts["deleted"] += 1
+                continue
+
+            if (
+                client
+                and str(client.id) == key["client_id"]
+                and client.enable
+                and not _expiry_differs(client.expiry_time, key["expiry_time"])
+                and (client.total_gb or 0) == bytes_from_gb(total_gb)
+                and (client.limit_ip or 0) == hwid_limit
+            ):
+                continue
+
+            results = await ensure_on_3xui(
+                servers=[server],
+                email=key["email"],
+                client_id=key["client_id"],
+                tg_id=key["tg_id"],
+                new_expiry_time=key["expiry_time"],
+                total_gb=total_gb,
+                hwid_device_limit=hwid_limit,
+                attempt_update_first=client is not None,
+            )
+        if not results.get(name):
+            counts["failed"] += 1
+        elif client:
+            counts["updated"] += 1
+        else:
+            counts["created"] += 1
+
+    return counts, remnawave_link
+
+
+async def _save_remnawave_links(cluster_name: str, cluster_servers: list[dict], links: list[tuple[dict, str]]):
+    async with async_session_maker() as session:
+        for key, link in links:
+            key_value = await make_aggregated_link(
+                session=session,
+                cluster_all=cluster_servers,
+                cluster_id=cluster_name,
+                email=key["email"],
+                client_id=key["client_id"],
+                tg_id=key["tg_id"],
+                remna_link_override=link,
+                plan=key["tariff_id"],
+            )
+            await session.execute(
+                update(Key)
+                .where(Key.tg_id == key["tg_id"], Key.client_id == key["client_id"])
+                .values(remnawave_link=link, key=key_value)
+            )
+        await session.commit()
+    invalidate_key_snapshots(key["email"] for key, _ in links)
+
+
+async def _run_sync(bot: Bot, job_id: int):
+    try:
+        async with async_session_maker() as session:
+            job = await get_sync_job(session, job_id)
+            if not job:
+                logger.warning(f"[Sync] Синхронизация #{job_id} не найдена")
+                return
+            servers = await get_servers(session)
+
+        cluster_servers = servers.get(job.cluster_name, [])
+        scope = {
+            s["server_name"] for s in cluster_servers if job.scope == "cluster" or s["server_name"] == job.target
+        }
+        if not scope:
+            logger.warning(f"[Sync] Нет серверов для синхронизации #{job_id} ({job.target})")
+            async with async_session_maker() as session:
+                await set_sync_job_status(session, job_id, "failed")
+            await _report(bot, job_id)
+            return
+
+        state = await load_panel_state([s for s in cluster_servers if s["server_name"] in scope])
+        last_client_id = job.last_client_id
+        last_report = time.monotonic()
+
+        while True:
+            async with async_session_maker() as session:
+                status = await get_sync_job_status(session, job_id)
+                if status != "running":
+                    logger.info(f"[Sync] Синхронизация #{job_id} остановлена со статусом {status}")
+                    return
+                batch = await get_sync_keys_batch(session, job.cluster_name, SYNC_CHUNK_SIZE, last_client_id)
+                keys = [
+                    {
+                        "tg_id": k.tg_id,
+                        "client_id": k.client_id,
+                        "email": k.email,
+                        "expiry_time": k.expiry_time,
+                        "tariff_id": k.tariff_id,
+                    }
+                    for k in batch
+                ]
+                tariffs = await get_tariffs_by_ids(session, {k["tariff_id"] for k in keys})
+
+            if not keys:
+                async with async_session_maker() as session:
+                    await set_sync_job_status(session, job_id, "completed")
+                await _report(bot, job_id)
+                return
+
+            results = await asyncio.gather(
+                *(_sync_key(key, tariffs.get(key["tariff_id"]), cluster_servers, scope, state) for key in keys),
+                return_exceptions=True,
+            )
+
+            counters = Counter(processed=len(keys))
+            links = []
+            for key, result in zip(keys, results, strict=False):
+                if isinstance(result, Exception):
+                    logger.error(f"[Sync] Ошибка при синхронизации ключа {key['client_id']}: {result}")
+                    counters["failed"] += 1
+                    continue
+                counts, link = result
+                counters.update(counts)
+                if link:
+                    links.append((key, link))
+
+            if links:
+                await _save_remnawave_links(job.cluster_name, cluster_servers, links)
+
+            last_client_id = keys[-1]["client_id"]
+            async with async_session_maker() as session:
+                await save_sync_progress(session, job_id, last_client_id, counters)
+
+            if time.monotonic() - last_report >= SYNC_PROGRESS_INTERVAL:
+                await _report(bot, job_id)
+                last_report = time.monotonic()
+    except Exception:
+        async with async_session_maker() as session:
+            await set_sync_job_status(session, job_id, "failed")
+        await _report(bot, job_id)
+        raise
+
+
+async def _report(bot: Bot, job_id: int):
+    async with async_session_maker() as session:
+        job = await get_sync_job(session, job_id)
+    if not job or not job.chat_id or not job.message_id:
+        return
+
+    try:
+        await bot.edit_message_text(chat_id=job.chat_id, message_id=job.message_id, **sync_jobs.render(job))
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            logger.warning(f"[Sync] Не удалось обновить прогресс синхронизации #{job_id}: {e}")
+    except Exception as e:
+        logger.warning(f"[Sync] Не удалось обновить прогресс синхронизации #{job_id}: {e}")
+
+
+SYNC_STATUS_TITLES = {
+    "running": "🔄 Синхронизация выполняется",
+    "paused": "⏸ Синхронизация на паузе",
+    "cancelled": "⛔ Синхронизация остановлена",
+    "completed": "✅ Синхронизация завершена",
+    "failed": "❌ Синхронизация завершилась с ошибкой",
+}
+
+
+def format_sync_details(job) -> str:
+    total = job.total or 0
+    processed = job.processed or 0
+    percent = min(int(processed * 100 / total), 100) if total else 100
+    target = "Сервер" if job.scope == "server" else "Кластер"
+    return (
+        f"🗂 {target}: <b>{job.target}</b>\n"
+        f"⏳ <b>Обработано ключей:</b> {processed}/{total} ({percent}%)\n"
+        f"➕ <b>Создано:</b> {job.created or 0}\n"
+        f"♻️ <b>Обновлено:</b> {job.updated or 0}\n"
+        f"🗑 <b>Удалено:</b> {job.deleted or 0}\n"
+        f"❌ <b>Ошибок:</b> {job.failed or 0}"
+    )
+
+
+sync_jobs = BackgroundJobs(
+    name="Sync",
+    title="Синхронизация",
+    run=_run_sync,
+    get_job=get_sync_job,
+    get_active_jobs=get_active_sync_jobs,
+    set_status=set_sync_job_status,
+    status_titles=SYNC_STATUS_TITLES,
+    format_details=format_sync_details,
+    build_progress_kb=build_sync_progress_kb,
+)
@@ -151,6 +151,14 @@ def build_back_to_db_menu() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def build_import_confirm_kb(confirm_action: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="✅ Импортировать", callback_data=AdminPanelCallback(action=confirm_action).pack())
+    builder.button(text="🔙 Назад", callback_data=AdminPanelCallback(action="back_to_db_menu").pack())
+    builder.adjust(1)
+    return builder.as_markup()
+
+
 def build_post_import_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(
@@ -8,25 +8,26 @@ import time
 import traceback
 
 from asyncio import sleep
-from datetime import datetime
+from contextlib import suppress
 from tempfile import NamedTemporaryFile
 
 from aiogram import Bot, F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
-from dateutil import parser
 from sqlalchemy import delete, func, select, update
-from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import DB_NAME, DB_PASSWORD, DB_USER, PG_HOST, PG_PORT, REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD
-from database.models import Admin, Key, Server, User
+from database import invalidate_key_snapshots
+from database.importer import import_keys_from_3xui_db, import_remnawave_keys
+from database.models import Admin, Key, Server
 from filters.admin import IsAdminFilter
 from handlers.keys.operations import update_subscription
 from logger import logger
 from middlewares import maintenance
 from panels.remnawave import RemnawaveAPI
+from utils.identity_cache import invalidate_admin
 
 from ..panel.keyboard import build_admin_back_kb
 from .keyboard import (
@@ -36,6 +37,7 @@ from .keyboard import (
     build_back_to_db_menu,
     build_database_kb,
     build_export_db_sources_kb,
+    build_import_confirm_kb,
     build_management_kb,
     build_post_import_kb,
     build_role_selection_kb,
@@ -53,6 +55,7 @@ class AdminManagementStates(StatesGroup):
 
 class Import3xuiStates(StatesGroup):
     waiting_for_file = State()
+    waiting_for_confirm = State()
 
 
 class FileUploadState(StatesGroup):
@@ -122,6 +125,7 @@ async def process_new_domain(message: Message, state: FSMContext, session: Async
         )
         await session.execute(stmt)
         await session.commit()
+        invalidate_key_snapshots()
         logger.info("[DomainChange] Запрос на обновление домена выполнен успешно.")
     except Exception as e:
         logger.error(f"[DomainChange] Ошибка при выполнении запроса: {e}")
@@ -192,6 +196,7 @@ async def save_new_admin(message: Message, session: AsyncSession, state: FSMCont
     else:
         session.add(Admin(tg_id=tg_id, role="moderator", description="Добавлен вручную"))
         await session.commit()
+        invalidate_admin(tg_id)
         await message.answer(f"✅ Админ <code>{tg_id}</code> добавлен.", reply_markup=build_admin_back_kb_to_admins())
 
     await state.clear()
@@ -272,6 +277,7 @@ async def set_admin_role(callback: CallbackQuery, callback_data: AdminPanelCallb
 
     admin.role = role
     await session.commit()
+    invalidate_admin(tg_id)
 
     await callback.message.edit_text(
         f"✅ Роль админа <code>{tg_id}</code> изменена на <b>{role}</b>.", reply_markup=build_single_admin_menu(tg_id)
@@ -284,6 +290,7 @@ async def delete_admin(callback: CallbackQuery, callback_data: AdminPanelCallbac
 
     await session.execute(delete(Admin).where(Admin.tg_id == tg_id))
     await session.commit()
+    invalidate_admin(tg_id)
 
     await callback.message.edit_text(
         f"🗑 Админ <code>{tg_id}</code> удалён.", reply_markup=build_admin_back_kb_to_admins()
@@ -433,31 +440,82 @@ async def handle_export_db(callback: CallbackQuery):
 
 
 @router.callback_query(AdminPanelCallback.filter(F.action == "back_to_db_menu"))
-async def back_to_database_menu(callback: CallbackQuery):
+async def back_to_database_menu(callback: CallbackQuery, state: FSMContext):
+    if await state.get_state() == Import3xuiStates.waiting_for_confirm.state:
+        await discard_import_file(state)
     await callback.message.edit_text("📦 Управление базой данных:", reply_markup=build_database_kb())
 
 
-@router.callback_query(AdminPanelCallback.filter(F.action == "export_remnawave"))
-async def show_remnawave_clients(callback: CallbackQuery, session: AsyncSession):
-    result = await session.execute(select(Server).where(Server.panel_type == "remnawave", Server.enabled.is_(True)))
-    servers = result.scalars().all()
+def remove_import_file(file_path: str | None):
+    if file_path:
+        with suppress(OSError):
+            os.remove(file_path)
 
-    if not servers:
-        await callback.message.edit_text(
-            "❌ Нет доступных Remnawave-серверов.",
-            reply_markup=build_back_to_db_menu(),
+
+async def discard_import_file(state: FSMContext):
+    """Удаляет загруженный x-ui.db, импорт которого не был подтверждён, и сбрасывает состояние."""
+    remove_import_file((await state.get_data()).get("import_file"))
+    await state.clear()
+
+
+def format_import_result(result) -> str:
+    if result.dry_run:
+        return (
+            f"📄 Найдено клиентов: <b>{result.total}</b>\n"
+            f"👤 Будет добавлено пользователей: <b>{result.new_users}</b>\n"
+            f"🔐 Будет добавлено ключей: <b>{result.new_keys}</b>\n"
+            f"⏭ Уже есть в базе: <b>{result.existing_keys}</b>\n"
+            f"⚠️ Email занят другим ключом: <b>{result.conflicts}</b>"
         )
-        return
+    return (
+        f"📄 Найдено клиентов: <b>{result.total}</b>\n"
+        f"👤 Импортировано пользователей: <b>{result.new_users}</b>\n"
+        f"🔐 Импортировано ключей: <b>{result.new_keys}</b>\n"
+        f"⏭ Пропущено (уже есть): <b>{result.skipped}</b>"
+    )
 
-    server = servers[0]
 
-    api = RemnawaveAPI(base_url=server.api_url)
+def make_import_progress(message: Message):
+    last_update = 0.0
+
+    async def progress(done: int, total: int):
+        nonlocal last_update
+        if done < total and time.monotonic() - last_update < 2:
+            return
+        last_update = time.monotonic()
+        try:
+            await message.edit_text(f"📥 Загружено записей: <b>{done}/{total}</b>...")
+        except Exception as e:
+            logger.debug(f"[Import] Не удалось обновить прогресс: {e}")
 
+    return progress
+
+
+async def fetch_remnawave_import_users(session: AsyncSession) -> tuple[list[dict], str] | None:
+    result = await session.execute(select(Server).where(Server.panel_type == "remnawave", Server.enabled.is_(True)))
+    server = result.scalars().first()
+    if not server:
+        return None
+
+    api = RemnawaveAPI(base_url=server.api_url)
     users = await api.get_all_users_time(
         username=REMNAWAVE_LOGIN,
         password=REMNAWAVE_PASSWORD,
     )
+    return users or [], server.cluster_name or server.server_name
 
+
+@router.callback_query(AdminPanelCallback.filter(F.action == "export_remnawave"))
+async def show_remnawave_clients(callback: CallbackQuery, session: AsyncSession):
+    fetched = await fetch_remnawave_import_users(session)
+    if fetched is None:
+        await callback.message.edit_text(
+            "❌ Нет доступных Remnawave-серверов.",
+            reply_markup=build_back_to_db_menu(),
+        )
+        return
+
+    users, server_id = fetched
     if not users:
         await callback.message.edit_text(
             "📭 На панели нет клиентов.",
@@ -467,118 +525,51 @@ async def show_remnawave_clients(callback: CallbackQuery, session: AsyncSession)
 
     logger.warning(f"[Remnawave Export] Пример ответа:\n{json.dumps(users[:3], indent=2, ensure_ascii=False)}")
 
-    added_users = await import_remnawave_users(session, users)
-
-    server_id = server.cluster_name or server.server_name
-
-    added_keys = await import_remnawave_keys(session, users, server_id=server_id)
+    diff = await import_remnawave_keys(session, users, server_id=server_id, dry_run=True)
 
     preview = ""
     for i, user in enumerate(users[:3], 1):
         email = user.get("email") or user.get("username") or "-"
-        expire = user.get("expireAt", "")[:10]
+        expire = (user.get("expireAt") or "")[:10]
         preview += f"{i}. {email} — до {expire}\n"
 
     await callback.message.edit_text(
-        f"📄 Найдено клиентов: <b>{len(users)}</b>\n"
-        f"👤 Импортировано пользователей: <b>{added_users}</b>\n"
-        f"🔐 Импортировано ключей: <b>{added_keys}</b>\n\n"
-        f"<b>Первые 3:</b>\n{preview}",
-        reply_markup=build_back_to_db_menu(),
+        f"{format_import_result(diff)}\n\n<b>Первые 3:</b>\n{preview}",
+        reply_markup=build_import_confirm_kb("import_remnawave_confirm"),
     )
 
 
-async def import_remnawave_users(session: AsyncSession, users: list[dict]) -> int:
-    added = 0
-
-    for user in users:
-        tg_id = user.get("telegramId")
-        if not tg_id:
-            continue
-
-        exists = await session.execute(select(User).where(User.tg_id == tg_id))
-        if exists.scalar():
-            continue
-
-        try:
-            new_user = User(
-                tg_id=tg_id,
-                username=None,
-                first_name=None,
-                last_name=None,
-                language_code=None,
-                is_bot=False,
-                balance=0.0,
-                trial=1,
-                source_code=None,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
-            )
-            session.add(new_user)
-            added += 1
-
-        except SQLAlchemyError as e:
-            logger.error(f"[Remnawave Import] Ошибка при добавлении пользователя {tg_id}: {e}")
-            continue
-
-    await session.commit()
-    return added
-
+@router.callback_query(AdminPanelCallback.filter(F.action == "import_remnawave_confirm"))
+async def handle_remnawave_import_confirm(callback: CallbackQuery, session: AsyncSession):
+    await callback.message.edit_text("📥 Получаю клиентов с панели...")
 
-async def import_remnawave_keys(session: AsyncSession, users: list[dict], server_id: str) -> int:
-    added = 0
-
-    for user in users:
-        tg_id = user.get("telegramId")
-        client_id = user.get("uuid")
-        email = user.get("email") or user.get("username")
-        remnawave_link = user.get("subscriptionUrl")
-        expire_at = user.get("expireAt")
-        created_at = user.get("createdAt")
-
-        if not tg_id or not client_id:
-            logger.warning(f"[SKIP] Пропущен клиент: tg_id={tg_id}, client_id={client_id}")
-            continue
-
-        exists_stmt = await session.execute(select(Key).where(Key.client_id == client_id))
-        if exists_stmt.scalar():
-            logger.info(f"[SKIP] Ключ уже существует: {client_id}")
-            continue
-
-        try:
-            created_ts = int(parser.isoparse(created_at).timestamp() * 1000) if created_at else int(time.time() * 1000)
-            expire_ts = int(parser.isoparse(expire_at).timestamp() * 1000) if expire_at else int(time.time() * 1000)
-
-            new_key = Key(
-                tg_id=tg_id,
-                client_id=client_id,
-                email=email,
-                created_at=created_ts,
-                expiry_time=expire_ts,
-                key="",
-                server_id=server_id,
-                remnawave_link=remnawave_link,
-                tariff_id=None,
-                is_frozen=False,
-                alias=None,
-                notified=False,
-                notified_24h=False,
-            )
-            session.add(new_key)
-            added += 1
-
-            logger.info(f"[ADD] Ключ добавлен: {client_id}, до {expire_at}, email={email}, server_id={server_id}")
+    fetched = await fetch_remnawave_import_users(session)
+    if not fetched or not fetched[0]:
+        await callback.message.edit_text(
+            "📭 На панели нет клиентов.",
+            reply_markup=build_back_to_db_menu(),
+        )
+        return
 
-        except Exception as e:
-            logger.error(f"[ERROR] Ошибка при добавлении ключа {client_id}: {e}")
+    users, server_id = fetched
+    try:
+        result = await import_remnawave_keys(
+            session, users, server_id=server_id, progress=make_import_progress(callback.message)
+        )
+    except Exception as e:
+        logger.error(f"[Remnawave Import] Ошибка: {e}")
+        await callback.message.edit_text(
+            "❌ Произошла ошибка при импорте.",
+            reply_markup=build_back_to_db_menu(),
+        )
+        return
 
-    await session.commit()
-    logger.info(f"[IMPORT] Всего добавлено ключей: {added}")
-    return added
+    await callback.message.edit_text(format_import_result(result), reply_markup=build_back_to_db_menu())
 
 
 @router.callback_query(AdminPanelCallback.filter(F.action == "request_3xui_file"))
 async def prompt_for_3xui_file(callback: CallbackQuery, state: FSMContext):
+    await discard_import_file(state)
     await callback.message.edit_text(
         "📂 Пришлите файл базы данных <code>x-ui.db</code> для восстановления подписок и клиентов.\n\n"
         "Формат: SQLite-файл с таблицей <code>inbounds</code>.\n\n"
@@ -600,28 +591,47 @@ async def handle_3xui_db_upload(message: Message, state: FSMContext, session: As
     file_path = f"/tmp/{file.file_name}"
     await message.bot.download(file, destination=file_path)
 
-    processing_message = await message.reply("📥 Файл получен. Начинаю восстановление...")
+    processing_message = await message.reply("📥 Файл получен. Проверяю изменения...")
 
     try:
-        from database.importer import import_keys_from_3xui_db
+        diff = await import_keys_from_3xui_db(file_path, session, dry_run=True)
+    except Exception as e:
+        logger.error(f"[Import 3x-ui] Ошибка: {e}")
+        await processing_message.edit_text(
+            "❌ Произошла ошибка при импорте. Убедись, что это валидный файл <code>x-ui.db</code>",
+            reply_markup=build_back_to_db_menu(),
+        )
+        remove_import_file(file_path)
+        await state.clear()
+        return
 
-        imported, skipped = await import_keys_from_3xui_db(file_path, session)
+    await state.update_data(import_file=file_path)
+    await state.set_state(Import3xuiStates.waiting_for_confirm)
+    await processing_message.edit_text(
+        format_import_result(diff),
+        reply_markup=build_import_confirm_kb("import_3xui_confirm"),
+    )
 
-        await processing_message.edit_text(
-            f"✅ Восстановление завершено:\n"
-            f"🔐 Импортировано подписок: <b>{imported}</b>\n"
-            f"⏭ Пропущено (уже есть): <b>{skipped}</b>",
+
+@router.callback_query(AdminPanelCallback.filter(F.action == "import_3xui_confirm"), Import3xuiStates.waiting_for_confirm)
+async def handle_3xui_import_confirm(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    file_path = (await state.get_data()).get("import_file")
+    await state.clear()
+
+    try:
+        result = await import_keys_from_3xui_db(file_path, session, progress=make_import_progress(callback.message))
+        await callback.message.edit_text(
+            f"✅ Восстановление завершено:\n{format_import_result(result)}",
             reply_markup=build_post_import_kb(),
         )
-
     except Exception as e:
         logger.error(f"[Import 3x-ui] Ошибка: {e}")
-        await processing_message.edit_text(
+        await callback.message.edit_text(
             "❌ Произошла ошибка при импорте. Убедись, что это валидный файл <code>x-ui.db</code>",
             reply_markup=build_back_to_db_menu(),
         )
-
-    await state.clear()
+    finally:
+        remove_import_file(file_path)
 
 
 @router.callback_query(AdminPanelCallback.filter(F.action == "resync_after_import"))
@@ -0,0 +1,213 @@
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from database import (
+    async_session_maker,
+    create_blocked_users,
+    get_active_broadcast_jobs,
+    get_broadcast_job,
+    get_broadcast_job_status,
+    get_pending_broadcast_recipients,
+    save_broadcast_results,
+    set_broadcast_job_status,
+)
+from logger import logger
+
+from ..background_jobs import BackgroundJobs
+from .keyboard import build_broadcast_progress_kb
+
+
+BROADCAST_RATE_PER_SECOND = 28
+BROADCAST_MAX_IN_FLIGHT = 25
+BROADCAST_CHUNK_SIZE = 200
+BROADCAST_MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+    """
+    Общий для всех рассылок лимит Telegram: не больше rate сообщений в секунду.
+
+    После TelegramRetryAfter выдача токенов останавливается для всех отправителей сразу.
+    """
+
+    def __init__(self, rate: float, capacity: int | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(int(rate), 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def block(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._updated_at = self._blocked_until
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+_bucket = TokenBucket(BROADCAST_RATE_PER_SECOND)
+
+
+async def _deliver(
+    bot: Bot, tg_id: int, text: str, photo: str | None, keyboard: InlineKeyboardMarkup | None
+) -> bool | None:
+    """Возвращает True при доставке, False при ошибке и None, если бот заблокирован пользователем."""
+    for _ in range(BROADCAST_MAX_ATTEMPTS):
+        await _bucket.acquire()
+        try:
+            if photo:
+                await bot.send_photo(chat_id=tg_id, photo=photo, caption=text, parse_mode="HTML", reply_markup=keyboard)
+            else:
+                await bot.send_message(chat_id=tg_id, text=text, parse_mode="HTML", reply_markup=keyboard)
+            return True
+        except TelegramRetryAfter as e:
+            logger.warning(f"⚠️ Flood control: повтор через {e.retry_after} сек. для пользователя {tg_id}")
+            _bucket.block(e.retry_after + 1)
+        except TelegramForbiddenError:
+            logger.warning(f"🚫 Бот заблокирован пользователем {tg_id}.")
+            return None
+        except TelegramBadRequest as bad_request:
+            if "chat not found" in str(bad_request).lower():
+                logger.warning(f"🚫 Чат не найден для пользователя {tg_id}.")
+                return None
+            logger.warning(f"📩 Не удалось отправить сообщение пользователю {tg_id}: {bad_request}")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Ошибка отправки сообщения пользователю {tg_id}: {e}")
+            return False
+    return False
+
+
+async def _send_to_recipient(
+    bot: Bot,
+    job,
+    keyboard: InlineKeyboardMarkup | None,
+    tg_id: int,
+    semaphore: asyncio.Semaphore,
+    sent: list[int],
+    failed: list[int],
+    blocked: list[int],
+):
+    async with semaphore:
+        result = await _deliver(bot, tg_id, job.text, job.photo, keyboard)
+    if result:
+        sent.append(tg_id)
+    elif result is None:
+        blocked.append(tg_id)
+    else:
+        failed.append(tg_id)
+
+
+async def _run_broadcast(bot: Bot, job_id: int):
+    """Отправляет рассылку пачками, пока её статус "running"; результаты сохраняются после каждой пачки."""
+    async with async_session_maker() as session:
+        job = await get_broadcast_job(session, job_id)
+    if not job:
+        logger.warning(f"[Broadcast] Рассылка #{job_id} не найдена")
+        return
+
+    keyboard = None
+    if job.keyboard:
+        try:
+            keyboard = InlineKeyboardMarkup.model_validate(job.keyboard)
+        except Exception as e:
+            logger.error(f"[Broadcast] Ошибка восстановления клавиатуры рассылки #{job_id}: {e}")
+
+    semaphore = asyncio.Semaphore(BROADCAST_MAX_IN_FLIGHT)
+    last_tg_id = None
+
+    while True:
+        async with async_session_maker() as session:
+            status = await get_broadcast_job_status(session, job_id)
+            if status != "running":
+                logger.info(f"[Broadcast] Рассылка #{job_id} остановлена со статусом {status}")
+                return
+            tg_ids = await get_pending_broadcast_recipients(
+                session, job_id, BROADCAST_CHUNK_SIZE, after_tg_id=last_tg_id
+            )
+
+        if not tg_ids:
+            async with async_session_maker() as session:
+                await set_broadcast_job_status(session, job_id, "completed")
+            await _notify_owner(bot, job_id)
+            return
+
+        sent, failed, blocked = [], [], []
+        try:
+            await asyncio.gather(
+                *(
+                    _send_to_recipient(bot, job, keyboard, tg_id, semaphore, sent, failed, blocked)
+                    for tg_id in tg_ids
+                )
+            )
+        finally:
+            async with async_session_maker() as session:
+                await save_broadcast_results(session, job_id, sent, failed + blocked)
+                await create_blocked_users(session, blocked)
+
+        last_tg_id = tg_ids[-1]
+
+
+async def _notify_owner(bot: Bot, job_id: int):
+    async with async_session_maker() as session:
+        job = await get_broadcast_job(session, job_id)
+    if not job or not job.created_by:
+        return
+
+    try:
+        await bot.send_message(job.created_by, **broadcast_jobs.render(job))
+    except Exception as e:
+        logger.warning(f"[Broadcast] Не удалось отправить итог рассылки #{job_id}: {e}")
+
+
+BROADCAST_STATUS_TITLES = {
+    "running": "📤 Рассылка выполняется",
+    "paused": "⏸ Рассылка на паузе",
+    "cancelled": "⛔ Рассылка остановлена",
+    "completed": "📤 Рассылка завершена!",
+}
+
+
+def format_broadcast_details(job) -> str:
+    total = job.total or 0
+    sent = job.sent or 0
+    failed = job.failed or 0
+    done = sent + failed
+    percent = int(done * 100 / total) if total else 100
+    return (
+        f"👥 <b>Количество получателей:</b> {total}\n"
+        f"✅ <b>Доставлено:</b> {sent}\n"
+        f"❌ <b>Не доставлено:</b> {failed}\n"
+        f"⏳ <b>Обработано:</b> {done}/{total} ({percent}%)"
+    )
+
+
+broadcast_jobs = BackgroundJobs(
+    name="Broadcast",
+    title="Рассылка",
+    run=_run_broadcast,
+    get_job=get_broadcast_job,
+    get_active_jobs=get_active_broadcast_jobs,
+    set_status=set_broadcast_job_status,
+    status_titles=BROADCAST_STATUS_TITLES,
+    format_details=format_broadcast_details,
+    build_progress_kb=build_broadcast_progress_kb,
+)
@@ -10,6 +10,11 @@ class AdminSenderCallback(CallbackData, prefix="admin_sender"):
     data: str | None = None
 
 
+class AdminBroadcastCallback(CallbackData, prefix="admin_broadcast"):
+    action: str
+    job_id: int
+
+
 def build_sender_kb() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
@@ -72,3 +77,40 @@ def build_clusters_kb(clusters: list) -> InlineKeyboardMarkup:
     builder.row(build_admin_back_btn())
 
     return builder.as_markup()
+
+
+def build_broadcast_progress_kb(job_id: int, status: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+
+    if status in ("running", "paused"):
+        builder.row(
+            InlineKeyboardButton(
+                text="🔄 Обновить",
+                callback_data=AdminBroadcastCallback(action="refresh", job_id=job_id).pack(),
+            )
+        )
+    if status == "running":
+        builder.row(
+            InlineKeyboardButton(
+                text="⏸ Пауза",
+                callback_data=AdminBroadcastCallback(action="pause", job_id=job_id).pack(),
+            ),
+            InlineKeyboardButton(
+                text="⛔ Остановить",
+                callback_data=AdminBroadcastCallback(action="cancel", job_id=job_id).pack(),
+            ),
+        )
+    elif status == "paused":
+        builder.row(
+            InlineKeyboardButton(
+                text="▶️ Продолжить",
+                callback_data=AdminBroadcastCallback(action="resume", job_id=job_id).pack(),
+            ),
+            InlineKeyboardButton(
+                text="⛔ Остановить",
+                callback_data=AdminBroadcastCallback(action="cancel", job_id=job_id).pack(),
+            ),
+        )
+    builder.row(build_admin_back_btn("sender"))
+
+    return builder.as_markup()
@@ -1,104 +1,34 @@
-import asyncio
 import json
 import re
 
 from datetime import datetime
 
 from aiogram import F, Router
-from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from sqlalchemy import distinct, exists, func, not_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import create_blocked_user
+from database import create_broadcast_job, get_broadcast_job
 from database.models import BlockedUser, Key, ManualBan, Payment, Server, Tariff, User
 from filters.admin import IsAdminFilter
 from logger import logger
 
 from ..panel.keyboard import AdminPanelCallback, build_admin_back_kb
-from .keyboard import AdminSenderCallback, build_clusters_kb, build_sender_kb
+from .broadcast import broadcast_jobs
+from .keyboard import (
+    AdminBroadcastCallback,
+    AdminSenderCallback,
+    build_clusters_kb,
+    build_sender_kb,
+)
 
 
 router = Router()
 
 
-async def try_add_blocked_user(tg_id: int, session: AsyncSession):
-    if session:
-        try:
-            await create_blocked_user(session, tg_id)
-            logger.info(f"Пользователь {tg_id} добавлен в blocked_users.")
-        except Exception as e:
-            logger.warning(f"Не удалось добавить {tg_id} в blocked_users: {e}")
-
-
-async def send_broadcast_batch(bot, messages, batch_size=15, session=None):
-    results = []
-    min_interval = 1.0 / 15
-
-    for msg in messages:
-        tg_id = msg["tg_id"]
-        text = msg["text"]
-        photo = msg.get("photo")
-        keyboard = msg.get("keyboard")
-
-        try:
-            if photo:
-                await bot.send_photo(chat_id=tg_id, photo=photo, caption=text, parse_mode="HTML", reply_markup=keyboard)
-            else:
-                await bot.send_message(chat_id=tg_id, text=text, parse_mode="HTML", reply_markup=keyboard)
-            results.append(True)
-
-        except TelegramRetryAfter as e:
-            retry_in = int(e.retry_after) + 1
-            logger.warning(f"⚠️ Flood control: повтор через {retry_in} сек. для пользователя {tg_id}")
-            await asyncio.sleep(e.retry_after)
-            try:
-                if photo:
-                    await bot.send_photo(
-                        chat_id=tg_id, photo=photo, caption=text, parse_mode="HTML", reply_markup=keyboard
-                    )
-                else:
-                    await bot.send_message(chat_id=tg_id, text=text, parse_mode="HTML", reply_markup=keyboard)
-                results.append(True)
-            except TelegramForbiddenError:
-                logger.warning(f"🚫 Бот заблокирован пользователем {tg_id}.")
-                await try_add_blocked_user(tg_id, session)
-                results.append(False)
-            except TelegramBadRequest as bad_request:
-                error_msg = str(bad_request).lower()
-                if "chat not found" in error_msg:
-                    logger.warning(f"🚫 Чат не найден для пользователя {tg_id}.")
-                    await try_add_blocked_user(tg_id, session)
-                else:
-                    logger.warning(f"📩 Не удалось отправить сообщение пользователю {tg_id}: {bad_request}")
-                results.append(False)
-            except Exception as retry_error:
-                logger.error(f"❌ Ошибка повторной отправки пользователю {tg_id}: {retry_error}")
-                results.append(False)
-
-        except TelegramForbiddenError:
-            logger.warning(f"🚫 Бот заблокирован пользователем {tg_id}.")
-            await try_add_blocked_user(tg_id, session)
-            results.append(False)
-        except TelegramBadRequest as bad_request:
-            error_msg = str(bad_request).lower()
-            if "chat not found" in error_msg:
-                logger.warning(f"🚫 Чат не найден для пользователя {tg_id}.")
-                await try_add_blocked_user(tg_id, session)
-            else:
-                logger.warning(f"📩 Не удалось отправить сообщение пользователю {tg_id}: {bad_request}")
-            results.append(False)
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки сообщения пользователю {tg_id}: {e}")
-            results.append(False)
-
-        await asyncio.sleep(min_interval)
-
-    return results
-
-
 class AdminSender(StatesGroup):
     waiting_for_message = State()
     preview = State()
@@ -337,35 +267,42 @@ async def handle_send_confirm(callback_query: CallbackQuery, state: FSMContext,
     send_to = data.get("type", "all")
     cluster_name = data.get("cluster_name")
 
-    keyboard = None
-    if keyboard_data:
-        try:
-            keyboard = InlineKeyboardMarkup.model_validate(keyboard_data)
-        except Exception as e:
-            logger.error(f"Ошибка восстановления клавиатуры: {e}")
+    tg_ids, _ = await get_recipients(session, send_to, cluster_name)
+
+    job_id = await create_broadcast_job(
+        session,
+        tg_ids,
+        text=text_message,
+        photo=photo,
+        keyboard=keyboard_data,
+        send_to=send_to,
+        cluster_name=cluster_name,
+        created_by=callback_query.from_user.id,
+    )
+    broadcast_jobs.start(callback_query.bot, job_id)
+    await state.clear()
 
-    tg_ids, total_users = await get_recipients(session, send_to, cluster_name)
+    job = await get_broadcast_job(session, job_id)
+    await callback_query.message.edit_text(**broadcast_jobs.render(job))
 
-    await callback_query.message.edit_text(f"📤 <b>Рассылка начата!</b>\n👥 Количество получателей: {total_users}")
 
-    messages = []
-    for tg_id in tg_ids:
-        message_data = {"tg_id": tg_id, "text": text_message, "photo": photo, "keyboard": keyboard}
-        messages.append(message_data)
+@router.callback_query(AdminBroadcastCallback.filter(), IsAdminFilter())
+async def handle_broadcast_control(
+    callback_query: CallbackQuery, callback_data: AdminBroadcastCallback, session: AsyncSession
+):
+    await broadcast_jobs.handle_control(callback_query, session, callback_data.job_id, callback_data.action)
 
-    results = await send_broadcast_batch(bot=callback_query.bot, messages=messages, batch_size=15, session=session)
-    success_count = sum(1 for result in results if result)
 
-    await callback_query.message.answer(
-        text=(
-            f"📤 <b>Рассылка завершена!</b>\n\n"
-            f"👥 <b>Количество получателей:</b> {total_users}\n"
-            f"✅ <b>Доставлено:</b> {success_count}\n"
-            f"❌ <b>Не доставлено:</b> {total_users - success_count}"
-        ),
-        reply_markup=build_admin_back_kb("sender"),
-    )
-    await state.clear()
+@router.startup()
+async def on_startup():
+    from bot import bot
+
+    await broadcast_jobs.resume(bot)
+
+
+@router.shutdown()
+async def on_shutdown():
+    await broadcast_jobs.stop()
 
 
 @router.callback_query(F.data == "cancel_message", IsAdminFilter())
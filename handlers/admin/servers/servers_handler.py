@@ -6,7 +6,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_servers
+from database import get_servers, invalidate_servers_cache
 from database.models import Key, Server
 from database.servers import (
     get_available_clusters,
@@ -41,6 +41,25 @@ class ServerEditState(StatesGroup):
     editing_value = State()
 
 
+def format_server_health(server_name: str) -> str:
+    from servers import get_server_health
+
+    health = get_server_health(server_name)
+    if not health or not health.checked_at:
+        return "📶 Состояние: <b>ещё не проверялся</b>\n"
+
+    status = "🟢 в сети" if health.online else "🔴 недоступен"
+    text = f"📶 Состояние: <b>{status}</b> ({health.checked_at:%H:%M:%S})\n"
+    if health.latency_ms is not None:
+        text += f"⏱ Задержка ({health.method}): <b>{health.latency_ms:.0f} мс</b>"
+        if health.avg_latency_ms is not None:
+            text += f", в среднем <b>{health.avg_latency_ms:.0f} мс</b>"
+        text += "\n"
+    if health.panel_ok is False:
+        text += "⚠️ API панели не отвечает\n"
+    return text
+
+
 @router.callback_query(AdminServerCallback.filter(F.action == "manage"), IsAdminFilter())
 async def handle_server_manage(
     callback_query: CallbackQuery,
@@ -85,6 +104,7 @@ async def handle_server_manage(
         if subscription_count > 0:
             text += f"🔑 Подписок на сервере: <b>{subscription_count}</b>\n"
 
+        text += format_server_health(server_name)
         text += "</blockquote>"
 
         await callback_query.message.edit_text(
@@ -230,6 +250,7 @@ async def process_callback_delete_server(
         stmt_delete = delete(Server).where((Server.cluster_name == cluster_name) & (Server.server_name == server_name))
         await session.execute(stmt_delete)
         await session.commit()
+        invalidate_servers_cache()
         await callback_query.message.edit_text(
             text=f"✅ Сервер '{server_name}' удален. Кластер '{cluster_name}' также удален, так как в нем не осталось серверов.",
             reply_markup=build_admin_back_kb("clusters"),
@@ -238,6 +259,7 @@ async def process_callback_delete_server(
         stmt_delete = delete(Server).where((Server.cluster_name == cluster_name) & (Server.server_name == server_name))
         await session.execute(stmt_delete)
         await session.commit()
+        invalidate_servers_cache()
         await callback_query.message.edit_text(
             text=f"✅ Сервер '{server_name}' удален.",
             reply_markup=build_admin_back_kb("clusters"),
@@ -257,6 +279,7 @@ async def toggle_server_enabled(
 
     await session.execute(update(Server).where(Server.server_name == server_name).values(enabled=new_status))
     await session.commit()
+    invalidate_servers_cache()
 
     servers = await get_servers(session=session, include_enabled=True)
 
@@ -310,6 +333,7 @@ async def save_server_limit(message: types.Message, state: FSMContext, session:
 
         await session.execute(update(Server).where(Server.server_name == server_name).values(max_keys=new_value))
         await session.commit()
+        invalidate_servers_cache()
 
         servers = await get_servers(session=session, include_enabled=True)
         cluster_name, server = next(
@@ -230,8 +230,8 @@ async def handle_stats(callback_query: CallbackQuery, session: AsyncSession):
 async def handle_export_users_csv(callback_query: CallbackQuery, session: AsyncSession):
     kb = build_admin_back_kb("stats")
     try:
-        export = await export_users_csv(session)
-        await callback_query.message.answer_document(document=export, caption="📅 Экспорт пользователей в CSV")
+        with await export_users_csv(session) as export:
+            await callback_query.message.answer_document(document=export, caption="📅 Экспорт пользователей в CSV")
     except Exception as e:
         logger.error(f"Ошибка при экспорте пользователей: {e}")
         await callback_query.message.edit_text(text=f"❗ Ошибка: {e}", reply_markup=kb)
@@ -241,8 +241,8 @@ async def handle_export_users_csv(callback_query: CallbackQuery, session: AsyncS
 async def handle_export_payments_csv(callback_query: CallbackQuery, session: AsyncSession):
     kb = build_admin_back_kb("stats")
     try:
-        export = await export_payments_csv(session)
-        await callback_query.message.answer_document(document=export, caption="📅 Экспорт платежей в CSV")
+        with await export_payments_csv(session) as export:
+            await callback_query.message.answer_document(document=export, caption="📅 Экспорт платежей в CSV")
     except Exception as e:
         logger.error(f"Ошибка при экспорте платежей: {e}")
         await callback_query.message.edit_text(text=f"❗ Ошибка: {e}", reply_markup=kb)
@@ -252,8 +252,8 @@ async def handle_export_payments_csv(callback_query: CallbackQuery, session: Asy
 async def handle_export_hot_leads_csv(callback_query: CallbackQuery, session: AsyncSession):
     kb = build_admin_back_kb("stats")
     try:
-        export = await export_hot_leads_csv(session)
-        await callback_query.message.answer_document(document=export, caption="📅 Экспорт горящих лидов")
+        with await export_hot_leads_csv(session) as export:
+            await callback_query.message.answer_document(document=export, caption="📅 Экспорт горящих лидов")
     except Exception as e:
         logger.error(f"Ошибка при экспорте горящих лидов: {e}")
         await callback_query.message.edit_text(text=f"❗ Ошибка: {e}", reply_markup=kb)
@@ -263,8 +263,8 @@ async def handle_export_hot_leads_csv(callback_query: CallbackQuery, session: As
 async def handle_export_keys_csv(callback_query: CallbackQuery, session: AsyncSession):
     kb = build_admin_back_kb("stats")
     try:
-        export = await export_keys_csv(session)
-        await callback_query.message.answer_document(document=export, caption="📅 Экспорт подписок в CSV")
+        with await export_keys_csv(session) as export:
+            await callback_query.message.answer_document(document=export, caption="📅 Экспорт подписок в CSV")
     except Exception as e:
         logger.error(f"Ошибка при экспорте подписок: {e}")
         await callback_query.message.edit_text(text=f"❗ Ошибка: {e}", reply_markup=kb)
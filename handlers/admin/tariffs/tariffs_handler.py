@@ -18,7 +18,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy import delete, distinct, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import create_tariff
+from database import create_tariff, invalidate_servers_cache
 from database.models import Gift, Key, Server, Tariff
 from database.tariffs import (
     create_subgroup_hash,
@@ -537,6 +537,7 @@ async def delete_tariff_with_gift_replacement(callback: CallbackQuery, session:
         await session.execute(update(Server).where(Server.tariff_group == group_code).values(tariff_group=None))
 
     await session.commit()
+    invalidate_servers_cache()
     await callback.message.edit_text("🗑 Тариф удалён. Все подарки обновлены.", reply_markup=build_tariff_menu_kb())
 
 
@@ -574,6 +575,7 @@ async def delete_tariff(callback: CallbackQuery, session: AsyncSession):
         await session.execute(update(Server).where(Server.tariff_group == group_code).values(tariff_group=None))
 
     await session.commit()
+    invalidate_servers_cache()
     await callback.message.edit_text("🗑 Тариф успешно удалён.", reply_markup=build_tariff_menu_kb())
 
 
@@ -46,6 +46,7 @@ from handlers.utils import generate_random_email, sanitize_key_name
 from logger import logger
 from panels.remnawave import RemnawaveAPI
 from utils.csv_export import export_referrals_csv
+from utils.identity_cache import invalidate_ban, invalidate_user
 
 from ..panel.keyboard import (
     AdminPanelCallback,
@@ -465,6 +466,7 @@ async def handle_balance_add(
         else:
             new_balance = max(0, old_balance + amount)
             await set_user_balance(session, tg_id, new_balance)
+        invalidate_user(tg_id)
         if old_balance != new_balance:
             await handle_balance_change(callback_query, callback_data, session)
         return
@@ -539,6 +541,7 @@ async def handle_balance_input(message: Message, state: FSMContext, session: Any
     else:
         text = f"✅ Баланс пользователя изменен на <b>{amount}Р</b>"
         await set_user_balance(session, tg_id, amount)
+    invalidate_user(tg_id)
 
     await message.answer(text=text, reply_markup=build_users_balance_change_kb(tg_id))
 
@@ -1114,6 +1117,8 @@ async def handle_delete_user_confirm(
 
     try:
         await delete_user_data(session, tg_id)
+        invalidate_user(tg_id)
+        invalidate_ban(tg_id)
 
         await callback_query.message.edit_text(
             text=f"🗑️ Пользователь с ID {tg_id} был удален.",
@@ -1345,6 +1350,7 @@ async def restore_trials(callback_query: types.CallbackQuery, session: AsyncSess
         stmt = update(User).where(User.tg_id.in_(users_to_reset)).values(trial=0)
         await session.execute(stmt)
         await session.commit()
+        invalidate_user()
 
     builder = InlineKeyboardBuilder()
     builder.row(build_admin_back_btn())
@@ -1664,6 +1670,7 @@ async def handle_ban_forever_reason_input(message: Message, state: FSMContext, s
 
     await session.execute(stmt)
     await session.commit()
+    invalidate_ban(tg_id)
     await state.clear()
 
     await message.answer(
@@ -1741,6 +1748,7 @@ async def handle_ban_duration_input(message: Message, state: FSMContext, session
 
         await session.execute(stmt)
         await session.commit()
+        invalidate_ban(tg_id)
 
         text = (
             f"✅ Пользователь <code>{tg_id}</code> временно забанен до <b>{until:%Y-%m-%d %H:%M}</b> по UTC."
@@ -1778,6 +1786,7 @@ async def handle_ban_shadow(callback: CallbackQuery, callback_data: AdminUserEdi
     )
     await session.execute(stmt)
     await session.commit()
+    invalidate_ban(callback_data.tg_id)
 
     await callback.message.edit_text(
         text=f"👻 Пользователь <code>{callback_data.tg_id}</code> получил теневой бан.",
@@ -1793,6 +1802,7 @@ async def handle_user_unban(
 ):
     await session.execute(delete(ManualBan).where(ManualBan.tg_id == callback_data.tg_id))
     await session.commit()
+    invalidate_ban(callback_data.tg_id)
 
     text = (
         f"✅ Пользователь <code>{callback_data.tg_id}</code> разблокирован. Нажмите кнопку ниже для возврата в профиль."
@@ -2,6 +2,8 @@ __all__ = ("router",)
 
 from aiogram import Router
 
+from panels.remnawave_pool import close_remnawave_clients
+
 from .key_connect import router as connect_router
 from .key_freeze import router as freeze_router
 from .key_mode import router as key_mode_router
@@ -20,3 +22,8 @@ router.include_routers(
     connect_router,
     key_mode_router,
 )
+
+
+@router.shutdown()
+async def on_shutdown():
+    await close_remnawave_clients()
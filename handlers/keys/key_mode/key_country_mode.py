@@ -34,6 +34,7 @@ from database import (
     get_key_details,
     get_tariff_by_id,
     get_trial,
+    invalidate_key_snapshots,
     update_balance,
     update_trial,
 )
@@ -577,6 +578,7 @@ async def finalize_key_creation(
                     await update_balance(session, tg_id, -row)
 
         await session.commit()
+        invalidate_key_snapshots([email])
 
     except Exception as e:
         logger.error(f"[Key Finalize] Ошибка при создании ключа для пользователя {tg_id}: {e}")
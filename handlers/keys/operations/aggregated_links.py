@@ -2,11 +2,11 @@ import asyncio
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import HAPP_CRYPTOLINK, LEGACY_LINKS, PUBLIC_LINK, REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
+from config import HAPP_CRYPTOLINK, LEGACY_LINKS, PUBLIC_LINK, SUPERNODE
 from database import filter_cluster_by_subgroup, get_key_details, get_tariff_by_id
 from logger import logger
 from panels._3xui import get_vless_link_for_client, get_xui_instance
-from panels.remnawave import RemnawaveAPI
+from panels.remnawave_pool import get_remnawave_api
 from servers import extract_host
 
 from .utils import is_plan_vless, score_vless_url, split_by_panel
@@ -24,9 +24,8 @@ async def _is_vless_tariff(session: AsyncSession, email: str) -> bool:
 
 async def _try_build_remna_vless(servers: list, email: str) -> tuple[str | None, str | None]:
     si = servers[0]
-    remna = RemnawaveAPI(si["api_url"])
-    ok = await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD)
-    if not ok:
+    remna = await get_remnawave_api(si["api_url"])
+    if not remna:
         logger.warning("[Remnawave] login failed")
         return None, None
 
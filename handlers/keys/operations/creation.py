@@ -2,10 +2,10 @@ import asyncio
 
 from datetime import datetime
 
+from config import HAPP_CRYPTOLINK, PUBLIC_LINK, SUPERNODE
 from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import HAPP_CRYPTOLINK, PUBLIC_LINK, REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
 from database import get_servers, get_tariff_by_id, store_key
 from database.models import User
 from handlers.utils import ALLOWED_GROUP_CODES, check_server_key_limit
@@ -15,7 +15,8 @@ from logger import (
     PANEL_XUI,
 )
 from panels._3xui import ClientConfig, add_client, get_xui_instance
-from panels.remnawave import RemnawaveAPI, get_vless_link_for_remnawave_by_username
+from panels.remnawave import get_vless_link_for_remnawave_by_username
+from panels.remnawave_pool import get_remnawave_api
 
 from .aggregated_links import make_aggregated_link
 
@@ -33,6 +34,8 @@ async def create_key_on_cluster(
     traffic_limit_bytes: int = None,
     is_trial: bool = False,
 ):
+    from servers import is_server_down
+
     try:
         servers = await get_servers(session)
         cluster = servers.get(cluster_id)
@@ -97,12 +100,16 @@ async def create_key_on_cluster(
         remnawave_servers = [
             s
             for s in enabled_servers
-            if s.get("panel_type", "3x-ui").lower() == "remnawave" and await check_server_key_limit(s, session)
+            if s.get("panel_type", "3x-ui").lower() == "remnawave"
+            and not is_server_down(s["server_name"])
+            and await check_server_key_limit(s, session)
         ]
         xui_servers = [
             s
             for s in enabled_servers
-            if s.get("panel_type", "3x-ui").lower() == "3x-ui" and await check_server_key_limit(s, session)
+            if s.get("panel_type", "3x-ui").lower() == "3x-ui"
+            and not is_server_down(s["server_name"])
+            and await check_server_key_limit(s, session)
         ]
 
         if not remnawave_servers and not xui_servers:
@@ -115,9 +122,8 @@ async def create_key_on_cluster(
         remnawave_client_id = None
 
         if remnawave_servers:
-            remna = RemnawaveAPI(remnawave_servers[0]["api_url"])
-            logged_in = await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD)
-            if not logged_in:
+            remna = await get_remnawave_api(remnawave_servers[0]["api_url"])
+            if not remna:
                 logger.error(f"{PANEL_REMNA} Не удалось войти в Remnawave API")
             else:
                 expire_at = datetime.utcfromtimestamp(expiry_timestamp / 1000).isoformat() + "Z"
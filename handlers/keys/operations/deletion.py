@@ -2,7 +2,6 @@ import asyncio
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD
 from database import get_servers
 from logger import (
     CLOGGER as logger,
@@ -10,7 +9,7 @@ from logger import (
     PANEL_XUI,
 )
 from panels._3xui import delete_client, get_xui_instance
-from panels.remnawave import RemnawaveAPI
+from panels.remnawave_pool import get_remnawave_api
 
 from .utils import unique_by_api_url
 
@@ -74,9 +73,8 @@ async def delete_on_remnawave(servers: list, client_id: str) -> bool:
     servers = unique_by_api_url(servers)
     for s in servers:
         name = s.get("server_name", "remna")
-        api = RemnawaveAPI(s.get("api_url"))
-        ok = await api.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD)
-        if not ok:
+        api = await get_remnawave_api(s.get("api_url"))
+        if not api:
             logger.warning(f"{PANEL_REMNA} [{name}] Авторизация не удалась")
             continue
         try:
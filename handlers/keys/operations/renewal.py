@@ -4,7 +4,7 @@ from datetime import datetime
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
+from config import SUPERNODE
 from database import (
     delete_notification,
     filter_cluster_by_subgroup,
@@ -20,7 +20,7 @@ from logger import (
     PANEL_XUI,
 )
 from panels._3xui import extend_client_key, get_xui_instance
-from panels.remnawave import RemnawaveAPI
+from panels.remnawave_pool import get_remnawave_api
 
 from .aggregated_links import make_aggregated_link
 from .subgroup_migration import migrate_between_subgroups
@@ -62,8 +62,8 @@ async def renew_on_remnawave(
         remnawave_nodes = [s for s in remnawave_nodes if s.get("server_name") == target_server_name] or remnawave_nodes[
             :1
         ]
-    remna = RemnawaveAPI(remnawave_nodes[0]["api_url"])
-    if not await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD):
+    remna = await get_remnawave_api(remnawave_nodes[0]["api_url"])
+    if not remna:
         logger.error(f"{PANEL_REMNA} Не удалось войти в Remnawave API")
         return False
     expire_iso = datetime.utcfromtimestamp(new_expiry_time // 1000).isoformat() + "Z"
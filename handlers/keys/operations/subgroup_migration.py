@@ -4,7 +4,7 @@ from datetime import datetime
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import HAPP_CRYPTOLINK, REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
+from config import HAPP_CRYPTOLINK, SUPERNODE
 from database import filter_cluster_by_subgroup, update_key_client_id
 from logger import (
     CLOGGER as logger,
@@ -12,7 +12,7 @@ from logger import (
     PANEL_XUI,
 )
 from panels._3xui import ClientConfig, add_client, extend_client_key, get_xui_instance
-from panels.remnawave import RemnawaveAPI
+from panels.remnawave_pool import get_remnawave_api
 
 from .deletion import delete_on_3xui, delete_on_remnawave
 from .utils import bytes_from_gb, norm_name, split_by_panel
@@ -34,9 +34,8 @@ async def ensure_on_remnawave(
 
     inbounds = [s.get("inbound_id") for s in servers if s.get("inbound_id")]
 
-    api = RemnawaveAPI(servers[0]["api_url"])
-    ok = await api.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD)
-    if not ok:
+    api = await get_remnawave_api(servers[0]["api_url"])
+    if not api:
         logger.error(f"{PANEL_REMNA} API недоступен при создании/обновлении")
         return None, None
 
@@ -114,8 +113,10 @@ async def ensure_on_3xui(
     total_gb: int,
     hwid_device_limit: int,
     attempt_update_first: bool,
-):
+) -> dict[str, bool]:
+    """Создаёт или обновляет клиента на серверах 3x-ui. Возвращает успех по имени каждого сервера."""
     tasks = []
+    names = []
     traffic = bytes_from_gb(total_gb)
     for s in servers:
         name = s.get("server_name", "unknown")
@@ -132,7 +133,7 @@ async def ensure_on_3xui(
                 xui = await get_xui_instance(si["api_url"])
             except Exception as e:
                 logger.error(f"{PANEL_XUI} [{nm}] API недоступен: {e}")
-                return
+                return False
 
             async def do_update():
                 try:
@@ -167,25 +168,22 @@ async def ensure_on_3xui(
                         sub_id=sub,
                     )
                     created = await add_client(xui, cfg)
-                    if not created:
-                        logger.error(f"{PANEL_XUI} [{nm}] add_client вернул False")
-                    return bool(created)
+                    if not created or created.get("error") or created.get("status") == "duplicate":
+                        logger.error(f"{PANEL_XUI} [{nm}] add_client не создал клиента: {created}")
+                        return False
+                    return True
                 except Exception as e:
                     logger.error(f"{PANEL_XUI} [{nm}] ошибка add_client: {e}")
                     return False
 
             if attempt_update_first:
-                if await do_update():
-                    return
-                await do_create()
-            else:
-                if await do_create():
-                    return
-                await do_update()
+                return await do_update() or await do_create()
+            return await do_create() or await do_update()
 
         tasks.append(one(s, name, inbound_id, login_email, sub_id))
-    if tasks:
-        await asyncio.gather(*tasks, return_exceptions=True)
+        names.append(name)
+    results = await asyncio.gather(*tasks, return_exceptions=True) if tasks else []
+    return {name: result is True for name, result in zip(names, results, strict=True)}
 
 
 async def migrate_between_subgroups(
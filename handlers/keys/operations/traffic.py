@@ -5,12 +5,12 @@ from typing import Any
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
+from config import SUPERNODE
 from database import get_servers
 from database.models import Key, Server
 from logger import logger
 from panels._3xui import get_client_traffic, get_xui_instance
-from panels.remnawave import RemnawaveAPI
+from panels.remnawave_pool import get_remnawave_api
 
 
 async def get_user_traffic(session: AsyncSession, tg_id: int, email: str) -> dict[str, Any]:
@@ -99,8 +99,8 @@ async def get_user_traffic(session: AsyncSession, tg_id: int, email: str) -> dic
 
     if remnawave_client_id and remnawave_api_url:
         try:
-            remna = RemnawaveAPI(remnawave_api_url)
-            if not await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD):
+            remna = await get_remnawave_api(remnawave_api_url)
+            if not remna:
                 user_traffic_data["Remnawave (общий)"] = "Не удалось авторизоваться"
             else:
                 user_data = await remna.get_user_by_uuid(remnawave_client_id)
@@ -153,8 +153,8 @@ async def reset_traffic_in_cluster(cluster_id: str, email: str, session: AsyncSe
 
                 client_id = row[0]
 
-                remna = RemnawaveAPI(api_url)
-                if not await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD):
+                remna = await get_remnawave_api(api_url)
+                if not remna:
                     logger.warning(f"[Reset Traffic] Не удалось авторизоваться в Remnawave ({server_name})")
                     continue
 
@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import PUBLIC_LINK, REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD, SUPERNODE
+from config import PUBLIC_LINK, SUPERNODE
 from database import filter_cluster_by_subgroup, get_servers, store_key
 from database.models import Key, Tariff
 from handlers.utils import get_least_loaded_cluster
@@ -15,7 +15,7 @@ from logger import (
     PANEL_XUI,
 )
 from panels._3xui import ClientConfig, add_client, get_xui_instance
-from panels.remnawave import RemnawaveAPI
+from panels.remnawave_pool import get_remnawave_api
 
 from .aggregated_links import make_aggregated_link
 from .deletion import delete_key_from_cluster
@@ -65,8 +65,8 @@ async def update_key_on_cluster(
 
         if remnawave_servers:
             inbound_ids = [s["inbound_id"] for s in remnawave_servers if s.get("inbound_id")]
-            remna = RemnawaveAPI(remnawave_servers[0]["api_url"])
-            if await remna.login(REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD):
+            remna = await get_remnawave_api(remnawave_servers[0]["api_url"])
+            if remna:
                 await remna.delete_user(client_id)
 
                 group_code = remnawave_servers[0].get("tariff_group")
@@ -1,16 +1,23 @@
 import asyncio
 import base64
+import hashlib
 import random
 import re
 import time
 import urllib.parse
 
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple
+
 import aiohttp
 
 from aiohttp import web
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import config as cfg
+
 from config import (
     PROJECT_NAME,
     RANDOM_SUBSCRIPTIONS,
@@ -19,51 +26,177 @@ from config import (
     USERNAME_BOT,
     USE_COUNTRY_SELECTION,
 )
-from database import get_key_details, get_servers
+from database import get_key_details, get_key_version, get_keys_changes, get_servers, get_servers_version
 from database.models import Server
 from handlers.texts import HAPP_ANNOUNCE, HIDDIFY_PROFILE_TITLE, SUBSCRIPTION_INFO_TEXT, V2RAYTUN_ANNOUNCE
 from handlers.utils import convert_to_bytes
 from logger import logger
+from utils.http_clients import get_http_session
+from utils.identity_cache import MISSING, TTLCache
+
+
+SUBSCRIPTION_CACHE_TTL = getattr(cfg, "SUBSCRIPTION_CACHE_TTL", 60)
+SUBSCRIPTION_CACHE_SIZE = getattr(cfg, "SUBSCRIPTION_CACHE_SIZE", 20_000)
+SUBSCRIPTION_HEDGE_DELAY = getattr(cfg, "SUBSCRIPTION_HEDGE_DELAY", 1.5)
+SUBSCRIPTION_BREAKER_THRESHOLD = 3
+SUBSCRIPTION_BREAKER_COOLDOWN = 30
+SUBSCRIPTION_LAST_GOOD_TTL = 3600
+SUBSCRIPTION_PARSE_CACHE_SIZE = 4096
+
+TRAFFIC_IN_META_RE = re.compile(r"\d+(?:[.,]\d+)?\s*(?:GB|MB|KB|TB)", re.IGNORECASE)
+TRAFFIC_VALUE_RE = re.compile(r"([\d\.]+)\s*([GMKTB]B)", re.IGNORECASE)
+
+
+class SubscriptionLine(NamedTuple):
+    """Строка подписки панели: исходная, очищенная для клиента и остаток трафика страны, если он указан."""
+
+    raw: str
+    cleaned: str
+    country: str | None = None
+    remaining_bytes: int | None = None
+
+
+@dataclass(frozen=True)
+class CachedSubscription:
+    """Готовый ответ подписки и версии ключа и серверов, из которых он собран."""
+
+    tg_id: int
+    key_email: str
+    body: str
+    headers: dict[str, str]
+    etag: str
+    versions: tuple[tuple[int, int], int]
+
+    @property
+    def is_current(self) -> bool:
+        return self.versions == (get_key_version(self.key_email), get_servers_version())
+
+
+_subscription_cache = TTLCache(SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL)
 
 
-async def fetch_url_content(url: str, identifier: str) -> tuple[list[str], dict[str, str]]:
+@dataclass
+class CircuitBreaker:
+    """
+    Предохранитель для хоста панели: после SUBSCRIPTION_BREAKER_THRESHOLD ошибок подряд запросы к хосту
+    не выполняются SUBSCRIPTION_BREAKER_COOLDOWN секунд, затем пропускается один пробный запрос.
+    """
+
+    failures: int = 0
+    open_until: float = 0.0
+    probing: bool = False
+
+    def allow(self) -> bool:
+        if self.failures < SUBSCRIPTION_BREAKER_THRESHOLD:
+            return True
+        if time.monotonic() < self.open_until or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= SUBSCRIPTION_BREAKER_THRESHOLD:
+            self.open_until = time.monotonic() + SUBSCRIPTION_BREAKER_COOLDOWN
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_last_good = TTLCache(SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_LAST_GOOD_TTL)
+
+
+async def _fetch_once(url: str) -> tuple[tuple[SubscriptionLine, ...], dict[str, str]]:
+    async with get_http_session("subscriptions").get(url, ssl=False) as response:
+        if response.status >= 500:
+            raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+        if response.status != 200:
+            return (), {}
+        content = await response.text()
+        headers = {k.lower(): v for k, v in response.headers.items()}
+        return parse_subscription_payload(content), headers
+
+
+async def _fetch_hedged(url: str) -> tuple[tuple[SubscriptionLine, ...], dict[str, str]]:
+    """Если панель не ответила за SUBSCRIPTION_HEDGE_DELAY, отправляет второй запрос и берёт первый успешный ответ."""
+    tasks = {asyncio.create_task(_fetch_once(url))}
     try:
-        timeout = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, ssl=False) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    lines = base64.b64decode(content).decode("utf-8").split("\n")
-                    headers = {k.lower(): v for k, v in response.headers.items()}
-                    logger.debug(f"Fetched {url}: {len(lines)} lines, headers: {headers}")
-                    return lines, headers
-                return [], {}
-    except Exception as e:
-        logger.error(f"Error fetching URL {url}: {e}")
-        return [], {}
+        done, _ = await asyncio.wait(tasks, timeout=SUBSCRIPTION_HEDGE_DELAY)
+        if done:
+            return done.pop().result()
+
+        tasks.add(asyncio.create_task(_fetch_once(url)))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fetch_url_content(url: str, identifier: str) -> tuple[tuple[SubscriptionLine, ...], dict[str, str]]:
+    """
+    Загружает подписку с панели через общий пул соединений.
+
+    Недоступные хосты отсекаются предохранителем без ожидания таймаута. При ошибке или открытом
+    предохранителе возвращается последний успешный ответ этой ссылки, если он ещё не устарел.
+    """
+    breaker = _breakers.setdefault(urllib.parse.urlsplit(url).netloc, CircuitBreaker())
+    if breaker.allow():
+        try:
+            lines, headers = await _fetch_hedged(url)
+        except Exception as e:
+            breaker.record_failure()
+            logger.error(f"Error fetching URL {url}: {e!r}")
+        else:
+            breaker.record_success()
+            logger.debug(f"Fetched {url}: {len(lines)} lines, headers: {headers}")
+            if lines:
+                _last_good.set(url, (lines, headers))
+            return lines, headers
+        finally:
+            # Пробный запрос мог быть отменён вместе с запросом клиента, поэтому флаг снимается здесь.
+            breaker.probing = False
+    else:
+        logger.debug(f"Пропуск {url}: хост временно недоступен")
+
+    cached = _last_good.get(url)
+    if cached is MISSING:
+        return (), {}
+    logger.warning(f"Подписка {identifier}: для {url} используется последний успешный ответ")
+    return cached
 
 
 async def combine_unique_lines(
     urls: list[str], identifier: str, query_string: str
-) -> tuple[list[str], list[dict[str, str]]]:
+) -> tuple[list[SubscriptionLine], list[dict[str, str]]]:
+    """Собирает строки всех панелей в порядке ссылок, пропуская пустые и повторяющиеся строки."""
     if SUPERNODE:
         logger.info(f"Режим SUPERNODE активен. Возвращаем первую ссылку для идентификатора: {identifier}")
         if not urls:
             return [], []
         url_with_query = f"{urls[0]}?{query_string}" if query_string else urls[0]
         lines, headers = await fetch_url_content(url_with_query, identifier)
-        return lines, [headers]
+        return [line for line in lines if line.raw], [headers]
 
     urls_with_query = [f"{url}?{query_string}" if query_string else url for url in urls]
     tasks = [fetch_url_content(url, identifier) for url in urls_with_query]
     results = await asyncio.gather(*tasks, return_exceptions=True)
     all_lines = []
     all_headers = []
+    seen = set()
     for result in results:
         if isinstance(result, tuple):
             lines, headers = result
-            for line in filter(None, lines):
-                if line not in all_lines:
+            for line in lines:
+                if line.raw and line.raw not in seen:
+                    seen.add(line.raw)
                     all_lines.append(line)
             all_headers.append(headers)
     return all_lines, all_headers
@@ -97,11 +230,10 @@ async def get_subscription_urls(
 
 
 def calculate_traffic(
-    cleaned_subscriptions: list[str],
+    subscription_lines: list[SubscriptionLine],
     expiry_time_ms: int | None,
     headers_list: list[dict[str, str]],
 ) -> str:
-    logger.debug(f"Calculating traffic with subscriptions: {cleaned_subscriptions}, headers: {headers_list}")
     expire_timestamp = int(expiry_time_ms / 1000) if expiry_time_ms else 0
 
     upload = 0
@@ -121,26 +253,9 @@ def calculate_traffic(
                     total += int(part.split("=")[1])
             logger.debug(f"Processed Subscription-Userinfo: {userinfo}")
 
-    country_remaining = {}
-    for line in cleaned_subscriptions:
-        if "#" not in line:
-            continue
-        try:
-            _, meta = line.split("#", 1)
-        except ValueError:
-            continue
-        parts = meta.split("-")
-        country = parts[0].strip()
-        remaining_str = parts[1].strip() if len(parts) == 2 else ""
-        if remaining_str:
-            remaining_str = remaining_str.replace(",", ".")
-            m_total = re.search(r"([\d\.]+)\s*([GMKTB]B)", remaining_str, re.IGNORECASE)
-            if m_total:
-                value = float(m_total.group(1))
-                unit = m_total.group(2).upper()
-                remaining_bytes = convert_to_bytes(value, unit)
-                country_remaining[country] = remaining_bytes
-                logger.debug(f"Found traffic: {value}{unit} for {country}")
+    country_remaining = {
+        line.country: line.remaining_bytes for line in subscription_lines if line.remaining_bytes is not None
+    }
 
     consumed_traffic_bytes = total - sum(country_remaining.values()) if country_remaining else download
     if consumed_traffic_bytes < 0:
@@ -168,13 +283,44 @@ def clean_subscription_line(line: str) -> str:
     traffic = ""
     for part in parts[1:]:
         part_decoded = urllib.parse.unquote(part).strip()
-        if re.search(r"\d+(?:[.,]\d+)?\s*(?:GB|MB|KB|TB)", part_decoded, re.IGNORECASE):
+        if TRAFFIC_IN_META_RE.search(part_decoded):
             traffic = part_decoded
             break
     meta_clean = f"{country} - {traffic}" if traffic else country
     return base + "#" + meta_clean
 
 
+def parse_subscription_line(line: str) -> SubscriptionLine:
+    """Очищает строку и извлекает из её подписи страну и остаток трафика."""
+    cleaned = clean_subscription_line(line)
+    if "#" not in cleaned:
+        return SubscriptionLine(line, cleaned)
+
+    parts = cleaned.split("#", 1)[1].split("-")
+    country = parts[0].strip()
+    remaining_str = parts[1].strip().replace(",", ".") if len(parts) == 2 else ""
+    m_total = TRAFFIC_VALUE_RE.search(remaining_str) if remaining_str else None
+    if not m_total:
+        return SubscriptionLine(line, cleaned, country)
+    try:
+        remaining_bytes = convert_to_bytes(float(m_total.group(1)), m_total.group(2).upper())
+    except ValueError:
+        return SubscriptionLine(line, cleaned, country)
+    return SubscriptionLine(line, cleaned, country, remaining_bytes)
+
+
+@lru_cache(maxsize=SUBSCRIPTION_PARSE_CACHE_SIZE)
+def parse_subscription_payload(content: str) -> tuple[SubscriptionLine, ...]:
+    """
+    Декодирует base64-ответ панели и разбирает его строки.
+
+    Результат кешируется по содержимому ответа: пока панель отдаёт тот же ответ, строки не
+    разбираются повторно.
+    """
+    lines = base64.b64decode(content).decode("utf-8").split("\n")
+    return tuple(parse_subscription_line(line) for line in lines)
+
+
 def format_time_left(expiry_time_ms: int | None) -> str:
     if not expiry_time_ms:
         return "N/A"
@@ -236,20 +382,72 @@ def prepare_headers(
         }
 
 
+def client_profile(user_agent: str) -> str:
+    """Профиль клиента, от которого зависят заголовки ответа, в том же порядке проверок, что в prepare_headers."""
+    for profile in ("Happ", "Hiddify", "v2raytun"):
+        if profile in user_agent:
+            return profile
+    return "default"
+
+
+def make_etag(body: str, headers: dict[str, str]) -> str:
+    digest = hashlib.sha256(body.encode("utf-8"))
+    for name in sorted(headers):
+        digest.update(f"\n{name}:{headers[name]}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def subscription_response(request: web.Request, cached: CachedSubscription) -> web.Response:
+    if etag_matches(request.headers.get("If-None-Match"), cached.etag):
+        return web.Response(status=304, headers={"ETag": cached.etag})
+    return web.Response(text=cached.body, headers={**cached.headers, "ETag": cached.etag})
+
+
 async def handle_subscription(request: web.Request) -> web.Response:
+    """
+    Отдаёт подписку ключа, собранную из ссылок серверов кластера.
+
+    Готовый ответ кешируется по ключу, профилю клиента и строке запроса на SUBSCRIPTION_CACHE_TTL и
+    отбрасывается раньше при изменении этого ключа или серверов. Ответ содержит ETag, и повторный запрос
+    с совпадающим If-None-Match получает 304 без тела.
+    """
     email = request.match_info.get("email")
     tg_id = request.match_info.get("tg_id")
 
     if not email or not tg_id:
         return web.Response(text="❌ Неверные параметры запроса.", status=400)
 
+    user_agent = request.headers.get("User-Agent", "")
+    query_string = request.query_string
+    cache_key = (email, client_profile(user_agent), query_string)
+
+    cached = _subscription_cache.get(cache_key)
+    if cached is not MISSING and cached.is_current:
+        try:
+            if int(tg_id) != cached.tg_id:
+                return web.Response(text="❌ Неверные данные. Получите свой ключ в боте.", status=403)
+        except ValueError:
+            return web.Response(text="❌ Неверные параметры запроса.", status=400)
+        return subscription_response(request, cached)
+
     sessionmaker = request.app["sessionmaker"]
+    keys_changes = get_keys_changes()
+    servers_version = get_servers_version()
 
     async with sessionmaker() as session:
         try:
             key = await get_key_details(session, email)
             if not key:
                 return web.Response(text="❌ Клиент с таким email не найден.", status=404)
+            cacheable = get_keys_changes() == keys_changes
+            versions = (get_key_version(key["email"]), servers_version)
 
             if int(tg_id) != int(key["tg_id"]):
                 return web.Response(text="❌ Неверные данные. Получите свой ключ в боте.", status=403)
@@ -264,19 +462,27 @@ async def handle_subscription(request: web.Request) -> web.Response:
             if not urls:
                 return web.Response(text="❌ Сервер не найден.", status=404)
 
-            query_string = request.query_string
             combined_subscriptions, headers_list = await combine_unique_lines(urls, tg_id or email, query_string)
 
-            cleaned_subscriptions = [clean_subscription_line(line) for line in combined_subscriptions]
-
-            base64_encoded = base64.b64encode("\n".join(cleaned_subscriptions).encode("utf-8")).decode("utf-8")
+            base64_encoded = base64.b64encode(
+                "\n".join(line.cleaned for line in combined_subscriptions).encode("utf-8")
+            ).decode("utf-8")
             subscription_info = SUBSCRIPTION_INFO_TEXT.format(email=email, time_left=time_left)
 
-            user_agent = request.headers.get("User-Agent", "")
-            subscription_userinfo = calculate_traffic(cleaned_subscriptions, expiry_time_ms, headers_list)
+            subscription_userinfo = calculate_traffic(combined_subscriptions, expiry_time_ms, headers_list)
             headers = prepare_headers(user_agent, PROJECT_NAME, subscription_info, subscription_userinfo)
 
-            return web.Response(text=base64_encoded, headers=headers)
+            cached = CachedSubscription(
+                tg_id=int(key["tg_id"]),
+                key_email=key["email"],
+                body=base64_encoded,
+                headers=headers,
+                etag=make_etag(base64_encoded, headers),
+                versions=versions,
+            )
+            if combined_subscriptions and cacheable:
+                _subscription_cache.set(cache_key, cached)
+            return subscription_response(request, cached)
 
         except Exception as e:
             logger.error(f"Ошибка в handle_subscription: {e}", exc_info=True)
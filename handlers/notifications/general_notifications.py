@@ -23,6 +23,7 @@ from config import (
 )
 from database import (
     add_notification,
+    add_notifications_bulk,
     check_notification_time,
     check_notifications_bulk,
     check_tariff_exists,
@@ -30,9 +31,12 @@ from database import (
     delete_notification,
     get_all_keys,
     get_balance,
-    get_last_notification_time,
     get_tariff_by_id,
     get_tariffs_for_cluster,
+    is_notification_due,
+    iter_expired_keys,
+    iter_expiring_keys,
+    iter_unnotified_active_keys,
     update_balance,
     update_key_expiry,
     update_key_tariff,
@@ -52,11 +56,16 @@ from handlers.texts import (
     get_renewal_message,
 )
 from handlers.utils import format_hours, format_minutes, get_russian_month
-from hooks.hooks import run_hooks
+from hooks.hooks import has_hooks, run_hooks
 from logger import logger
 
 from .hot_leads_notifications import notify_hot_leads
-from .notify_utils import prepare_key_expiry_data, send_messages_with_limit, send_notification
+from .notify_utils import (
+    load_notification_context,
+    prepare_key_expiry_data,
+    send_messages_with_limit,
+    send_notification,
+)
 from .special_notifications import notify_inactive_trial_users, notify_users_no_traffic
 
 
@@ -79,13 +88,6 @@ async def periodic_notifications(bot: Bot, *, sessionmaker: async_sessionmaker):
 
                     current_time = int(datetime.now(moscow_tz).timestamp() * 1000)
 
-                    try:
-                        keys = await get_all_keys(session=session)
-                        keys = [k for k in keys if not k.is_frozen]
-                    except Exception as e:
-                        logger.error(f"Ошибка при получении ключей: {e}")
-                        keys = []
-
                     if not TRIAL_TIME_DISABLE:
                         try:
                             await notify_inactive_trial_users(bot, session)
@@ -97,7 +99,9 @@ async def periodic_notifications(bot: Bot, *, sessionmaker: async_sessionmaker):
                             threshold_24h = int(
                                 (datetime.now(moscow_tz) + timedelta(hours=NOTIFY_24H_HOURS)).timestamp() * 1000
                             )
-                            await notify_24h_keys(bot, session, current_time, threshold_24h, keys)
+                            async with sessionmaker() as scan_session:
+                                async for keys in iter_expiring_keys(scan_session, current_time, threshold_24h):
+                                    await notify_24h_keys(bot, session, current_time, threshold_24h, keys)
                         except Exception as e:
                             logger.error(f"Ошибка в notify_24h_keys: {e}")
 
@@ -106,22 +110,33 @@ async def periodic_notifications(bot: Bot, *, sessionmaker: async_sessionmaker):
                             threshold_10h = int(
                                 (datetime.now(moscow_tz) + timedelta(hours=NOTIFY_10H_HOURS)).timestamp() * 1000
                             )
-                            await notify_10h_keys(bot, session, current_time, threshold_10h, keys)
+                            async with sessionmaker() as scan_session:
+                                async for keys in iter_expiring_keys(scan_session, current_time, threshold_10h):
+                                    await notify_10h_keys(bot, session, current_time, threshold_10h, keys)
                         except Exception as e:
                             logger.error(f"Ошибка в notify_10h_keys: {e}")
 
                     try:
-                        await handle_expired_keys(bot, session, current_time, keys)
+                        async with sessionmaker() as scan_session:
+                            async for keys in iter_expired_keys(scan_session, current_time):
+                                await handle_expired_keys(bot, session, current_time, keys)
                     except Exception as e:
                         logger.error(f"Ошибка в handle_expired_keys: {e}")
 
                     if NOTIFY_INACTIVE_TRAFFIC:
                         try:
-                            await notify_users_no_traffic(bot, session, current_time, keys)
+                            created_before = current_time - NOTIFY_INACTIVE_TRAFFIC * 3600 * 1000
+                            async with sessionmaker() as scan_session:
+                                async for keys in iter_unnotified_active_keys(
+                                    scan_session, created_before, current_time
+                                ):
+                                    await notify_users_no_traffic(bot, session, current_time, keys)
                         except Exception as e:
                             logger.error(f"Ошибка в notify_users_no_traffic: {e}")
                     try:
-                        await run_hooks("periodic_notifications", bot=bot, session=session, keys=keys)
+                        if has_hooks("periodic_notifications"):
+                            keys = [k for k in await get_all_keys(session=session) if not k.is_frozen]
+                            await run_hooks("periodic_notifications", bot=bot, session=session, keys=keys)
                     except Exception as e:
                         logger.error(f"Ошибка в хуках periodic_notifications: {e}")
 
@@ -154,6 +169,7 @@ async def notify_24h_keys(
     allowed = await check_notifications_bulk(session, "key_24h", NOTIFY_24H_HOURS, tg_ids=tg_ids, emails=emails)
 
     allowed_set = {(u["tg_id"], u["email"]) for u in allowed}
+    context = await load_notification_context(session, expiring_keys, "key_24h")
     messages = []
 
     for key in expiring_keys:
@@ -164,11 +180,11 @@ async def notify_24h_keys(
 
         notification_id = f"{email}_key_24h"
 
-        can_notify = await check_notification_time(session, tg_id, notification_id, hours=NOTIFY_24H_HOURS)
-        if not can_notify:
+        last_time = context["last_notification_times"].get((tg_id, notification_id))
+        if not is_notification_due(last_time, NOTIFY_24H_HOURS):
             continue
 
-        expiry_data = await prepare_key_expiry_data(key, session, current_time)
+        expiry_data = await prepare_key_expiry_data(key, session, current_time, tariffs=context["tariffs"])
 
         notification_text = KEY_EXPIRY.format(
             email=email,
@@ -188,6 +204,7 @@ async def notify_24h_keys(
                     1,
                     "notify_24h.jpg",
                     notification_text,
+                    tariffs=context["tariffs"],
                 )
             except Exception as e:
                 logger.error(f"Ошибка авто-продления/уведомления для пользователя {tg_id}: {e}")
@@ -205,11 +222,11 @@ async def notify_24h_keys(
 
     if messages:
         results = await send_messages_with_limit(bot, messages, session=session)
+        await add_notifications_bulk(session, [(msg["tg_id"], msg["notification_id"]) for msg in messages])
         sent_count = 0
         for msg, result in zip(messages, results, strict=False):
             tg_id = msg["tg_id"]
 
-            await add_notification(session, tg_id, msg["notification_id"])
             if result:
                 sent_count += 1
                 logger.info(f"Отправлено уведомление об истекающей подписке {msg['email']} пользователю {tg_id}.")
@@ -239,6 +256,7 @@ async def notify_10h_keys(
     allowed = await check_notifications_bulk(session, "key_10h", NOTIFY_10H_HOURS, tg_ids=tg_ids, emails=emails)
 
     allowed_set = {(u["tg_id"], u["email"]) for u in allowed}
+    context = await load_notification_context(session, expiring_keys, "key_10h")
     messages = []
 
     for key in expiring_keys:
@@ -249,11 +267,11 @@ async def notify_10h_keys(
 
         notification_id = f"{email}_key_10h"
 
-        can_notify = await check_notification_time(session, tg_id, notification_id, hours=NOTIFY_10H_HOURS)
-        if not can_notify:
+        last_time = context["last_notification_times"].get((tg_id, notification_id))
+        if not is_notification_due(last_time, NOTIFY_10H_HOURS):
             continue
 
-        expiry_data = await prepare_key_expiry_data(key, session, current_time)
+        expiry_data = await prepare_key_expiry_data(key, session, current_time, tariffs=context["tariffs"])
 
         notification_text = KEY_EXPIRY.format(
             email=email,
@@ -273,6 +291,7 @@ async def notify_10h_keys(
                     1,
                     "notify_10h.jpg",
                     notification_text,
+                    tariffs=context["tariffs"],
                 )
             except Exception as e:
                 logger.error(f"Ошибка авто-продления/уведомления для пользователя {tg_id}: {e}")
@@ -290,11 +309,11 @@ async def notify_10h_keys(
 
     if messages:
         results = await send_messages_with_limit(bot, messages, session=session)
+        await add_notifications_bulk(session, [(msg["tg_id"], msg["notification_id"]) for msg in messages])
         sent_count = 0
         for msg, result in zip(messages, results, strict=False):
             tg_id = msg["tg_id"]
 
-            await add_notification(session, tg_id, msg["notification_id"])
             if result:
                 sent_count += 1
                 logger.info(f"Отправлено уведомление об истекающей подписке {msg['email']} пользователю {tg_id}.")
@@ -322,6 +341,7 @@ async def handle_expired_keys(
     tg_ids = [key.tg_id for key in expired_keys]
     emails = [key.email or "" for key in expired_keys]
     users = await check_notifications_bulk(session, "key_expired", 0, tg_ids=tg_ids, emails=emails)
+    context = await load_notification_context(session, expired_keys, "key_expired")
 
     messages = []
 
@@ -332,7 +352,8 @@ async def handle_expired_keys(
         server_id = key.server_id
         notification_id = f"{email}_key_expired"
 
-        last_notification_time = await get_last_notification_time(session, tg_id, notification_id)
+        last_notified_at = context["last_notification_times"].get((tg_id, notification_id))
+        last_notification_time = int(last_notified_at.timestamp() * 1000) if last_notified_at else None
 
         if NOTIFY_RENEW_EXPIRED:
             try:
@@ -418,9 +439,9 @@ async def handle_expired_keys(
 
     if messages:
         results = await send_messages_with_limit(bot, messages, session=session)
+        await add_notifications_bulk(session, [(msg["tg_id"], msg["notification_id"]) for msg in messages])
         sent_count = 0
         for msg, result in zip(messages, results, strict=False):
-            await add_notification(session, msg["tg_id"], msg["notification_id"])
             if result:
                 sent_count += 1
                 logger.info(f"📢 Уведомление об истекшем ключе {msg['email']} отправлено пользователю {msg['tg_id']}.")
@@ -443,6 +464,7 @@ async def process_auto_renew_or_notify(
     renewal_period_months: int,
     standard_photo: str,
     standard_caption: str,
+    tariffs: dict[int, dict] | None = None,
 ):
     tg_id = key.tg_id
     email = key.email or ""
@@ -491,7 +513,9 @@ async def process_auto_renew_or_notify(
                 selected_tariff = None
 
         if not selected_tariff:
-            expiry_data = await prepare_key_expiry_data(key, conn, int(datetime.now(moscow_tz).timestamp() * 1000))
+            expiry_data = await prepare_key_expiry_data(
+                key, conn, int(datetime.now(moscow_tz).timestamp() * 1000), tariffs=tariffs
+            )
 
             use_change_tariff_kb = False
 
@@ -3,7 +3,6 @@ import os
 
 from datetime import datetime
 
-import aiofiles
 import pytz
 
 from aiogram import Bot
@@ -12,12 +11,13 @@ from aiogram.exceptions import (
     TelegramForbiddenError,
     TelegramRetryAfter,
 )
-from aiogram.types import BufferedInputFile, InlineKeyboardMarkup
+from aiogram.types import InlineKeyboardMarkup
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import create_blocked_user, get_tariff_by_id
+from database import create_blocked_user, get_last_notification_times, get_tariff_by_id, get_tariffs_by_ids
 from handlers.utils import format_hours
 from logger import logger
+from utils.media_registry import send_cached_media
 
 
 async def send_messages_with_limit(
@@ -133,10 +133,9 @@ async def _send_photo_notification(
 ) -> bool:
     """Отправляет уведомление с изображением."""
     try:
-        async with aiofiles.open(photo_path, "rb") as image_file:
-            image_data = await image_file.read()
-        buffered_photo = BufferedInputFile(image_data, filename=image_filename)
-        await bot.send_photo(tg_id, buffered_photo, caption=caption, reply_markup=keyboard)
+        await send_cached_media(
+            photo_path, lambda photo: bot.send_photo(tg_id, photo, caption=caption, reply_markup=keyboard)
+        )
         return True
     except (TelegramForbiddenError, TelegramBadRequest):
         return False
@@ -163,7 +162,23 @@ async def _send_text_notification(
         return False
 
 
-async def prepare_key_expiry_data(key, session: AsyncSession, current_time: int) -> dict:
+async def load_notification_context(session: AsyncSession, keys: list, notification_suffix: str) -> dict:
+    """
+    Загружает данные для рендеринга пачки уведомлений фиксированным числом запросов.
+
+    Возвращает тарифы ключей по id и время последней отправки по паре
+    (tg_id, f"{email}_{notification_suffix}").
+    """
+    tariffs = await get_tariffs_by_ids(session, (getattr(key, "tariff_id", None) for key in keys))
+    last_notification_times = await get_last_notification_times(
+        session, [(key.tg_id, f"{key.email or ''}_{notification_suffix}") for key in keys]
+    )
+    return {"tariffs": tariffs, "last_notification_times": last_notification_times}
+
+
+async def prepare_key_expiry_data(
+    key, session: AsyncSession, current_time: int, tariffs: dict[int, dict] | None = None
+) -> dict:
     moscow_tz = pytz.timezone("Europe/Moscow")
 
     expiry_timestamp = key.expiry_time
@@ -179,7 +194,10 @@ async def prepare_key_expiry_data(key, session: AsyncSession, current_time: int)
     tariff_details = ""
 
     if getattr(key, "tariff_id", None):
-        tariff = await get_tariff_by_id(session, key.tariff_id)
+        if tariffs is not None:
+            tariff = tariffs.get(key.tariff_id)
+        else:
+            tariff = await get_tariff_by_id(session, key.tariff_id)
         if tariff:
             tariff_name = tariff.get("name") or "—"
             traffic_limit = tariff.get("traffic_limit") or 0
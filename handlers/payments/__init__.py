@@ -4,12 +4,15 @@ from aiogram import Router
 
 from config import PROVIDERS_ENABLED
 from handlers.payments.providers import get_providers
+from utils.http_clients import close_http_sessions
 
 from .cryptobot import router as cryptobot_router
+from .currency_rates import start_rate_refresher, stop_rate_refresher
 from .fast_payment_flow import router as fast_payment_flow_router
 from .freekassa.freekassa_pay import router as freekassa_router
 from .gift import router as gift_router
 from .heleket import router as heleket_router
+from .inbox import start_payment_inbox, stop_payment_inbox
 from .kassai import router as kassai_router
 from .pay import router as pay_router
 from .robokassa import router as robokassa_router
@@ -46,3 +49,16 @@ router.include_router(wata_router)
 router.include_router(gift_router)
 router.include_router(pay_router)
 router.include_router(fast_payment_flow_router)
+
+
+@router.startup()
+async def on_startup():
+    start_payment_inbox()
+    await start_rate_refresher()
+
+
+@router.shutdown()
+async def on_shutdown():
+    await stop_payment_inbox()
+    await stop_rate_refresher()
+    await close_http_sessions()
@@ -2,16 +2,28 @@ from __future__ import annotations
 import sqlalchemy as sa
 from typing import Optional, Tuple
 
+import asyncio
+import json
 import time
+from datetime import datetime, timezone
 from decimal import ROUND_HALF_UP, Decimal
 import aiohttp
 from config import MULTICURRENCY_ENABLE, FX_MARKUP, RUB_TO_USD
+from database import async_session_maker, get_fx_rates, save_fx_rates
+from logger import logger
+from utils.http_clients import request_with_retry
 
 
 CBR_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
 CACHE_TTL = 60 * 30
+REFRESH_AHEAD = 60 * 5
 
-cache: dict[str, tuple[float, Decimal]] = {}
+_rub_per_unit: dict[str, Decimal] = {}
+_fetched_at = 0.0
+_loaded = False
+_refresh_lock = asyncio.Lock()
+_refresh_task: asyncio.Task | None = None
+_refresher_task: asyncio.Task | None = None
 
 
 def _q(x: Decimal, prec: int = 8) -> Decimal:
@@ -32,50 +44,132 @@ async def to_rub(amount: float | Decimal, base: str, *, session: aiohttp.ClientS
     return _q(Decimal(amount) / rate, prec=2)
 
 
+async def _fetch_cbr_rates(session: aiohttp.ClientSession | None = None) -> dict[str, Decimal]:
+    if session is None:
+        status, body = await request_with_retry("fx", "GET", CBR_URL, headers={"Accept": "application/json"})
+        if status != 200:
+            raise RuntimeError(f"ЦБ вернул статус {status}")
+        data = json.loads(body)
+    else:
+        async with session.get(CBR_URL, headers={"Accept": "application/json"}) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+
+    return {
+        code: Decimal(str(v["Value"])) / Decimal(str(v.get("Nominal", 1)))
+        for code, v in (data.get("Valute") or {}).items()
+    }
+
+
+async def _load_saved_rates():
+    """Один раз поднимает последний сохранённый снимок курсов, чтобы после перезапуска не ждать ЦБ."""
+    global _loaded, _fetched_at
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        async with async_session_maker() as session:
+            rates, fetched_at = await get_fx_rates(session)
+    except Exception as e:
+        logger.warning(f"[FX] Не удалось загрузить сохранённые курсы: {e}")
+        return
+    if rates and not _rub_per_unit:
+        _rub_per_unit.update(rates)
+        _fetched_at = fetched_at.replace(tzinfo=timezone.utc).timestamp() if fetched_at else 0.0
+
+
+async def refresh_rates(force: bool = False, *, session: aiohttp.ClientSession | None = None) -> bool:
+    """
+    Загружает курсы ЦБ и сохраняет их как последний удачный снимок.
+
+    Одновременные вызовы ждут одну загрузку; без force свежий снимок повторно не запрашивается.
+    При ошибке остаётся прежний снимок.
+    """
+    global _fetched_at
+    async with _refresh_lock:
+        if not force and _rub_per_unit and time.time() - _fetched_at < CACHE_TTL - REFRESH_AHEAD:
+            return True
+        try:
+            rates = await _fetch_cbr_rates(session)
+        except Exception as e:
+            logger.warning(f"[FX] Не удалось обновить курсы ЦБ: {e}")
+            return False
+
+        _rub_per_unit.clear()
+        _rub_per_unit.update(rates)
+        _fetched_at = time.time()
+
+    try:
+        async with async_session_maker() as db_session:
+            await save_fx_rates(db_session, rates, datetime.utcnow())
+    except Exception as e:
+        logger.warning(f"[FX] Не удалось сохранить курсы: {e}")
+    return True
+
+
+def _schedule_refresh():
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(refresh_rates())
+
+
 async def get_rub_rate(quote: str, *, session: aiohttp.ClientSession | None = None) -> Decimal:
+    """
+    Сколько единиц валюты quote в 1 рубле, с наценкой FX_MARKUP.
+
+    Курс берётся из снимка в памяти. Снимок, которому осталось меньше REFRESH_AHEAD, обновляется в фоне,
+    а устаревший продолжает отдаваться до успешного обновления, поэтому недоступность ЦБ не блокирует оплату.
+    """
     code = quote.upper()
     if code == "RUB":
         return Decimal("1")
 
     if code == "USD" and RUB_TO_USD not in (False, None, 0):
-        rate = _q(Decimal("1") / Decimal(str(RUB_TO_USD)))
-        cache[code] = (time.time(), rate)
-        return rate
-
-    now = time.time()
-    cached = cache.get(code)
-    if cached and now - cached[0] < CACHE_TTL:
-        return cached[1]
-
-    owns = False
-    s = session
-    if s is None:
-        s = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
-        owns = True
-    try:
-        async with s.get(CBR_URL, headers={"Accept": "application/json"}) as resp:
-            resp.raise_for_status()
-            data = await resp.json(content_type=None)
-    finally:
-        if owns and not s.closed:
-            await s.close()
-
-    valutes = data.get("Valute") or {}
-    v = valutes.get(code)
-    if not v:
+        return _q(Decimal("1") / Decimal(str(RUB_TO_USD)))
+
+    await _load_saved_rates()
+    if not _rub_per_unit:
+        await refresh_rates(session=session)
+    elif time.time() - _fetched_at >= CACHE_TTL - REFRESH_AHEAD:
+        _schedule_refresh()
+
+    if not _rub_per_unit:
+        raise RuntimeError("Курсы ЦБ недоступны")
+    rub_per_unit = _rub_per_unit.get(code)
+    if not rub_per_unit:
         raise ValueError(f"Валюта {code} не найдена у ЦБ")
 
-    rub_per_unit = Decimal(str(v["Value"])) / Decimal(str(v.get("Nominal", 1)))
     rate = _q(Decimal("1") / rub_per_unit)
-
-    if code != "RUB" and FX_MARKUP:
+    if FX_MARKUP:
         pct = Decimal(str(FX_MARKUP)) / Decimal("100")
         rate = _q(rate * (Decimal("1") + pct))
-
-    cache[code] = (now, rate)
     return rate
 
 
+async def _refresh_loop():
+    while True:
+        await refresh_rates()
+        await asyncio.sleep(max(CACHE_TTL - REFRESH_AHEAD, 60))
+
+
+async def start_rate_refresher():
+    """Загружает сохранённые курсы и обновляет их в фоне до истечения CACHE_TTL."""
+    global _refresher_task
+    if _refresher_task and not _refresher_task.done():
+        return
+    await _load_saved_rates()
+    _refresher_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_rate_refresher():
+    global _refresher_task
+    tasks = [t for t in (_refresher_task, _refresh_task) if t and not t.done()]
+    _refresher_task = None
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def convert_from_rub(
     amount_rub: Decimal | float,
     to_ccy: str,
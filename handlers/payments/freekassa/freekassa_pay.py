@@ -1,6 +1,5 @@
 import hashlib
 
-from datetime import datetime, timedelta
 from typing import Any
 
 from aiogram import F, Router, types
@@ -9,7 +8,6 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiohttp import web
-from sqlalchemy import and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import (
@@ -18,17 +16,13 @@ from config import (
     FREEKASSA_SHOP_ID,
 )
 from database import (
-    add_payment,
     add_user,
-    async_session_maker,
     check_user_exists,
     get_key_count,
     get_temporary_data,
-    update_balance,
 )
-from database.models import Payment
 from handlers.buttons import BACK, PAY_2
-from handlers.payments.utils import send_payment_success_notification
+from handlers.payments.inbox import accept_payment_event
 from handlers.texts import DEFAULT_PAYMENT_MESSAGE, ENTER_SUM, PAYMENT_OPTIONS
 from handlers.utils import edit_or_send_message
 from logger import logger
@@ -236,31 +230,13 @@ async def freekassa_webhook(request: web.Request):
             logger.error(f"Error parsing parameters: {e}")
             return web.Response(status=400, text="Invalid parameter format")
 
-        async with async_session_maker() as session:
-            recent_time = datetime.utcnow() - timedelta(minutes=1)
-            result = await session.execute(
-                select(Payment).where(
-                    and_(
-                        Payment.tg_id == tg_id_int,
-                        Payment.amount == amount_float,
-                        Payment.status == "success",
-                        Payment.created_at >= recent_time,
-                    )
-                )
+        if not await accept_payment_event("freekassa", merchant_order_id, tg_id_int, amount_float):
+            logger.warning(
+                f"[Freekassa] Повторный webhook. Платёж уже обработан: tg_id={tg_id_int}, amount={amount_float}"
             )
-            duplicate = result.scalar_one_or_none()
-
-            if duplicate:
-                logger.warning(
-                    f"[Freekassa] Повторный webhook. Платёж уже обработан: tg_id={tg_id_int}, amount={amount_float}"
-                )
-                return web.Response(text="YES")
-
-            await update_balance(session, tg_id_int, amount_float)
-            await send_payment_success_notification(tg_id_int, amount_float, session)
-            await add_payment(session, tg_id_int, amount_float, "freekassa")
+            return web.Response(text="YES")
 
-        logger.info(f"Payment processed successfully. User: {tg_id_int}, Amount: {amount_float}")
+        logger.info(f"Payment accepted for processing. User: {tg_id_int}, Amount: {amount_float}")
         return web.Response(text="YES")
 
     except Exception as e:
@@ -4,7 +4,6 @@ import json
 import time
 from decimal import Decimal, ROUND_HALF_UP
 
-import aiohttp
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -30,6 +29,7 @@ from handlers.utils import edit_or_send_message
 from database import add_payment, async_session_maker
 from database.models import User
 from logger import logger
+from utils.http_clients import get_http_session
 
 
 router = Router()
@@ -248,8 +248,7 @@ async def handle_custom_amount_input(message: types.Message, state: FSMContext,
     if currency == "RUB":
         amount_rub = user_amount
     else: 
-        async with aiohttp.ClientSession() as session_http:
-            amount_rub = int(await to_rub(user_amount, "USD", session=session_http))
+        amount_rub = int(await to_rub(user_amount, "USD"))
 
     await state.update_data(amount=amount_rub)
     payment_url = await generate_heleket_payment_link(amount_rub, message.chat.id, method)
@@ -349,77 +348,77 @@ async def generate_heleket_payment_link(amount: int, tg_id: int, method: dict) -
     unique_order_id = f"{int(time.time())}_{tg_id}"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            pay_cur = str(method["currency"]).upper()
-
-            if pay_cur == "RUB":
-                payment_amount = Decimal(str(amount)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            else:
-                rate = await get_rub_rate(pay_cur, session=session)
-                payment_amount = (Decimal(str(amount)) * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            async with async_session_maker() as dbs:
-                await add_payment(
-                    session=dbs,
-                    tg_id=tg_id,
-                    amount=float(amount),
-                    payment_system="HELEKET",
-                    status="pending",
-                    currency="RUB",
-                    payment_id=unique_order_id,
-                )
+        session = get_http_session("payments")
+        pay_cur = str(method["currency"]).upper()
+
+        if pay_cur == "RUB":
+            payment_amount = Decimal(str(amount)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        else:
+            rate = await get_rub_rate(pay_cur)
+            payment_amount = (Decimal(str(amount)) * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+        async with async_session_maker() as dbs:
+            await add_payment(
+                session=dbs,
+                tg_id=tg_id,
+                amount=float(amount),
+                payment_system="HELEKET",
+                status="pending",
+                currency="RUB",
+                payment_id=unique_order_id,
+            )
 
-            data = {
-                "amount": str(payment_amount),
-                "currency": method["currency"],
-                "order_id": unique_order_id,
-                "url_success": HELEKET_SUCCESS_URL,
-                "url_return": HELEKET_RETURN_URL,
-                "url_callback": HELEKET_CALLBACK_URL,
-                "additional_data": f"tg_id:{tg_id},rub_amount:{amount}",
-            }
-            if method.get("to_currency"):
-                data["to_currency"] = method["to_currency"]
-
-            json_data = json.dumps(data, separators=(",", ":"))
-            base64_data = base64.b64encode(json_data.encode("utf-8")).decode("utf-8")
-            sign_string = base64_data + HELEKET_API_KEY
-            signature = hashlib.md5(sign_string.encode("utf-8")).hexdigest()
-
-            headers = {
-                "merchant": HELEKET_MERCHANT_ID,
-                "sign": signature,
-                "Content-Type": "application/json",
-            }
-
-            async with session.post(url, headers=headers, data=json_data, timeout=60) as resp:
-                if resp.status == 200:
-                    try:
-                        resp_json = await resp.json()
-                        if resp_json.get("state") == 0:
-                            payment_url = resp_json.get("result", {}).get("url")
-                            if payment_url:
-                                logger.info(f"Heleket payment URL created for user {tg_id}")
-                                return payment_url
-                            else:
-                                logger.error(f"Heleket: No URL in response: {resp_json}")
-                                return "https://heleket.com/"
+        data = {
+            "amount": str(payment_amount),
+            "currency": method["currency"],
+            "order_id": unique_order_id,
+            "url_success": HELEKET_SUCCESS_URL,
+            "url_return": HELEKET_RETURN_URL,
+            "url_callback": HELEKET_CALLBACK_URL,
+            "additional_data": f"tg_id:{tg_id},rub_amount:{amount}",
+        }
+        if method.get("to_currency"):
+            data["to_currency"] = method["to_currency"]
+
+        json_data = json.dumps(data, separators=(",", ":"))
+        base64_data = base64.b64encode(json_data.encode("utf-8")).decode("utf-8")
+        sign_string = base64_data + HELEKET_API_KEY
+        signature = hashlib.md5(sign_string.encode("utf-8")).hexdigest()
+
+        headers = {
+            "merchant": HELEKET_MERCHANT_ID,
+            "sign": signature,
+            "Content-Type": "application/json",
+        }
+
+        async with session.post(url, headers=headers, data=json_data, timeout=60) as resp:
+            if resp.status == 200:
+                try:
+                    resp_json = await resp.json()
+                    if resp_json.get("state") == 0:
+                        payment_url = resp_json.get("result", {}).get("url")
+                        if payment_url:
+                            logger.info(f"Heleket payment URL created for user {tg_id}")
+                            return payment_url
                         else:
-                            logger.error(f"Heleket: Unsuccessful response: {resp_json}")
+                            logger.error(f"Heleket: No URL in response: {resp_json}")
                             return "https://heleket.com/"
-                    except Exception as e:
-                        logger.error(f"Heleket: Error parsing JSON response: {e}")
-                        text = await resp.text()
-                        logger.error(f"Heleket: Response content: {text}")
+                    else:
+                        logger.error(f"Heleket: Unsuccessful response: {resp_json}")
                         return "https://heleket.com/"
-                else:
-                    try:
-                        error_json = await resp.json()
-                        logger.error(f"Heleket API error: status={resp.status}, response={error_json}")
-                    except Exception:
-                        text = await resp.text()
-                        logger.error(f"Heleket API error: status={resp.status}, non-JSON response: {text}")
+                except Exception as e:
+                    logger.error(f"Heleket: Error parsing JSON response: {e}")
+                    text = await resp.text()
+                    logger.error(f"Heleket: Response content: {text}")
                     return "https://heleket.com/"
+            else:
+                try:
+                    error_json = await resp.json()
+                    logger.error(f"Heleket API error: status={resp.status}, response={error_json}")
+                except Exception:
+                    text = await resp.text()
+                    logger.error(f"Heleket API error: status={resp.status}, non-JSON response: {text}")
+                return "https://heleket.com/"
     except Exception as e:
         logger.error(f"Error creating Heleket payment: {e}")
         return "https://heleket.com/"
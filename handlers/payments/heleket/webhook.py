@@ -4,8 +4,8 @@ import json
 from aiohttp import web
 from logger import logger
 from config import HELEKET_API_KEY
-from database import async_session_maker, update_payment_status, update_balance, add_payment, get_payment_by_payment_id
-from handlers.payments.utils import send_payment_success_notification
+from database import async_session_maker, update_payment_status, get_payment_by_payment_id
+from handlers.payments.inbox import accept_payment_event
 
 
 def verify_heleket_signature(data: dict) -> bool:
@@ -78,34 +78,10 @@ async def process_heleket_webhook(data: dict) -> bool:
                 logger.error(f"Не удалось извлечь tg_id из Heleket webhook: {data}")
                 return False
             balance_amount = rub_amount if rub_amount else float(merchant_amount)
-            async with async_session_maker() as session:
-                payment = await get_payment_by_payment_id(session, order_id)
-                if payment:
-                    if payment.get("status") == "success":
-                        logger.info(f"Heleket: платёж {order_id} уже обработан")
-                        return True
-                    ok = await update_payment_status(session=session, internal_id=int(payment["id"]), new_status="success")
-                    if not ok:
-                        logger.error(f"Heleket: не удалось обновить статус платежа {order_id}")
-                        return False
-                    await update_balance(session, tg_id, balance_amount)
-                    await send_payment_success_notification(tg_id, balance_amount, session)
-                    await session.commit()
-                else:
-                    await add_payment(
-                        session=session,
-                        tg_id=tg_id,
-                        amount=balance_amount,
-                        payment_system="HELEKET",
-                        status="success",
-                        currency="USD",
-                        payment_id=order_id,
-                        metadata=None,
-                    )
-                    await update_balance(session, tg_id, balance_amount)
-                    await send_payment_success_notification(tg_id, balance_amount, session)
-                    await session.commit()
-            logger.info(f"Heleket: платёж {order_id} для пользователя {tg_id} успешно обработан, баланс пополнен на {balance_amount} RUB")
+            if not await accept_payment_event("HELEKET", order_id, tg_id, balance_amount, currency="USD"):
+                logger.info(f"Heleket: платёж {order_id} уже обработан")
+                return True
+            logger.info(f"Heleket: платёж {order_id} для пользователя {tg_id} принят в обработку, сумма {balance_amount} RUB")
             return True
         elif status in ['fail', 'wrong_amount', 'cancel', 'system_fail']:
             logger.warning(f"Heleket: неудачный платёж {order_id}, статус: {status}")
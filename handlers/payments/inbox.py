@@ -0,0 +1,123 @@
+import asyncio
+
+import config as cfg
+
+from database import (
+    async_session_maker,
+    fulfil_payment_event,
+    get_due_payment_event_ids,
+    retry_payment_event,
+    save_payment_event,
+)
+from handlers.payments.utils import send_payment_success_notification
+from logger import logger
+
+
+PAYMENT_INBOX_WORKERS = getattr(cfg, "PAYMENT_INBOX_WORKERS", 4)
+PAYMENT_INBOX_POLL_INTERVAL = 5
+PAYMENT_INBOX_BATCH_SIZE = 100
+PAYMENT_INBOX_MAX_ATTEMPTS = 8
+PAYMENT_INBOX_BACKOFF_BASE = 5
+PAYMENT_INBOX_BACKOFF_MAX = 600
+
+_queue: asyncio.Queue[int] = asyncio.Queue()
+_queued: set[int] = set()
+_tasks: list[asyncio.Task] = []
+
+
+async def accept_payment_event(
+    payment_system: str,
+    payment_id: str,
+    tg_id: int,
+    amount: float,
+    currency: str = "RUB",
+    payload: dict | None = None,
+) -> bool:
+    """
+    Сохраняет проверенный вебхук оплаты и передаёт его воркерам, не дожидаясь зачисления.
+
+    Возвращает False для повторного вебхука того же платежа. Ошибка записи пробрасывается, чтобы
+    вебхук ответил ошибкой и провайдер повторил его.
+    """
+    async with async_session_maker() as session:
+        event_id = await save_payment_event(session, payment_system, payment_id, tg_id, amount, currency, payload)
+    if event_id is None:
+        return False
+    _enqueue(event_id)
+    return True
+
+
+def _enqueue(event_id: int):
+    if event_id in _queued:
+        return
+    _queued.add(event_id)
+    _queue.put_nowait(event_id)
+
+
+async def _process(event_id: int):
+    try:
+        async with async_session_maker() as session:
+            event = await fulfil_payment_event(session, event_id)
+    except Exception as e:
+        logger.error(f"[PaymentInbox] Ошибка зачисления по событию #{event_id}: {e}")
+        async with async_session_maker() as session:
+            await retry_payment_event(
+                session,
+                event_id,
+                str(e),
+                max_attempts=PAYMENT_INBOX_MAX_ATTEMPTS,
+                backoff_base=PAYMENT_INBOX_BACKOFF_BASE,
+                backoff_max=PAYMENT_INBOX_BACKOFF_MAX,
+            )
+        return
+
+    if not event:
+        return
+    try:
+        async with async_session_maker() as session:
+            await send_payment_success_notification(event.tg_id, event.amount, session)
+    except Exception as e:
+        logger.warning(f"[PaymentInbox] Не удалось уведомить пользователя {event.tg_id} о платеже: {e}")
+
+
+async def _worker():
+    while True:
+        event_id = await _queue.get()
+        try:
+            await _process(event_id)
+        except Exception as e:
+            logger.error(f"[PaymentInbox] Ошибка обработки события #{event_id}: {e}")
+        finally:
+            _queued.discard(event_id)
+            _queue.task_done()
+
+
+async def _dispatcher():
+    """Подбирает отложенные и оставшиеся после перезапуска события, у которых наступило время попытки."""
+    while True:
+        try:
+            async with async_session_maker() as session:
+                event_ids = await get_due_payment_event_ids(session, PAYMENT_INBOX_BATCH_SIZE)
+            for event_id in event_ids:
+                _enqueue(event_id)
+        except Exception as e:
+            logger.error(f"[PaymentInbox] Ошибка выборки событий оплаты: {e}")
+        await asyncio.sleep(PAYMENT_INBOX_POLL_INTERVAL)
+
+
+def start_payment_inbox():
+    if _tasks:
+        return
+    _tasks.append(asyncio.create_task(_dispatcher()))
+    _tasks.extend(asyncio.create_task(_worker()) for _ in range(PAYMENT_INBOX_WORKERS))
+    logger.info(f"[PaymentInbox] Запущено воркеров: {PAYMENT_INBOX_WORKERS}")
+
+
+async def stop_payment_inbox():
+    """Останавливает воркеры; необработанные события остаются в таблице и будут подобраны после запуска."""
+    tasks = list(_tasks)
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _queued.clear()
@@ -1,7 +1,6 @@
 import hashlib
 import hmac
 import time
-import aiohttp
 
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
@@ -32,6 +31,7 @@ from handlers.payments.keyboards import build_amounts_keyboard, payment_options_
 from handlers.utils import edit_or_send_message
 from database.models import User
 from logger import logger
+from utils.http_clients import get_http_session
 
 router = Router()
 
@@ -260,8 +260,7 @@ async def handle_custom_amount_input(message: types.Message, state: FSMContext,
     if currency == "RUB":
         amount_rub = user_amount
     else: 
-        async with aiohttp.ClientSession() as session_http:
-            amount_rub = int(await to_rub(user_amount, "USD", session=session_http))
+        amount_rub = int(await to_rub(user_amount, "USD"))
 
     await state.update_data(amount=amount_rub)
     payment_url = await generate_kassai_payment_link(amount_rub, message.chat.id, method)
@@ -391,33 +390,33 @@ async def generate_kassai_payment_link(amount: int, tg_id: int, method: dict) ->
     data = {**data_for_signature, "signature": signature}
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data, timeout=60) as resp:
-                if resp.status == 200:
-                    try:
-                        resp_json = await resp.json()
-                        if resp_json.get("type") == "success":
-                            payment_url = resp_json.get("location")
-                            if payment_url:
-                                logger.info(f"KassaAI payment URL created for user {tg_id}")
-                                return payment_url
-                            logger.error(f"KassaAI: No location in response: {resp_json}")
-                            return "https://fk.life/"
-                        logger.error(f"KassaAI: Unsuccessful response: {resp_json}")
-                        return "https://fk.life/"
-                    except Exception as e:
-                        logger.error(f"KassaAI: Error parsing JSON response: {e}")
-                        text = await resp.text()
-                        logger.error(f"KassaAI: Response content: {text}")
+        session = get_http_session("payments")
+        async with session.post(url, headers=headers, json=data, timeout=60) as resp:
+            if resp.status == 200:
+                try:
+                    resp_json = await resp.json()
+                    if resp_json.get("type") == "success":
+                        payment_url = resp_json.get("location")
+                        if payment_url:
+                            logger.info(f"KassaAI payment URL created for user {tg_id}")
+                            return payment_url
+                        logger.error(f"KassaAI: No location in response: {resp_json}")
                         return "https://fk.life/"
-                else:
-                    try:
-                        error_json = await resp.json()
-                        logger.error(f"KassaAI API error: status={resp.status}, response={error_json}")
-                    except Exception:
-                        text = await resp.text()
-                        logger.error(f"KassaAI API error: status={resp.status}, non-JSON response: {text}")
+                    logger.error(f"KassaAI: Unsuccessful response: {resp_json}")
+                    return "https://fk.life/"
+                except Exception as e:
+                    logger.error(f"KassaAI: Error parsing JSON response: {e}")
+                    text = await resp.text()
+                    logger.error(f"KassaAI: Response content: {text}")
                     return "https://fk.life/"
+            else:
+                try:
+                    error_json = await resp.json()
+                    logger.error(f"KassaAI API error: status={resp.status}, response={error_json}")
+                except Exception:
+                    text = await resp.text()
+                    logger.error(f"KassaAI API error: status={resp.status}, non-JSON response: {text}")
+                return "https://fk.life/"
     except Exception as e:
         logger.error(f"Error creating KassaAI order: {e}")
         return "https://fk.life/"
@@ -2,8 +2,7 @@ import hashlib
 from aiohttp import web
 from logger import logger
 from config import KASSAI_SHOP_ID, KASSAI_SECRET_KEY
-from database import add_payment, async_session_maker, get_payment_by_payment_id, update_balance, update_payment_status
-from handlers.payments.utils import send_payment_success_notification
+from handlers.payments.inbox import accept_payment_event
 
 
 def verify_kassai_signature(data: dict, signature: str) -> bool:
@@ -50,35 +49,9 @@ async def kassai_webhook(request: web.Request):
             return web.Response(status=400)
         
         logger.info(f"KassaAI: успешный платёж {order_id} на сумму {amount} RUB для пользователя {tg_id}")
-        
-        async with async_session_maker() as session:
-            payment = await get_payment_by_payment_id(session, order_id)
-            if payment:
-                if payment.get("status") == "success":
-                    logger.info(f"KassaAI: платёж {order_id} уже обработан")
-                    return web.Response(text="OK")
-                ok = await update_payment_status(session=session, internal_id=int(payment["id"]), new_status="success")
-                if not ok:
-                    logger.error(f"KassaAI: не удалось обновить статус платежа {order_id}")
-                    return web.Response(status=500)
-                await update_balance(session, tg_id, amount)
-                await send_payment_success_notification(tg_id, amount, session)
-                await session.commit()
-            else:
-                await add_payment(
-                    session=session,
-                    tg_id=tg_id,
-                    amount=amount,
-                    payment_system="KASSAI",
-                    status="success",
-                    currency="RUB",
-                    payment_id=order_id,
-                    metadata=None,
-                )
-                await update_balance(session, tg_id, amount)
-                await send_payment_success_notification(tg_id, amount, session)
-                await session.commit()
-        logger.info(f"KassaAI: платёж {order_id} успешно обработан, баланс пользователя {tg_id} пополнен на {amount} RUB")
+
+        if not await accept_payment_event("KASSAI", order_id, tg_id, amount):
+            logger.info(f"KassaAI: платёж {order_id} уже обработан")
         return web.Response(text="OK")
     except Exception as e:
         logger.error(f"Ошибка обработки KassaAI webhook: {e}")
@@ -1,5 +1,3 @@
-import aiohttp
-
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -28,6 +26,7 @@ from handlers.texts import (
 )
 from handlers.utils import edit_or_send_message
 from logger import logger
+from utils.http_clients import get_http_session
 
 
 router = Router()
@@ -351,25 +350,25 @@ async def generate_wata_payment_link(amount, tg_id, cassa):
             url = f"http://www.cbr.ru/scripts/XML_daily.asp?date_req={today}"
 
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, timeout=15) as resp:
-                        if resp.status == 200:
-                            xml_content = await resp.text()
-                            root = ET.fromstring(xml_content)
-
-                            for valute in root.findall("Valute"):
-                                char_code = valute.find("CharCode")
-                                if char_code is not None and char_code.text == "USD":
-                                    value_elem = valute.find("Value")
-                                    if value_elem is not None:
-                                        usd_rub_rate = float(value_elem.text.replace(",", "."))
-                                        rub_usd_rate = 1 / usd_rub_rate
-                                        logger.info(
-                                            f"CBR USD rate: 1 USD = {usd_rub_rate} RUB, 1 RUB = {rub_usd_rate} USD"
-                                        )
-                                        return rub_usd_rate
-
-                            logger.warning("USD rate not found in CBR response")
+                session = get_http_session("fx")
+                async with session.get(url, timeout=15) as resp:
+                    if resp.status == 200:
+                        xml_content = await resp.text()
+                        root = ET.fromstring(xml_content)
+
+                        for valute in root.findall("Valute"):
+                            char_code = valute.find("CharCode")
+                            if char_code is not None and char_code.text == "USD":
+                                value_elem = valute.find("Value")
+                                if value_elem is not None:
+                                    usd_rub_rate = float(value_elem.text.replace(",", "."))
+                                    rub_usd_rate = 1 / usd_rub_rate
+                                    logger.info(
+                                        f"CBR USD rate: 1 USD = {usd_rub_rate} RUB, 1 RUB = {rub_usd_rate} USD"
+                                    )
+                                    return rub_usd_rate
+
+                        logger.warning("USD rate not found in CBR response")
 
             except Exception as e:
                 logger.error(f"Failed to get USD rate from CBR: {e}")
@@ -396,26 +395,26 @@ async def generate_wata_payment_link(amount, tg_id, cassa):
             data["amount"] = amount_usd
             data["currency"] = "USD"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=data, timeout=60) as resp:
-            if resp.status == 200:
-                try:
-                    resp_json = await resp.json()
-                except Exception:
-                    text = await resp.text()
-                    logger.error(f"Ошибка при разборе JSON ответа WATA: статус={resp.status}, ответ={text}")
-                    return "https://wata.pro/"
-
-                if "url" in resp_json:
-                    return resp_json["url"]
-
-                logger.error(f"Ответ WATA без url: {resp_json}")
-                return "https://wata.pro/"
-
+    session = get_http_session("payments")
+    async with session.post(url, headers=headers, json=data, timeout=60) as resp:
+        if resp.status == 200:
             try:
-                error_json = await resp.json()
-                logger.error(f"Ошибка WATA API: статус={resp.status}, ответ={error_json}")
+                resp_json = await resp.json()
             except Exception:
                 text = await resp.text()
-                logger.error(f"Ошибка WATA API: статус={resp.status}, не-JSON ответ: {text}")
+                logger.error(f"Ошибка при разборе JSON ответа WATA: статус={resp.status}, ответ={text}")
+                return "https://wata.pro/"
+
+            if "url" in resp_json:
+                return resp_json["url"]
+
+            logger.error(f"Ответ WATA без url: {resp_json}")
             return "https://wata.pro/"
+
+        try:
+            error_json = await resp.json()
+            logger.error(f"Ошибка WATA API: статус={resp.status}, ответ={error_json}")
+        except Exception:
+            text = await resp.text()
+            logger.error(f"Ошибка WATA API: статус={resp.status}, не-JSON ответ: {text}")
+        return "https://wata.pro/"
@@ -1,36 +1,39 @@
-import asyncio
 import html
 import os
 import re
 import secrets
 import string
 
-from collections import OrderedDict
 from datetime import datetime, timedelta
 
-import aiofiles
-
 from aiogram.types import (
-    BufferedInputFile,
     InlineKeyboardMarkup,
     InputMediaAnimation,
     InputMediaPhoto,
     InputMediaVideo,
     Message,
 )
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import config as cfg
+
 from bot import bot
 from config import ADMIN_ID
-from database import get_servers
+from database import get_key_load_by_server, get_servers
 from database.models import Key, Notification, Server
 from hooks.hooks import run_hooks
 from logger import logger
+from utils.media_registry import send_cached_media
 
 
 ALLOWED_GROUP_CODES = ["trial", "discounts", "discounts_max", "gifts"]
 
+BALANCER_WEIGHT_LOAD = getattr(cfg, "BALANCER_WEIGHT_LOAD", 1.0)
+BALANCER_WEIGHT_LATENCY = getattr(cfg, "BALANCER_WEIGHT_LATENCY", 0.5)
+BALANCER_WEIGHT_ERRORS = getattr(cfg, "BALANCER_WEIGHT_ERRORS", 1.0)
+BALANCER_LATENCY_REFERENCE_MS = getattr(cfg, "BALANCER_LATENCY_REFERENCE_MS", 300)
+
 
 async def generate_random_email(
     length: int = 8,
@@ -48,8 +51,42 @@ async def generate_random_email(
     raise RuntimeError("Не удалось сгенерировать уникальный email после нескольких попыток")
 
 
+def score_cluster(cluster_servers: list[dict], cluster_load: int, max_load: int) -> float:
+    """
+    Оценка кластера для выдачи новых ключей: чем меньше, тем лучше.
+
+    Складывает заполненность (ключи к max_keys, без лимита — к самому загруженному кластеру),
+    среднюю задержку по проверкам check_servers и долю неудачных проверок с весами BALANCER_WEIGHT_*.
+    """
+    from servers import get_server_health
+
+    limits = [server["max_keys"] for server in cluster_servers if server.get("max_keys")]
+    if limits:
+        fill = cluster_load / max(limits)
+    else:
+        fill = cluster_load / max_load if max_load else 0.0
+
+    latencies = []
+    error_rates = []
+    for server in cluster_servers:
+        health = get_server_health(server["server_name"])
+        if not health:
+            continue
+        if health.avg_latency_ms is not None:
+            latencies.append(health.avg_latency_ms)
+        error_rates.append(health.error_rate)
+
+    latency = min(sum(latencies) / len(latencies) / BALANCER_LATENCY_REFERENCE_MS, 1.0) if latencies else 0.5
+    error_rate = sum(error_rates) / len(error_rates) if error_rates else 0.0
+
+    return BALANCER_WEIGHT_LOAD * fill + BALANCER_WEIGHT_LATENCY * latency + BALANCER_WEIGHT_ERRORS * error_rate
+
+
 async def get_least_loaded_cluster(session: AsyncSession) -> str:
+    from servers import is_server_down
+
     servers = await get_servers(session)
+    key_loads = await get_key_load_by_server(session)
     server_to_cluster = {}
     cluster_loads = {}
 
@@ -58,16 +95,13 @@ async def get_least_loaded_cluster(session: AsyncSession) -> str:
         for server in cluster_servers:
             server_to_cluster[server["server_name"]] = cluster_name
 
-    result = await session.execute(select(Key))
-    keys = result.scalars().all()
-
-    for key in keys:
-        server_id = key.server_id
+    for server_id, count in key_loads.items():
         cluster_id = server_to_cluster.get(server_id, server_id)
         if cluster_id in cluster_loads:
-            cluster_loads[cluster_id] += 1
+            cluster_loads[cluster_id] += count
 
     available_clusters = {}
+    available_servers_by_cluster = {}
     for cluster_name, cluster_servers in servers.items():
         enabled_servers = [server for server in cluster_servers if server.get("enabled", True)]
 
@@ -76,11 +110,15 @@ async def get_least_loaded_cluster(session: AsyncSession) -> str:
 
         available_servers = []
         for server in enabled_servers:
-            if await check_server_key_limit(server, session):
+            if is_server_down(server["server_name"]):
+                logger.info(f"[Balancer] Сервер {server['server_name']} недоступен, пропускаем")
+                continue
+            if await check_server_key_limit(server, session, key_loads=key_loads):
                 available_servers.append(server)
 
         if available_servers:
             available_clusters[cluster_name] = cluster_loads[cluster_name]
+            available_servers_by_cluster[cluster_name] = available_servers
         else:
             continue
 
@@ -92,14 +130,26 @@ async def get_least_loaded_cluster(session: AsyncSession) -> str:
         logger.warning("❌ Нет доступных кластеров с лимитом ключей!")
         raise ValueError("⚠️ Сервисы временно недоступны. Попробуйте позже.")
 
-    least_loaded_cluster = min(available_clusters, key=lambda k: (available_clusters[k], k))
+    max_load = max(cluster_loads.values(), default=0)
+    scores = {
+        cluster_name: score_cluster(
+            available_servers_by_cluster.get(cluster_name, servers.get(cluster_name, [])),
+            cluster_loads.get(cluster_name, 0),
+            max_load,
+        )
+        for cluster_name in available_clusters
+    }
+
+    best_cluster = min(available_clusters, key=lambda k: (scores[k], available_clusters[k], k))
     logger.info(
-        f"Выбран наименее загруженный кластер: {least_loaded_cluster} (загрузка: {available_clusters[least_loaded_cluster]})"
+        f"Выбран кластер: {best_cluster} (загрузка: {available_clusters[best_cluster]}, оценка: {scores[best_cluster]:.3f})"
     )
-    return least_loaded_cluster
+    return best_cluster
 
 
-async def check_server_key_limit(server_info: dict, session: AsyncSession) -> bool:
+async def check_server_key_limit(
+    server_info: dict, session: AsyncSession, key_loads: dict[str, int] | None = None
+) -> bool:
     server_name = server_info.get("server_name")
     cluster_name = server_info.get("cluster_name")
     max_keys = server_info.get("max_keys")
@@ -109,8 +159,9 @@ async def check_server_key_limit(server_info: dict, session: AsyncSession) -> bo
 
     identifier = cluster_name if cluster_name else server_name
 
-    result = await session.execute(select(func.count()).select_from(Key).where(Key.server_id == identifier))
-    total_keys = result.scalar() or 0
+    if key_loads is None:
+        key_loads = await get_key_load_by_server(session)
+    total_keys = key_loads.get(identifier, 0)
 
     if total_keys >= max_keys:
         logger.warning(f"[Key Limit] Сервер {server_name} достиг лимита: {total_keys}/{max_keys}")
@@ -198,6 +249,13 @@ def format_hours(hours: int) -> str:
     return f"{hours} {get_plural_form(hours, 'час', 'часа', 'часов')}"
 
 
+INPUT_MEDIA_TYPES = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "animation": InputMediaAnimation,
+}
+
+
 def get_media_type(media_path: str) -> str:
     if not media_path:
         return "photo"
@@ -225,15 +283,6 @@ async def edit_or_send_message(
     force_text: bool = False,
     disable_cache: bool = False,
 ):
-    if not hasattr(edit_or_send_message, "cache"):
-        import asyncio
-
-        from collections import OrderedDict
-
-        edit_or_send_message.cache = OrderedDict()
-        edit_or_send_message.lock = asyncio.Lock()
-        edit_or_send_message.max = 256
-
     def find_media_file(original_path: str) -> str | None:
         if not original_path:
             return None
@@ -256,109 +305,22 @@ async def edit_or_send_message(
         if actual_media_path:
             media_type = get_media_type(actual_media_path)
 
-            cached_id = None
-            if not disable_cache:
-                async with edit_or_send_message.lock:
-                    cached_id = edit_or_send_message.cache.get(actual_media_path)
-                    if cached_id:
-                        edit_or_send_message.cache.move_to_end(actual_media_path)
-
-            if cached_id:
+            async def send_media(media):
+                input_media = INPUT_MEDIA_TYPES[media_type](media=media, caption=text)
                 try:
-                    if media_type == "photo":
-                        await target_message.edit_media(
-                            InputMediaPhoto(media=cached_id, caption=text), reply_markup=reply_markup
-                        )
-                    elif media_type == "video":
-                        await target_message.edit_media(
-                            InputMediaVideo(media=cached_id, caption=text), reply_markup=reply_markup
-                        )
-                    elif media_type == "animation":
-                        await target_message.edit_media(
-                            InputMediaAnimation(media=cached_id, caption=text), reply_markup=reply_markup
-                        )
-                    return
+                    return await target_message.edit_media(input_media, reply_markup=reply_markup)
                 except Exception:
-                    try:
-                        if media_type == "photo":
-                            await target_message.answer_photo(
-                                photo=cached_id,
-                                caption=text,
-                                reply_markup=reply_markup,
-                                disable_web_page_preview=disable_web_page_preview,
-                            )
-                        elif media_type == "video":
-                            await target_message.answer_video(
-                                video=cached_id,
-                                caption=text,
-                                reply_markup=reply_markup,
-                                disable_web_page_preview=disable_web_page_preview,
-                            )
-                        elif media_type == "animation":
-                            await target_message.answer_animation(
-                                animation=cached_id,
-                                caption=text,
-                                reply_markup=reply_markup,
-                                disable_web_page_preview=disable_web_page_preview,
-                            )
-                        return
-                    except Exception:
-                        pass
-
-            async with aiofiles.open(actual_media_path, "rb") as f:
-                data = await f.read()
-            upload = BufferedInputFile(data, filename=os.path.basename(actual_media_path))
-
-            try:
-                if media_type == "photo":
-                    msg = await target_message.edit_media(
-                        InputMediaPhoto(media=upload, caption=text), reply_markup=reply_markup
-                    )
-                elif media_type == "video":
-                    msg = await target_message.edit_media(
-                        InputMediaVideo(media=upload, caption=text), reply_markup=reply_markup
-                    )
-                elif media_type == "animation":
-                    msg = await target_message.edit_media(
-                        InputMediaAnimation(media=upload, caption=text), reply_markup=reply_markup
-                    )
-            except Exception:
-                if media_type == "photo":
-                    msg = await target_message.answer_photo(
-                        photo=upload,
-                        caption=text,
-                        reply_markup=reply_markup,
-                        disable_web_page_preview=disable_web_page_preview,
-                    )
-                elif media_type == "video":
-                    msg = await target_message.answer_video(
-                        video=upload,
-                        caption=text,
-                        reply_markup=reply_markup,
-                        disable_web_page_preview=disable_web_page_preview,
-                    )
-                elif media_type == "animation":
-                    msg = await target_message.answer_animation(
-                        animation=upload,
+                    answer = getattr(target_message, f"answer_{media_type}")
+                    return await answer(
+                        media,
                         caption=text,
                         reply_markup=reply_markup,
                         disable_web_page_preview=disable_web_page_preview,
                     )
 
-            file_id = None
-            if hasattr(msg, "photo") and msg.photo:
-                file_id = msg.photo[-1].file_id
-            elif hasattr(msg, "video") and msg.video:
-                file_id = msg.video.file_id
-            elif hasattr(msg, "animation") and msg.animation:
-                file_id = msg.animation.file_id
-
-            if file_id and not disable_cache:
-                async with edit_or_send_message.lock:
-                    if actual_media_path not in edit_or_send_message.cache:
-                        edit_or_send_message.cache[actual_media_path] = file_id
-                        if len(edit_or_send_message.cache) > edit_or_send_message.max:
-                            edit_or_send_message.cache.popitem(last=False)
+            await send_cached_media(
+                actual_media_path, send_media, media_type=media_type, use_cache=not disable_cache
+            )
             return
 
     if not force_text and target_message.caption is not None:
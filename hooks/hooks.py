@@ -30,6 +30,10 @@ def register_hook(name: str, func: Callable[..., Any] | None = None):
     logger.info(f"[Hook] Зарегистрирован хук '{name}': {func.__name__}")
 
 
+def has_hooks(name: str) -> bool:
+    return bool(_hooks.get(name))
+
+
 def unregister_module_hooks(module_name: str):
     for k, lst in list(_hooks.items()):
         filtered = [(f, owner) for (f, owner) in lst if owner != module_name]
@@ -15,7 +15,7 @@ from .maintenance import MaintenanceModeMiddleware
 from .probe import MiddlewareProbe, StreamProbeMiddleware, TailHandlerProbe
 from .session import SessionMiddleware
 from .throttling import ThrottlingMiddleware
-from .user import UserMiddleware
+from .user import UserMiddleware, stop_user_profile_writer
 
 
 PROBE_LOGGING = False
@@ -61,6 +61,8 @@ def register_middleware(
             wrapped.append(wrap(inst, getattr(inst, "name", inst.__class__.__name__)))
         middlewares = wrapped
 
+    dispatcher.shutdown.register(stop_user_profile_writer)
+
     handlers = [dispatcher.message, dispatcher.callback_query, dispatcher.inline_query]
     for middleware in middlewares:
         for h in handlers:
@@ -3,10 +3,8 @@ from typing import Any
 
 from aiogram import BaseMiddleware
 from aiogram.types import CallbackQuery, Message, TelegramObject
-from sqlalchemy import select
 
-from config import ADMIN_ID
-from database.models import Admin
+from utils.identity_cache import get_admin_role
 
 
 class AdminMiddleware(BaseMiddleware):
@@ -16,8 +14,6 @@ class AdminMiddleware(BaseMiddleware):
     является ли пользователь администратором.
     """
 
-    _admin_ids: set[int] = set(ADMIN_ID) if isinstance(ADMIN_ID, list | tuple) else {ADMIN_ID}
-
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
@@ -25,11 +21,11 @@ class AdminMiddleware(BaseMiddleware):
         data: dict[str, Any],
     ) -> Any:
         """Обрабатывает событие и добавляет флаг администратора в data."""
-        data["admin"] = await self._check_admin_access(event, data.get("session"))
+        data["admin"] = await self._check_admin_access(event)
         return await handler(event, data)
 
-    async def _check_admin_access(self, event: TelegramObject, session) -> bool:
-        """Проверяет, имеет ли пользователь права администратора."""
+    async def _check_admin_access(self, event: TelegramObject) -> bool:
+        """Проверяет, имеет ли пользователь права администратора, по кешу ролей."""
         try:
             user_id = None
             if isinstance(event, Message):
@@ -42,13 +38,6 @@ class AdminMiddleware(BaseMiddleware):
             if not user_id:
                 return False
 
-            if user_id in self._admin_ids:
-                return True
-
-            if session:
-                result = await session.execute(select(Admin).where(Admin.tg_id == user_id))
-                return result.scalar_one_or_none() is not None
-
-            return False
+            return await get_admin_role(user_id) is not None
         except Exception:
             return False
@@ -1,21 +1,17 @@
 from collections.abc import Awaitable, Callable
-from datetime import datetime
 from typing import Any
 
 from aiogram import BaseMiddleware
 from aiogram.types import CallbackQuery, Message, TelegramObject, Update
 from pytz import timezone
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import SUPPORT_CHAT_URL
-from database.models import ManualBan
 from logger import logger
+from utils.identity_cache import get_ban
 
 
 TZ = timezone("Europe/Moscow")
-_BAN_CACHE_TTL = 30
-_ban_cache: dict[int, tuple[float, dict | None]] = {}
 
 
 class BanCheckerMiddleware(BaseMiddleware):
@@ -45,38 +41,7 @@ class BanCheckerMiddleware(BaseMiddleware):
         if tg_id is None:
             return await handler(event, data)
 
-        now_ts = datetime.utcnow().timestamp()
-        cached = _ban_cache.get(tg_id)
-        if cached and cached[0] > now_ts:
-            ban_info = cached[1]
-        else:
-            session: AsyncSession | None = (
-                data.get("session") if isinstance(data.get("session"), AsyncSession) else None
-            )
-            created_here = False
-            if session is None:
-                session = self.session_factory()
-                created_here = True
-            try:
-                q = (
-                    select(ManualBan.reason, ManualBan.until)
-                    .where(
-                        ManualBan.tg_id == tg_id,
-                        (ManualBan.until.is_(None)) | (ManualBan.until > datetime.utcnow()),
-                    )
-                    .limit(1)
-                )
-                res = await session.execute(q)
-                row = res.first()
-                if row:
-                    reason, until = row
-                    ban_info = {"reason": reason or "не указана", "until": until}
-                else:
-                    ban_info = None
-            finally:
-                if created_here:
-                    await session.close()
-            _ban_cache[tg_id] = (now_ts + _BAN_CACHE_TTL, ban_info)
+        ban_info = await get_ban(tg_id, self.session_factory)
 
         if not ban_info:
             return await handler(event, data)
@@ -4,9 +4,7 @@ from typing import Any
 from aiogram import BaseMiddleware
 from aiogram.types import CallbackQuery, Message, Update
 
-from config import ADMIN_ID
-from database import async_session_maker
-from database.models import Admin
+from utils.identity_cache import get_admin_role
 
 
 maintenance_mode = False
@@ -31,14 +29,9 @@ class MaintenanceModeMiddleware(BaseMiddleware):
         if not user_id:
             return
 
-        if user_id in ADMIN_ID:
+        if await get_admin_role(user_id) is not None:
             return await handler(event, data)
 
-        async with async_session_maker() as session:
-            db_admin = await session.get(Admin, user_id)
-            if db_admin:
-                return await handler(event, data)
-
         if isinstance(event, CallbackQuery):
             await event.answer("⚙️ Бот временно недоступен. Ведутся технические работы.", show_alert=True)
         elif isinstance(event, Message):
@@ -2,6 +2,13 @@ from aiogram import BaseMiddleware
 
 
 class SessionMiddleware(BaseMiddleware):
+    """
+    Передаёт хендлеру сессию БД в data['session'].
+
+    AsyncSession берёт соединение из пула только при первом запросе, поэтому апдейты, которые
+    обслуживаются из кешей middleware и не трогают базу, соединение не занимают.
+    """
+
     def __init__(self, sessionmaker) -> None:
         super().__init__()
         self.sessionmaker = sessionmaker
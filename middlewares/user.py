@@ -1,18 +1,91 @@
+import asyncio
+
 from collections.abc import Awaitable, Callable
-from time import monotonic
+from datetime import datetime
 from typing import Any
 
+import config as cfg
+
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, User
 
-from database import upsert_user
+from database import async_session_maker, get_user_row, update_user_profiles
 from logger import logger
+from utils.identity_cache import MISSING, users
+
+
+USER_FLUSH_INTERVAL = getattr(cfg, "USER_FLUSH_INTERVAL", 5)
+USER_FLUSH_BATCH_SIZE = 1000
+
+_pending_profiles: dict[int, dict] = {}
+_flush_lock = asyncio.Lock()
+_flusher: asyncio.Task | None = None
+
+
+def queue_user_profile(user: User):
+    """Ставит профиль пользователя в очередь на запись; повторные изменения до сброса схлопываются."""
+    global _flusher
+    _pending_profiles[user.id] = {
+        "tg_id": user.id,
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "language_code": user.language_code,
+        "is_bot": user.is_bot,
+        "updated_at": datetime.utcnow(),
+    }
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.create_task(_flush_loop())
+
+
+async def flush_user_profiles():
+    """Записывает накопленные профили пачками; при ошибке они возвращаются в очередь, если не были обновлены."""
+    global _pending_profiles
+    async with _flush_lock:
+        if not _pending_profiles:
+            return
+        pending, _pending_profiles = _pending_profiles, {}
+        profiles = list(pending.values())
+        try:
+            for start in range(0, len(profiles), USER_FLUSH_BATCH_SIZE):
+                async with async_session_maker() as session:
+                    await update_user_profiles(session, profiles[start : start + USER_FLUSH_BATCH_SIZE])
+        except Exception:
+            for tg_id, profile in pending.items():
+                _pending_profiles.setdefault(tg_id, profile)
+            raise
+    logger.debug(f"Обновлено профилей пользователей: {len(profiles)}")
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(USER_FLUSH_INTERVAL)
+        try:
+            await flush_user_profiles()
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении профилей пользователей: {e}")
+
+
+async def stop_user_profile_writer():
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        await asyncio.gather(_flusher, return_exceptions=True)
+        _flusher = None
+    try:
+        await flush_user_profiles()
+    except Exception as e:
+        logger.error(f"Не удалось сохранить профили пользователей при остановке: {e}")
 
 
 class UserMiddleware(BaseMiddleware):
-    def __init__(self, debounce_sec: float = 60.0) -> None:
-        self._debounce = float(debounce_sec)
-        self._cache: dict[int, tuple[str, float, dict | None]] = {}
+    """
+    Кладёт строку пользователя из БД в data['user'] и отмечает его активность.
+
+    Строка читается из общего кеша пользователей, пока не истёк USER_CACHE_TTL и не изменились
+    имя или язык в Telegram. Изменения профиля и отметка активности не пишутся в базу сразу, а
+    копятся в очереди и сбрасываются одним UPDATE раз в USER_FLUSH_INTERVAL.
+    """
 
     async def __call__(
         self,
@@ -23,39 +96,38 @@ class UserMiddleware(BaseMiddleware):
         try:
             user: User | None = data.get("event_from_user")
             if user and not user.is_bot:
-                session = data.get("session")
-                db_user = await self._process_user(user, session)
+                db_user = await self._process_user(user)
                 if db_user:
                     data["user"] = db_user
         except Exception as e:
             logger.error(f"Ошибка при обработке пользователя: {e}")
         return await handler(event, data)
 
-    async def _process_user(self, user: User, session: Any = None) -> dict | None:
+    async def _process_user(self, user: User) -> dict | None:
         uid = user.id
         fp = self._fingerprint(user)
-        now = monotonic()
-
-        cached = self._cache.get(uid)
-        if cached:
-            cached_fp, ts, cached_db_user = cached
-            if fp == cached_fp and now - ts < self._debounce:
-                return cached_db_user
-
-        logger.debug(f"Обработка пользователя: {uid}")
-        db_user = await upsert_user(
-            tg_id=uid,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            language_code=user.language_code,
-            is_bot=user.is_bot,
-            session=session,
-            only_if_exists=True,
-        )
-        self._cache[uid] = (fp, now, db_user)
+
+        cached = users.get(uid)
+        if cached is not MISSING:
+            cached_fp, db_user = cached
+            if fp == cached_fp:
+                return db_user
+        else:
+            logger.debug(f"Обработка пользователя: {uid}")
+            async with async_session_maker() as session:
+                db_user = await get_user_row(session, uid)
+
         if db_user:
-            logger.debug(f"Получены данные пользователя из БД: {uid}")
+            db_user = {
+                **db_user,
+                "username": user.username or db_user.get("username"),
+                "first_name": user.first_name or db_user.get("first_name"),
+                "last_name": user.last_name or db_user.get("last_name"),
+                "language_code": user.language_code or db_user.get("language_code"),
+                "is_bot": user.is_bot,
+            }
+            queue_user_profile(user)
+        users.set(uid, (fp, db_user))
         return db_user
 
     def _fingerprint(self, user: User) -> str:
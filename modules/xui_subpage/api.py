@@ -1,11 +1,10 @@
 import asyncio
 import logging
-import os
 import time
 from datetime import datetime, timezone
 from fastapi import HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -15,6 +14,8 @@ import re
 
 from panels._3xui import get_vless_link_for_client, get_xui_instance
 
+from .assets import AssetStore
+
 
 def extract_host(api_url: str) -> str:
     match = re.match(r"(https?://)?([^:/]+)", api_url)
@@ -22,7 +23,8 @@ def extract_host(api_url: str) -> str:
 
 from .settings import (
     APPS_ENABLED, DEEPLINKS, APP_LINKS, BUTTONS_ENABLED, CURRENT_THEME, LANGUAGE_MODE, FALLBACK_LANGUAGE, BASE_PATH,
-    RATE_LIMIT_ENABLED, RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD, RATE_LIMIT_BLOCK_TIME, HAPTIC_ENABLED, VLESS_SELECTOR_ENABLED
+    RATE_LIMIT_ENABLED, RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD, RATE_LIMIT_BLOCK_TIME, HAPTIC_ENABLED, VLESS_SELECTOR_ENABLED,
+    ASSETS_DEV_RELOAD, STATIC_MAX_AGE
 )
 
 if not BASE_PATH.endswith('/'):
@@ -125,30 +127,37 @@ def create_api_routes(app, module_path):
         
         return response
 
-    @app.get(f"{BASE_PATH}", response_class=HTMLResponse)
-    async def device_connector_index():
-        html_path = os.path.join(module_path, "static", "index.html")
-        version_path = os.path.join(module_path, "VERSION")
-
-        version = "1.0.0"
-        if os.path.exists(version_path):
-            with open(version_path, encoding="utf-8") as f:
-                version = f.read().strip()
+    assets = AssetStore(
+        module_path,
+        {
+            "PROJECT_NAME": PROJECT_NAME,
+            "WEBHOOK_HOST": WEBHOOK_HOST,
+            "SUPPORT_CHAT_URL": SUPPORT_CHAT_URL,
+            "USERNAME_BOT": USERNAME_BOT,
+            "BASE_PATH": BASE_PATH,
+        },
+        dev_reload=ASSETS_DEV_RELOAD,
+    )
 
-        if os.path.exists(html_path):
-            with open(html_path, encoding="utf-8") as f:
-                content = f.read()
+    @app.get(f"{BASE_PATH}", response_class=HTMLResponse)
+    async def device_connector_index(request: Request):
+        page = assets.get_page()
+        if page:
+            return page.respond(request, "no-cache")
 
-            content = content.replace("{{PROJECT_NAME}}", PROJECT_NAME)
-            content = content.replace("{{WEBHOOK_HOST}}", WEBHOOK_HOST)
-            content = content.replace("{{SUPPORT_CHAT_URL}}", SUPPORT_CHAT_URL)
-            content = content.replace("{{USERNAME_BOT}}", USERNAME_BOT)
-            content = content.replace("{{BASE_PATH}}", BASE_PATH)
-            content = content.replace("{{VERSION}}", version)
+        return HTMLResponse(content=f"<h1>Подключение устройства</h1><p>Модуль xui_subpage активирован для {PROJECT_NAME}</p>")
 
-            return HTMLResponse(content=content)
+    @app.get(f"{BASE_PATH}static/{{path:path}}")
+    async def static_asset(request: Request, path: str):
+        asset = assets.get_static(path)
+        if not asset:
+            return Response(status_code=404)
 
-        return HTMLResponse(content=f"<h1>Подключение устройства</h1><p>Модуль xui_subpage активирован для {PROJECT_NAME}</p>")
+        if "v" in request.query_params:
+            cache_control = f"public, max-age={STATIC_MAX_AGE}, immutable"
+        else:
+            cache_control = "no-cache"
+        return asset.respond(request, cache_control)
 
     @app.get(f"{BASE_PATH}api/sub")
     async def get_sub(request: Request, key_name=Query(None)):
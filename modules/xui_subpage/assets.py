@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+PLACEHOLDER_RE = re.compile(r"\{\{([A-Z_]+)\}\}")
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 512
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+class Asset:
+    """Файл в памяти с ETag и заранее сжатыми gzip/brotli вариантами."""
+
+    __slots__ = ("content_type", "etag", "variants")
+
+    def __init__(self, body: bytes, content_type: str) -> None:
+        self.content_type = content_type
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.variants = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+    def respond(self, request: Request, cache_control: str) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or self.etag in tags:
+                return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""), self.variants)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variants[encoding], media_type=self.content_type, headers=headers)
+
+
+def compile_template(text: str) -> list[str]:
+    """Разбивает шаблон на чередующиеся куски текста и имена плейсхолдеров {{NAME}}."""
+    return PLACEHOLDER_RE.split(text)
+
+
+def render_template(parts: list[str], context: dict[str, str]) -> str:
+    return "".join(
+        part if i % 2 == 0 else context.get(part, "{{" + part + "}}")
+        for i, part in enumerate(parts)
+    )
+
+
+class AssetStore:
+    """
+    Страница подключения и статика модуля, загруженные в память один раз.
+
+    Шаблон index.html разбирается при загрузке и рендерится сразу, поэтому ответы не читают диск.
+    При dev_reload файлы перечитываются, если изменилось время их модификации.
+    """
+
+    def __init__(self, module_path: str, context: dict[str, str], dev_reload: bool = False) -> None:
+        self.static_path = os.path.join(module_path, "static")
+        self.template_path = os.path.join(self.static_path, "index.html")
+        self.version_path = os.path.join(module_path, "VERSION")
+        self.context = context
+        self.dev_reload = dev_reload
+        self.page: Asset | None = None
+        self.files: dict[str, Asset] = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self.load()
+
+    def _scan(self) -> tuple:
+        entries = []
+        for path in (self.version_path, self.template_path):
+            if os.path.exists(path):
+                entries.append((path, os.path.getmtime(path)))
+        for root, _dirs, files in os.walk(self.static_path):
+            for name in files:
+                path = os.path.join(root, name)
+                entries.append((path, os.path.getmtime(path)))
+        return tuple(sorted(entries))
+
+    def load(self):
+        version = "1.0.0"
+        if os.path.exists(self.version_path):
+            with open(self.version_path, encoding="utf-8") as f:
+                version = f.read().strip()
+
+        page = None
+        if os.path.exists(self.template_path):
+            with open(self.template_path, encoding="utf-8") as f:
+                parts = compile_template(f.read())
+            html = render_template(parts, {**self.context, "VERSION": version})
+            page = Asset(html.encode("utf-8"), "text/html; charset=utf-8")
+
+        files = {}
+        for root, _dirs, names in os.walk(self.static_path):
+            for name in names:
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, self.static_path).replace(os.sep, "/")
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                if content_type.startswith(("text/", "application/javascript")):
+                    content_type += "; charset=utf-8"
+                with open(path, "rb") as f:
+                    files[rel_path] = Asset(f.read(), content_type)
+
+        self.page, self.files = page, files
+        self._signature = self._scan()
+        logging.info("[Subscription Page] Загружено в память файлов статики: %s, версия %s", len(files), version)
+
+    def _maybe_reload(self):
+        if not self.dev_reload or time.monotonic() - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = time.monotonic()
+        if self._scan() != self._signature:
+            self.load()
+
+    def get_page(self) -> Asset | None:
+        self._maybe_reload()
+        return self.page
+
+    def get_static(self, path: str) -> Asset | None:
+        self._maybe_reload()
+        return self.files.get(path)
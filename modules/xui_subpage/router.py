@@ -3,7 +3,6 @@ import threading
 import uvicorn
 import logging
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from hooks.hooks import register_hook
 from .settings import MODULE_PORT, BASE_PATH, MODULE_ENABLED
 
@@ -60,12 +59,9 @@ def get_version():
 
 router = create_telegram_router()
 MODULE_PATH = os.path.dirname(__file__)
-STATIC_PATH = os.path.join(MODULE_PATH, "static")
 
 app = FastAPI(title="3X-UI Subscription Page", version=get_version())
 create_api_routes(app, MODULE_PATH)
-if os.path.exists(STATIC_PATH):
-    app.mount(f"{BASE_PATH}static", StaticFiles(directory=STATIC_PATH), name="static")
 
 def run_fastapi_server():
     try:
@@ -90,6 +90,13 @@ RATE_LIMIT_BLOCK_TIME = 60
 # Должен совпадать с настройкой в Nginx/Caddy выше. Обычно не нужно менять
 BASE_PATH = "/connect/"
 
+# Перечитывать шаблон страницы и статику при изменении файлов без перезапуска бота?
+# True = удобно при доработке страницы, False = файлы загружаются в память один раз (рекомендуется)
+ASSETS_DEV_RELOAD = False
+
+# Сколько секунд браузер может хранить статику (css/js) без повторной проверки
+STATIC_MAX_AGE = 31536000
+
 # ========================================
 # 📝 ТЕКСТЫ НА КНОПКАХ
 # ========================================
@@ -1,6 +1,7 @@
+import asyncio
 import time
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 import httpx
@@ -59,6 +60,79 @@ async def get_xui_instance(api_url: str) -> AsyncApi:
     return xui
 
 
+INBOUND_SNAPSHOT_TTL = 60
+
+
+@dataclass
+class InboundSnapshot:
+    """Список inbound'ов панели с клиентами и их статистикой на момент загрузки."""
+
+    inbounds: dict[int, py3xui.Inbound] = field(default_factory=dict)
+    clients_by_email: dict[str, tuple[int, py3xui.Client]] = field(default_factory=dict)
+    emails_by_uuid: dict[str, list[str]] = field(default_factory=dict)
+    stats_by_email: dict[str, py3xui.Client] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+    @classmethod
+    def from_inbounds(cls, inbounds: list[py3xui.Inbound]) -> "InboundSnapshot":
+        snapshot = cls(loaded_at=time.monotonic())
+        for inbound in inbounds:
+            snapshot.inbounds[inbound.id] = inbound
+            clients = getattr(getattr(inbound, "settings", None), "clients", None) or []
+            for client in clients:
+                email = (client.email or "").lower()
+                snapshot.clients_by_email[email] = (inbound.id, client)
+                if client.id:
+                    snapshot.emails_by_uuid.setdefault(str(client.id), []).append(email)
+            for stats in inbound.client_stats or []:
+                snapshot.stats_by_email[(stats.email or "").lower()] = stats
+        return snapshot
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self.loaded_at < INBOUND_SNAPSHOT_TTL
+
+    def get_client(self, email: str) -> tuple[int, py3xui.Client] | None:
+        return self.clients_by_email.get(email.lower())
+
+    def get_traffic(self, client_id: str) -> list[py3xui.Client]:
+        emails = self.emails_by_uuid.get(str(client_id), [])
+        return [self.stats_by_email[email] for email in emails if email in self.stats_by_email]
+
+
+_inbound_snapshots: dict[str, InboundSnapshot] = {}
+_inbound_snapshot_locks: dict[str, asyncio.Lock] = {}
+
+
+async def get_inbound_snapshot(xui: py3xui.AsyncApi, force: bool = False) -> InboundSnapshot:
+    """
+    Возвращает снимок всех inbound'ов панели, загружая его не чаще раза в INBOUND_SNAPSHOT_TTL.
+
+    Одновременные запросы к одной панели ждут одну загрузку inbounds/list.
+    """
+    host = xui.inbound.host
+    snapshot = _inbound_snapshots.get(host)
+    if snapshot and snapshot.is_fresh and not force:
+        return snapshot
+
+    async with _inbound_snapshot_locks.setdefault(host, asyncio.Lock()):
+        current = _inbound_snapshots.get(host)
+        if current is not None and current is not snapshot and current.is_fresh:
+            return current
+
+        inbounds = await xui.inbound.get_list()
+        snapshot = InboundSnapshot.from_inbounds(inbounds or [])
+        _inbound_snapshots[host] = snapshot
+        logger.debug(
+            f"[XUI Snapshot] {host}: {len(snapshot.inbounds)} inbound, {len(snapshot.clients_by_email)} клиентов"
+        )
+        return snapshot
+
+
+def invalidate_inbound_snapshot(xui: py3xui.AsyncApi):
+    _inbound_snapshots.pop(xui.inbound.host, None)
+
+
 async def add_client(xui: py3xui.AsyncApi, config: ClientConfig) -> dict[str, Any]:
     try:
         client = py3xui.Client(
@@ -74,6 +148,7 @@ async def add_client(xui: py3xui.AsyncApi, config: ClientConfig) -> dict[str, An
         )
 
         response = await xui.client.add(config.inbound_id, [client])
+        invalidate_inbound_snapshot(xui)
         logger.info(f"Клиент {config.email} успешно добавлен с ID {config.client_id}")
         return response if response else {"status": "failed"}
 
@@ -122,6 +197,7 @@ async def extend_client_key(
 
         await xui.client.update(client.id, client)
         await xui.client.reset_stats(inbound_id, email)
+        invalidate_inbound_snapshot(xui)
         logger.info(f"Ключ клиента {email} успешно продлён до {new_expiry_time}")
         return True
 
@@ -143,6 +219,7 @@ async def delete_client(
     try:
         if SUPERNODE:
             await xui.client.delete(inbound_id, client_id)
+            invalidate_inbound_snapshot(xui)
             logger.info(f"Клиент с ID {client_id} был удален успешно (SUPERNODE)")
             return True
 
@@ -153,6 +230,7 @@ async def delete_client(
 
         client.id = client_id
         await xui.client.delete(inbound_id, client.id)
+        invalidate_inbound_snapshot(xui)
         logger.info(f"Клиент с ID {client_id} был удален успешно")
         return True
 
@@ -167,12 +245,13 @@ async def delete_client(
 
 async def get_client_traffic(xui: py3xui.AsyncApi, client_id: str) -> dict[str, Any]:
     try:
-        traffic_data = await xui.client.get_traffic_by_id(client_id)
+        snapshot = await get_inbound_snapshot(xui)
+        traffic_data = snapshot.get_traffic(client_id) or await xui.client.get_traffic_by_id(client_id)
         if not traffic_data:
             logger.warning(f"Трафик для клиента {client_id} не найден.")
             return {"status": "not_found", "client_id": client_id}
 
-        logger.info(f"Трафик для клиента {client_id} успешно получен.")
+        logger.debug(f"Трафик для клиента {client_id} успешно получен.")
         return {"status": "success", "client_id": client_id, "traffic": traffic_data}
 
     except httpx.ConnectTimeout as e:
@@ -205,6 +284,7 @@ async def toggle_client(
         client.inbound_id = inbound_id
 
         await xui.client.update(client.id, client)
+        invalidate_inbound_snapshot(xui)
         status = "включен" if enable else "отключен"
         logger.info(f"Клиент с email {email} и ID {client_id} успешно {status}.")
         return True
@@ -293,19 +373,22 @@ async def get_vless_link_for_client(
     remark: str | None = None,
 ) -> str | None:
     try:
-        inbound = await xui.inbound.get_by_id(inbound_id)
+        snapshot = await get_inbound_snapshot(xui)
+        found = snapshot.get_client(email)
+        if not found or found[0] != inbound_id:
+            snapshot = await get_inbound_snapshot(xui, force=True)
+            found = snapshot.get_client(email)
+
+        inbound = snapshot.inbounds.get(inbound_id)
         if not inbound:
             logger.warning(f"Не удалось собрать VLESS ссылку: inbound_id={inbound_id}, email={email}")
             return None
 
         true_uuid = None
         client_flow = None
-        if getattr(inbound, "settings", None) and getattr(inbound.settings, "clients", None):
-            for c in inbound.settings.clients:
-                if getattr(c, "email", None) == email:
-                    true_uuid = getattr(c, "id", None)
-                    client_flow = getattr(c, "flow", None)
-                    break
+        if found and found[0] == inbound_id:
+            true_uuid = getattr(found[1], "id", None)
+            client_flow = getattr(found[1], "flow", None)
 
         if not true_uuid:
             logger.warning(f"Не удалось получить UUID клиента: inbound_id={inbound_id}, email={email}")
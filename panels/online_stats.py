@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from dataclasses import dataclass, field
+
+import config as cfg
+
+from config import REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD
+
+from logger import logger
+from panels._3xui import get_inbound_snapshot, get_xui_instance
+from panels.remnawave_pool import get_remnawave_api
+
+
+ONLINE_STATS_TTL = getattr(cfg, "ONLINE_STATS_TTL", 30)
+
+
+@dataclass
+class ServerOnline:
+    """Число пользователей онлайн на сервере и его нодах на момент сбора."""
+
+    server_name: str
+    panel_type: str
+    online: int = 0
+    nodes: list[dict] = field(default_factory=list)
+    error: str | None = None
+    collected_at: float = 0.0
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self.collected_at < ONLINE_STATS_TTL
+
+
+_online_stats: dict[str, ServerOnline] = {}
+_online_locks: dict[str, asyncio.Lock] = {}
+
+
+async def _collect_3xui(server: dict) -> ServerOnline:
+    xui = await get_xui_instance(server["api_url"])
+    online_emails, snapshot = await asyncio.gather(xui.client.online(), get_inbound_snapshot(xui))
+
+    inbound_id = int(server["inbound_id"])
+    online = 0
+    for email in online_emails or []:
+        found = snapshot.get_client(email)
+        if found and found[0] == inbound_id:
+            online += 1
+    return ServerOnline(server["server_name"], "3x-ui", online=online)
+
+
+async def _collect_remnawave(server: dict) -> ServerOnline:
+    inbound_id = server.get("inbound_id")
+    if not inbound_id:
+        raise Exception("Не указан inbound_id сервера")
+
+    remna = await get_remnawave_api(server["api_url"])
+    if not remna:
+        raise Exception("Не удалось авторизоваться в Remnawave")
+
+    nodes_data = await remna.get_all_nodes_with_online(
+        username=REMNAWAVE_LOGIN, password=REMNAWAVE_PASSWORD, inbound_id=inbound_id
+    )
+    if nodes_data.get("error"):
+        raise Exception(nodes_data["error"])
+
+    nodes, seen = [], set()
+    for node in nodes_data.get("nodes") or []:
+        name = node.get("name", "Unknown")
+        if name in seen:
+            continue
+        seen.add(name)
+        nodes.append({
+            "name": name,
+            "country_code": node.get("country_code", "Unknown"),
+            "online_users": node.get("online_users", 0),
+        })
+    return ServerOnline(server["server_name"], "remnawave", online=nodes_data.get("total_online", 0), nodes=nodes)
+
+
+async def get_server_online(server: dict, force: bool = False) -> ServerOnline:
+    """
+    Возвращает число пользователей онлайн на сервере, собирая его не чаще раза в ONLINE_STATS_TTL.
+
+    Для 3x-ui список онлайн-клиентов сопоставляется со снимком inbound'ов панели в памяти, без
+    запроса на каждого клиента. Одновременные запросы к одному серверу ждут один сбор, ошибки не кешируются.
+    """
+    server_name = server["server_name"]
+    stats = _online_stats.get(server_name)
+    if stats and stats.is_fresh and not force:
+        return stats
+
+    async with _online_locks.setdefault(server_name, asyncio.Lock()):
+        current = _online_stats.get(server_name)
+        if current is not None and current is not stats and current.is_fresh:
+            return current
+
+        panel_type = server.get("panel_type", "3x-ui").lower()
+        try:
+            if panel_type == "remnawave":
+                stats = await _collect_remnawave(server)
+            else:
+                stats = await _collect_3xui(server)
+        except Exception as e:
+            logger.warning(f"[Online] Не удалось получить онлайн сервера {server_name}: {e}")
+            _online_stats.pop(server_name, None)
+            return ServerOnline(server_name, panel_type, error=str(e) or "Сервер недоступен")
+
+        stats.collected_at = time.monotonic()
+        _online_stats[server_name] = stats
+        return stats
+
+
+async def get_cluster_online(cluster_servers: list[dict], force: bool = False) -> list[ServerOnline]:
+    """Собирает онлайн всех серверов кластера параллельно, в порядке списка серверов."""
+    return list(await asyncio.gather(*(get_server_online(server, force=force) for server in cluster_servers)))
+
+
+def get_cached_online() -> dict[str, ServerOnline]:
+    """Последние собранные значения онлайна по серверам, без обращения к панелям."""
+    return {name: stats for name, stats in _online_stats.items() if stats.is_fresh}
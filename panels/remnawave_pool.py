@@ -0,0 +1,151 @@
+import asyncio
+import base64
+import json
+import time
+
+from functools import partial
+from typing import Any
+
+from config import REMNAWAVE_LOGIN, REMNAWAVE_PASSWORD
+
+from logger import logger
+from panels.remnawave import RemnawaveAPI
+
+
+SESSION_TTL = 1800
+TOKEN_REFRESH_MARGIN = 60
+MAX_CONCURRENT_REQUESTS = 10
+AUTH_ERROR_STATUSES = frozenset({401})
+
+PANEL_METHODS = frozenset({
+    "clear_all_hwid_devices",
+    "create_user",
+    "delete_user",
+    "delete_user_hwid_device",
+    "disable_user",
+    "enable_user",
+    "get_all_nodes",
+    "get_all_nodes_with_online",
+    "get_all_users_time",
+    "get_hosts",
+    "get_raw_subscription",
+    "get_subscription_by_username",
+    "get_user_by_uuid",
+    "get_user_hwid_devices",
+    "reset_user_traffic",
+    "update_user",
+})
+
+_remnawave_clients: dict[str, "PooledRemnawaveAPI"] = {}
+_client_locks: dict[str, asyncio.Lock] = {}
+
+
+def _token_expires_at(token: str | None) -> float | None:
+    """Достаёт exp из JWT-токена панели, если он есть."""
+    if not token or token.count(".") != 2:
+        return None
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp else None
+    except Exception:
+        return None
+
+
+class PooledRemnawaveAPI:
+    """
+    Долгоживущий авторизованный клиент Remnawave для одного api_url.
+
+    Переиспользует HTTP-соединения и токен RemnawaveAPI между запросами, ограничивает число
+    одновременных запросов к панели и прозрачно проксирует остальные методы RemnawaveAPI.
+    """
+
+    def __init__(self, api_url: str) -> None:
+        self.api_url = api_url
+        self.api = RemnawaveAPI(api_url)
+        self.refresh_at = 0.0
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.refresh_at
+
+    async def login(self, username: str = REMNAWAVE_LOGIN, password: str = REMNAWAVE_PASSWORD) -> bool:
+        if not await self.api.login(username, password):
+            self.refresh_at = 0.0
+            return False
+
+        now = time.time()
+        expires_at = _token_expires_at(getattr(self.api, "token", None))
+        if expires_at:
+            self.refresh_at = min(now + SESSION_TTL, expires_at - TOKEN_REFRESH_MARGIN)
+        else:
+            self.refresh_at = now + SESSION_TTL
+        return True
+
+    async def _call(self, method, *args: Any, **kwargs: Any) -> Any:
+        async with self._semaphore:
+            try:
+                return await method(*args, **kwargs)
+            except Exception as e:
+                if AUTH_ERROR_STATUSES.intersection({getattr(e, "status", None), getattr(e, "status_code", None)}):
+                    logger.warning(f"[Remnawave] Ошибка авторизации в {self.api_url}, токен будет обновлён")
+                    invalidate_remnawave_api(self.api_url)
+                raise
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.api, name)
+        if name in PANEL_METHODS:
+            return partial(self._call, attr)
+        return attr
+
+    async def aclose(self):
+        try:
+            await self.api.aclose()
+        except Exception as e:
+            logger.warning(f"[Remnawave] Ошибка закрытия клиента {self.api_url}: {e}")
+
+
+async def get_remnawave_api(api_url: str) -> PooledRemnawaveAPI | None:
+    """
+    Возвращает авторизованный клиент Remnawave из пула или None, если войти не удалось.
+
+    Повторный вход выполняется только после истечения токена (или SESSION_TTL), одновременные
+    запросы к одному api_url ждут одну авторизацию.
+    """
+    client = _remnawave_clients.get(api_url)
+    if client and client.is_fresh:
+        return client
+
+    async with _client_locks.setdefault(api_url, asyncio.Lock()):
+        client = _remnawave_clients.get(api_url)
+        if client and client.is_fresh:
+            return client
+
+        if client is None:
+            client = PooledRemnawaveAPI(api_url)
+        else:
+            logger.info(f"[Remnawave] Токен для {api_url} устарел, повторная авторизация...")
+
+        if not await client.login():
+            logger.error(f"[Remnawave] Не удалось авторизоваться в {api_url}")
+            _remnawave_clients.pop(api_url, None)
+            await client.aclose()
+            return None
+
+        _remnawave_clients[api_url] = client
+        return client
+
+
+def invalidate_remnawave_api(api_url: str):
+    """Принудительно запрашивает новый токен при следующем обращении, например после 401."""
+    client = _remnawave_clients.get(api_url)
+    if client:
+        client.refresh_at = 0.0
+
+
+async def close_remnawave_clients():
+    clients = list(_remnawave_clients.values())
+    _remnawave_clients.clear()
+    await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
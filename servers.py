@@ -1,14 +1,22 @@
 import asyncio
 import re
 import ssl
+import time
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
+import httpx
+
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from ping3 import ping
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import config as cfg
+
 from bot import bot
 from config import ADMIN_ID, PING_TIME
 from database import get_servers
@@ -19,26 +27,99 @@ from logger import logger
 last_ping_times = {}
 last_down_times = {}
 notified_servers = set()
-PING_SEMAPHORE = asyncio.Semaphore(3)
+
+PING_TIMEOUT = getattr(cfg, "PING_TIMEOUT", 3)
+PANEL_CHECK_TIMEOUT = getattr(cfg, "PANEL_CHECK_TIMEOUT", 5)
+PROBE_CONCURRENCY = getattr(cfg, "PROBE_CONCURRENCY", 50)
+LATENCY_HISTORY_SIZE = 20
+
+PING_SEMAPHORE = asyncio.Semaphore(PROBE_CONCURRENCY)
+_ping_executor = ThreadPoolExecutor(max_workers=min(PROBE_CONCURRENCY, 32), thread_name_prefix="ping")
+
+
+@dataclass
+class ServerHealth:
+    """Результаты проверок одного сервера: доступность, задержка и история задержек в мс."""
+
+    server_name: str
+    host: str
+    online: bool = True
+    panel_ok: bool | None = None
+    latency_ms: float | None = None
+    method: str | None = None
+    error: str | None = None
+    checked_at: datetime | None = None
+    failures: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_HISTORY_SIZE))
+    panel_results: deque = field(default_factory=lambda: deque(maxlen=LATENCY_HISTORY_SIZE))
+
+    @property
+    def error_rate(self) -> float:
+        """Доля последних проверок, в которых сервер или API панели не ответили."""
+        if not self.panel_results:
+            return 0.0
+        return self.panel_results.count(False) / len(self.panel_results)
+
+    @property
+    def avg_latency_ms(self) -> float | None:
+        values = [v for v in self.latencies if v is not None]
+        return sum(values) / len(values) if values else None
+
+
+server_health: dict[str, ServerHealth] = {}
+
+
+def get_server_health(server_name: str) -> ServerHealth | None:
+    return server_health.get(server_name)
+
+
+def get_health_snapshot() -> dict[str, ServerHealth]:
+    """Последние результаты проверок по всем серверам; не обращается к сети и БД."""
+    return dict(server_health)
+
+
+def is_server_down(server_name: str) -> bool:
+    """Сервер считается недоступным, если последняя проверка check_servers завершилась неудачей."""
+    health = server_health.get(server_name)
+    return health is not None and not health.online
+
+
+async def icmp_ping(host: str) -> float | None:
+    """ICMP-пинг в отдельном потоке, чтобы не блокировать event loop. Возвращает задержку в мс."""
+    loop = asyncio.get_running_loop()
+    try:
+        response = await loop.run_in_executor(_ping_executor, lambda: ping(host, timeout=PING_TIMEOUT, unit="ms"))
+    except Exception:
+        return None
+    return float(response) if response not in (None, False) else None
 
 
 async def ping_server(server_ip: str) -> bool:
     """Пингует сервер через ICMP или TCP 443, если ICMP недоступен."""
+    online, _latency, _method = await probe_host(server_ip)
+    return online
+
+
+async def probe_host(host: str) -> tuple[bool, float | None, str | None]:
+    """Проверяет хост через ICMP, при неудаче через TCP/TLS 443. Возвращает (доступен, задержка мс, способ)."""
     async with PING_SEMAPHORE:
-        try:
-            response = ping(server_ip, timeout=3)
-            if response is not None and response is not False:
-                return True
-            return await check_tcp_connection(server_ip, 443)
-        except Exception:
-            return await check_tcp_connection(server_ip, 443)
+        latency = await icmp_ping(host)
+        if latency is not None:
+            return True, latency, "icmp"
+
+        started = time.perf_counter()
+        if await check_tcp_connection(host, 443):
+            return True, (time.perf_counter() - started) * 1000, "tcp"
+        return False, None, None
 
 
 async def check_tcp_connection(host: str, port: int) -> bool:
     """Проверяет доступность сервера через TCP с попыткой SSL-соединения."""
     try:
         ssl_context = ssl.create_default_context()
-        _reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        _reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl_context), timeout=PING_TIMEOUT
+        )
         writer.close()
         await writer.wait_closed()
         return True
@@ -53,6 +134,41 @@ async def check_tcp_connection(host: str, port: int) -> bool:
         return False
 
 
+async def check_panel_api(client: httpx.AsyncClient, api_url: str) -> bool:
+    """Проверяет, что веб-интерфейс панели отвечает без ошибки сервера."""
+    try:
+        response = await client.get(api_url)
+        return response.status_code < 500
+    except Exception:
+        return False
+
+
+async def probe_server(client: httpx.AsyncClient, server: dict) -> ServerHealth:
+    """Выполняет сетевую проверку и проверку API панели параллельно и обновляет историю сервера."""
+    server_name = server["server_name"]
+    host = extract_host(server["api_url"])
+
+    (online, latency, method), panel_ok = await asyncio.gather(
+        probe_host(host), check_panel_api(client, server["api_url"])
+    )
+
+    health = server_health.get(server_name)
+    if health is None or health.host != host:
+        health = ServerHealth(server_name=server_name, host=host)
+        server_health[server_name] = health
+
+    health.online = online
+    health.panel_ok = panel_ok
+    health.latency_ms = latency
+    health.method = method
+    health.checked_at = datetime.now()
+    health.latencies.append(latency)
+    health.panel_results.append(online and panel_ok)
+    health.failures = 0 if online else health.failures + 1
+    health.error = None if online else "нет ответа ICMP и TCP 443"
+    return health
+
+
 async def notify_ssl_error(server_host: str, error_text: str):
     message = (
         f"⚠️ <b>Ошибка SSL на сервере</b> <code>{server_host}</code>\n\n"
@@ -90,34 +206,40 @@ async def notify_admin(server_name: str, status: str, down_duration: timedelta =
 async def check_servers(session: AsyncSession):
     """
     Периодическая проверка серверов.
-    Использует asyncio.gather() для ускорения.
+    Все серверы проверяются параллельно; результаты доступны через get_health_snapshot() и is_server_down().
     """
     while True:
         servers = await get_servers(session=session)
         current_time = datetime.now()
 
-        tasks = []
-        server_info_list = []
-
-        for _, cluster_servers in servers.items():
-            for server in cluster_servers:
-                original_api_url = server["api_url"]
-                server_name = server["server_name"]
-                server_host = extract_host(original_api_url)
-
-                server_info_list.append((server_name, server_host))
-                tasks.append(ping_server(server_host))
+        server_list = [server for cluster_servers in servers.values() for server in cluster_servers]
+        server_info_list = [(server["server_name"], extract_host(server["api_url"])) for server in server_list]
 
         logger.info(f"Начинаем проверку {len(server_info_list)} серверов...")
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=PANEL_CHECK_TIMEOUT, verify=False) as client:  # noqa: S501
+            results = await asyncio.gather(
+                *(probe_server(client, server) for server in server_list), return_exceptions=True
+            )
+        logger.info(f"Проверка серверов заняла {time.perf_counter() - started:.1f} сек.")
+
+        active_names = {name for name, _ in server_info_list}
+        for stale_name in set(server_health) - active_names:
+            server_health.pop(stale_name, None)
 
         offline_servers = set()
         restored_servers = set()
         online_servers = set()
 
         for (server_name, server_host), result in zip(server_info_list, results, strict=False):
-            is_online = bool(result) if not isinstance(result, Exception) else False
+            if isinstance(result, Exception):
+                health = server_health.setdefault(server_name, ServerHealth(server_name=server_name, host=server_host))
+                health.online = False
+                health.panel_results.append(False)
+                health.error = str(result)
+                health.checked_at = current_time
+            is_online = server_health[server_name].online
 
             if is_online:
                 last_ping_times[server_name] = current_time
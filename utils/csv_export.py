@@ -1,17 +1,146 @@
 import csv
+import tempfile
+import zlib
 
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Sequence
 from datetime import datetime
 from io import StringIO
+from typing import IO, Any
 
-from aiogram.types import BufferedInputFile
-from sqlalchemy import exists, func, join, not_, select
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, InputFile
+from sqlalchemy import Select, exists, func, join, not_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.models import Key, Payment, Referral, Tariff, User
 
 
-async def export_users_csv(session: AsyncSession) -> BufferedInputFile:
-    query = select(
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+USERS_HEADER = [
+    "tg_id",
+    "username",
+    "first_name",
+    "last_name",
+    "language_code",
+    "is_bot",
+    "balance",
+    "trial",
+    "created_at",
+]
+PAYMENTS_HEADER = [
+    "tg_id",
+    "username",
+    "first_name",
+    "last_name",
+    "amount",
+    "payment_system",
+    "status",
+    "created_at",
+]
+HOT_LEADS_HEADER = ["tg_id", "username", "first_name", "last_name", "updated_at"]
+KEYS_HEADER = [
+    "tg_id",
+    "client_id",
+    "email",
+    "created_at",
+    "expiry_time",
+    "key",
+    "server_id",
+    "is_frozen",
+    "alias",
+    "tariff",
+]
+
+
+class SpooledInputFile(InputFile):
+    """Отправляет в Telegram уже записанный файл экспорта частями, не загружая его в память целиком."""
+
+    def __init__(self, file: IO[bytes], filename: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> None:
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "SpooledInputFile":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+async def iter_csv_chunks(
+    session: AsyncSession,
+    query: Select,
+    header: Sequence[str],
+    row_formatter: Callable[[Any], Sequence[Any]] | None = None,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Построчно кодирует результат запроса в CSV (UTF-8 с BOM) и отдаёт его кусками по EXPORT_BATCH_SIZE строк.
+
+    Строки читаются серверным курсором, поэтому в памяти одновременно находится только одна пачка.
+    При compress=True куски сжимаются в gzip-поток.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def flush(final: bool = False) -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor:
+            data = compressor.compress(data)
+            if final:
+                data += compressor.flush()
+        return data
+
+    buffer.write("\ufeff")
+    writer.writerow(header)
+
+    result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        if row_formatter:
+            rows = [row_formatter(row) for row in rows]
+        writer.writerows(rows)
+        if chunk := flush():
+            yield chunk
+
+    if chunk := flush(final=True):
+        yield chunk
+
+
+async def write_csv_export(
+    session: AsyncSession,
+    query: Select,
+    header: Sequence[str],
+    filename: str,
+    row_formatter: Callable[[Any], Sequence[Any]] | None = None,
+    compress: bool = False,
+) -> SpooledInputFile:
+    """Записывает экспорт во временный файл, который остаётся в памяти до EXPORT_SPOOL_MAX_SIZE."""
+    file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+    try:
+        async for chunk in iter_csv_chunks(session, query, header, row_formatter, compress):
+            file.write(chunk)
+    except Exception:
+        file.close()
+        raise
+
+    return SpooledInputFile(file, f"{filename}.gz" if compress else filename)
+
+
+def users_export_query() -> Select:
+    return select(
         User.tg_id,
         User.username,
         User.first_name,
@@ -23,31 +152,8 @@ async def export_users_csv(session: AsyncSession) -> BufferedInputFile:
         User.created_at,
     ).order_by(User.created_at.asc())
 
-    result = await session.execute(query)
-    users = result.all()
 
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow([
-        "tg_id",
-        "username",
-        "first_name",
-        "last_name",
-        "language_code",
-        "is_bot",
-        "balance",
-        "trial",
-        "created_at",
-    ])
-
-    for user in users:
-        writer.writerow(user)
-
-    buffer.seek(0)
-    return BufferedInputFile(file=buffer.getvalue().encode("utf-8-sig"), filename="users_export.csv")
-
-
-async def export_payments_csv(session: AsyncSession) -> BufferedInputFile:
+def payments_export_query(tg_id: int | None = None) -> Select:
     j = join(User, Payment, User.tg_id == Payment.tg_id)
     query = (
         select(
@@ -63,56 +169,93 @@ async def export_payments_csv(session: AsyncSession) -> BufferedInputFile:
         .select_from(j)
         .order_by(Payment.created_at.asc())
     )
+    if tg_id is not None:
+        query = query.where(User.tg_id == tg_id)
+    return query
 
-    result = await session.execute(query)
-    payments = result.all()
-
-    return _export_payments_csv(payments, "payments_export.csv")
 
+def hot_leads_export_query() -> Select:
+    now_ts = int(datetime.utcnow().timestamp() * 1000)
 
-async def export_user_payments_csv(tg_id: int, session: AsyncSession) -> BufferedInputFile:
-    j = join(User, Payment, User.tg_id == Payment.tg_id)
-    query = (
+    return (
         select(
             User.tg_id,
             User.username,
             User.first_name,
             User.last_name,
-            Payment.amount,
-            Payment.payment_system,
-            Payment.status,
-            Payment.created_at,
+            User.updated_at,
+        )
+        .where(
+            exists(
+                select(Payment.tg_id)
+                .where(Payment.tg_id == User.tg_id)
+                .where(Payment.status == "success")
+                .where(Payment.amount > 0)
+                .where(Payment.payment_system.notin_(["referral", "coupon", "cashback"]))
+            ),
+            not_(exists(select(Key.tg_id).where(Key.tg_id == User.tg_id).where(Key.expiry_time > now_ts))),
+        )
+        .order_by(User.updated_at.desc())
+    )
+
+
+def keys_export_query() -> Select:
+    j = join(Key, Tariff, Key.tariff_id == Tariff.id, isouter=True)
+    return (
+        select(
+            Key.tg_id,
+            Key.client_id,
+            Key.email,
+            Key.created_at,
+            Key.expiry_time,
+            Key.key,
+            Key.server_id,
+            Key.is_frozen,
+            Key.alias,
+            Tariff.name.label("tariff_name"),
         )
         .select_from(j)
-        .where(User.tg_id == tg_id)
-        .order_by(Payment.created_at.asc())
+        .order_by(Key.created_at.asc())
     )
 
-    result = await session.execute(query)
-    payments = result.all()
 
-    return _export_payments_csv(payments, f"payments_export_{tg_id}.csv")
+def format_key_row(row) -> list:
+    created_at = (
+        datetime.utcfromtimestamp(row.created_at / 1000).strftime("%Y-%m-%d %H:%M:%S") if row.created_at else ""
+    )
+    expiry_time = (
+        datetime.utcfromtimestamp(row.expiry_time / 1000).strftime("%Y-%m-%d %H:%M:%S") if row.expiry_time else ""
+    )
+    tariff = row.tariff_name or "—"
 
+    return [
+        row.tg_id,
+        row.client_id,
+        row.email,
+        created_at,
+        expiry_time,
+        row.key,
+        row.server_id,
+        row.is_frozen,
+        row.alias or "",
+        tariff,
+    ]
 
-def _export_payments_csv(payments, filename: str) -> BufferedInputFile:
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow([
-        "tg_id",
-        "username",
-        "first_name",
-        "last_name",
-        "amount",
-        "payment_system",
-        "status",
-        "created_at",
-    ])
 
-    for payment in payments:
-        writer.writerow(payment)
+async def export_users_csv(session: AsyncSession, compress: bool = False) -> SpooledInputFile:
+    return await write_csv_export(session, users_export_query(), USERS_HEADER, "users_export.csv", compress=compress)
 
-    buffer.seek(0)
-    return BufferedInputFile(file=buffer.getvalue().encode("utf-8-sig"), filename=filename)
+
+async def export_payments_csv(session: AsyncSession, compress: bool = False) -> SpooledInputFile:
+    return await write_csv_export(
+        session, payments_export_query(), PAYMENTS_HEADER, "payments_export.csv", compress=compress
+    )
+
+
+async def export_user_payments_csv(tg_id: int, session: AsyncSession) -> SpooledInputFile:
+    return await write_csv_export(
+        session, payments_export_query(tg_id), PAYMENTS_HEADER, f"payments_export_{tg_id}.csv"
+    )
 
 
 async def export_referrals_csv(referrer_tg_id: int, session: AsyncSession) -> BufferedInputFile | None:
@@ -152,104 +295,13 @@ async def export_referrals_csv(referrer_tg_id: int, session: AsyncSession) -> Bu
     )
 
 
-async def export_hot_leads_csv(session: AsyncSession) -> BufferedInputFile:
-    now_ts = int(datetime.utcnow().timestamp() * 1000)
-
-    stmt = (
-        select(
-            User.tg_id,
-            User.username,
-            User.first_name,
-            User.last_name,
-            User.updated_at,
-        )
-        .where(
-            exists(
-                select(Payment.tg_id)
-                .where(Payment.tg_id == User.tg_id)
-                .where(Payment.status == "success")
-                .where(Payment.amount > 0)
-                .where(Payment.payment_system.notin_(["referral", "coupon", "cashback"]))
-            ),
-            not_(exists(select(Key.tg_id).where(Key.tg_id == User.tg_id).where(Key.expiry_time > now_ts))),
-        )
-        .order_by(User.updated_at.desc())
-    )
-
-    result = await session.execute(stmt)
-    users = result.all()
-
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow(["tg_id", "username", "first_name", "last_name", "updated_at"])
-    for user in users:
-        writer.writerow(user)
-
-    buffer.seek(0)
-    return BufferedInputFile(
-        file=buffer.getvalue().encode("utf-8-sig"),
-        filename="hot_leads_export.csv",
+async def export_hot_leads_csv(session: AsyncSession, compress: bool = False) -> SpooledInputFile:
+    return await write_csv_export(
+        session, hot_leads_export_query(), HOT_LEADS_HEADER, "hot_leads_export.csv", compress=compress
     )
 
 
-async def export_keys_csv(session: AsyncSession) -> BufferedInputFile:
-    j = join(Key, Tariff, Key.tariff_id == Tariff.id, isouter=True)
-    query = (
-        select(
-            Key.tg_id,
-            Key.client_id,
-            Key.email,
-            Key.created_at,
-            Key.expiry_time,
-            Key.key,
-            Key.server_id,
-            Key.is_frozen,
-            Key.alias,
-            Tariff.name.label("tariff_name"),
-        )
-        .select_from(j)
-        .order_by(Key.created_at.asc())
+async def export_keys_csv(session: AsyncSession, compress: bool = False) -> SpooledInputFile:
+    return await write_csv_export(
+        session, keys_export_query(), KEYS_HEADER, "keys_export.csv", row_formatter=format_key_row, compress=compress
     )
-
-    result = await session.execute(query)
-    keys = result.all()
-
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow([
-        "tg_id",
-        "client_id",
-        "email",
-        "created_at",
-        "expiry_time",
-        "key",
-        "server_id",
-        "is_frozen",
-        "alias",
-        "tariff",
-    ])
-
-    for row in keys:
-        created_at = (
-            datetime.utcfromtimestamp(row.created_at / 1000).strftime("%Y-%m-%d %H:%M:%S") if row.created_at else ""
-        )
-        expiry_time = (
-            datetime.utcfromtimestamp(row.expiry_time / 1000).strftime("%Y-%m-%d %H:%M:%S") if row.expiry_time else ""
-        )
-        tariff = row.tariff_name or "—"
-
-        writer.writerow([
-            row.tg_id,
-            row.client_id,
-            row.email,
-            created_at,
-            expiry_time,
-            row.key,
-            row.server_id,
-            row.is_frozen,
-            row.alias or "",
-            tariff,
-        ])
-
-    buffer.seek(0)
-    return BufferedInputFile(file=buffer.getvalue().encode("utf-8-sig"), filename="keys_export.csv")
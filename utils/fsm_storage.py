@@ -0,0 +1,235 @@
+import asyncio
+import json
+import time
+import uuid
+
+from collections.abc import Mapping
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Any
+
+import config as cfg
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import (
+    FSM_NOTIFY_CHANNEL,
+    async_session_maker,
+    delete_expired_fsm_records,
+    get_fsm_record,
+    save_fsm_records,
+)
+from database.db import engine
+from logger import logger
+
+
+FSM_CACHE_TTL = getattr(cfg, "FSM_CACHE_TTL", 60)
+FSM_FLUSH_INTERVAL = getattr(cfg, "FSM_FLUSH_INTERVAL", 0.5)
+FSM_STATE_TTL_DAYS = getattr(cfg, "FSM_STATE_TTL_DAYS", 7)
+FSM_CLEANUP_INTERVAL = 3600
+FSM_LISTEN_RETRY_DELAY = 5
+
+Record = tuple[str | None, dict[str, Any]]
+
+
+def _to_json(data: dict[str, Any]) -> dict[str, Any]:
+    return json.loads(json.dumps(data, default=str))
+
+
+class PostgresStorage(BaseStorage):
+    """
+    Хранилище FSM в таблице fsm_states, общее для всех воркеров бота и переживающее перезапуск.
+
+    Состояние пишется в базу сразу вместе с накопленными данными этого ключа, остальные изменения
+    данных копятся в буфере и сохраняются пачкой раз в FSM_FLUSH_INTERVAL. Состояние и данные
+    обновляются в базе отдельными колонками. Прочитанные записи кешируются в процессе, пока
+    воркер слушает LISTEN fsm_states: каждая запись в базу рассылает NOTIFY, и остальные воркеры
+    сбрасывают кеш этого ключа. Без подписки чтения идут в базу напрямую.
+
+    Значения данных, которые не сериализуются в JSON, после перечитывания из базы становятся строками.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: float = FSM_CACHE_TTL,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        state_ttl: timedelta = timedelta(days=FSM_STATE_TTL_DAYS),
+    ) -> None:
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.instance_id = uuid.uuid4().hex
+        self._cache: dict[str, tuple[float, Record]] = {}
+        self._generation = 0
+        self._listening = False
+        self._dirty: dict[str, dict[str, Any]] = {}
+        self._writing: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._listener: asyncio.Task | None = None
+        self._listen_lost = asyncio.Event()
+        self._last_cleanup = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return (
+            f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}"
+        )
+
+    def _start_tasks(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_loop())
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _load(self, storage_key: str) -> Record:
+        self._start_tasks()
+        cached = self._cache.get(storage_key)
+        if self._listening and cached and time.monotonic() - cached[0] < self.cache_ttl:
+            state, data = cached[1]
+        else:
+            generation = self._generation
+            async with async_session_maker() as session:
+                state, data = await get_fsm_record(session, storage_key) or (None, {})
+            if self._listening and generation == self._generation:
+                self._cache[storage_key] = (time.monotonic(), (state, data))
+        return state, self._dirty.get(storage_key, data)
+
+    def _remember(self, storage_key: str, record: Record):
+        if self._listening:
+            self._cache[storage_key] = (time.monotonic(), record)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        state = state.state if isinstance(state, State) else state
+        _, data = await self._load(storage_key)
+
+        # Под блокировкой только забираем данные ключа, чтобы не разминуться с идущим flush;
+        # сама запись идёт без неё, и set_state разных пользователей не ждут друг друга.
+        async with self._flush_lock:
+            pending = self._dirty.pop(storage_key, None)
+            self._writing.add(storage_key)
+        try:
+            records = {storage_key: _to_json(pending)} if pending is not None else {}
+            async with async_session_maker() as session:
+                await save_fsm_records(session, {storage_key: state}, records, sender=self.instance_id)
+        except Exception:
+            if pending is not None:
+                self._dirty.setdefault(storage_key, pending)
+            raise
+        finally:
+            self._writing.discard(storage_key)
+        self._remember(storage_key, (state, self._dirty.get(storage_key, data)))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self._key(key)
+        state, _ = await self._load(storage_key)
+        self._dirty[storage_key] = dict(data)
+        self._remember(storage_key, (state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return data.copy()
+
+    async def flush(self):
+        """
+        Сохраняет накопленные данные; при ошибке они возвращаются в буфер, если не были перезаписаны.
+
+        Ключи, которые сейчас пишет set_state, ждут следующего сброса, чтобы более старая запись
+        set_state не легла в базу поверх более новых данных.
+        """
+        async with self._flush_lock:
+            pending = {key: data for key, data in self._dirty.items() if key not in self._writing}
+            if not pending:
+                return
+            for key in pending:
+                del self._dirty[key]
+            try:
+                records = {key: _to_json(data) for key, data in pending.items()}
+                async with async_session_maker() as session:
+                    await save_fsm_records(session, {}, records, sender=self.instance_id)
+            except Exception:
+                for key, data in pending.items():
+                    self._dirty.setdefault(key, data)
+                raise
+
+    def _on_notify(self, _connection: Any, _pid: int, _channel: str, payload: str):
+        sender, _, storage_key = payload.partition(" ")
+        if sender != self.instance_id:
+            self._generation += 1
+            self._cache.pop(storage_key, None)
+
+    def _on_terminate(self, _connection: Any):
+        self._listen_lost.set()
+
+    def _stop_caching(self):
+        self._listening = False
+        self._generation += 1
+        self._cache.clear()
+
+    async def _listen_loop(self):
+        """Держит отдельное соединение с LISTEN fsm_states; пока его нет, кеш чтений отключён."""
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    driver = (await conn.get_raw_connection()).driver_connection
+                    if not hasattr(driver, "add_listener"):
+                        logger.warning("[FSM] Драйвер БД не поддерживает LISTEN, кеш состояний отключён")
+                        return
+                    self._listen_lost = asyncio.Event()
+                    driver.add_termination_listener(self._on_terminate)
+                    await driver.add_listener(FSM_NOTIFY_CHANNEL, self._on_notify)
+                    self._generation += 1
+                    self._listening = True
+                    try:
+                        await self._listen_lost.wait()
+                    finally:
+                        self._stop_caching()
+                        driver.remove_termination_listener(self._on_terminate)
+                        with suppress(Exception):
+                            await driver.remove_listener(FSM_NOTIFY_CHANNEL, self._on_notify)
+                logger.warning("[FSM] Соединение LISTEN потеряно, переподключение...")
+            except Exception as e:
+                logger.error(f"[FSM] Не удалось подписаться на изменения состояний: {e}")
+            await asyncio.sleep(FSM_LISTEN_RETRY_DELAY)
+
+    async def _cleanup(self):
+        now = time.monotonic()
+        expired = [key for key, (cached_at, _) in self._cache.items() if now - cached_at >= self.cache_ttl]
+        for key in expired:
+            self._cache.pop(key, None)
+
+        if now - self._last_cleanup < FSM_CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        async with async_session_maker() as session:
+            deleted = await delete_expired_fsm_records(session, datetime.utcnow() - self.state_ttl)
+        if deleted:
+            logger.info(f"[FSM] Удалено устаревших состояний: {deleted}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                await self._cleanup()
+            except Exception as e:
+                logger.error(f"[FSM] Ошибка сохранения состояний: {e}")
+
+    async def close(self) -> None:
+        tasks = [task for task in (self._flusher, self._listener) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._flusher = self._listener = None
+        self._stop_caching()
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"[FSM] Не удалось сохранить состояния при остановке: {e}")
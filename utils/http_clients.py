@@ -0,0 +1,87 @@
+import asyncio
+
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+import config as cfg
+
+from logger import logger
+
+
+@dataclass(frozen=True)
+class HttpClientPolicy:
+    """Настройки пула соединений и повторов для группы внешних API."""
+
+    timeout: float = 30
+    connect_timeout: float = 10
+    limit_per_host: int = 20
+    keepalive_timeout: float = 60
+    retries: int = 0
+    retry_backoff: float = 0.5
+
+
+HTTP_CLIENT_POLICIES: dict[str, HttpClientPolicy] = {
+    "default": HttpClientPolicy(),
+    "payments": HttpClientPolicy(timeout=getattr(cfg, "PAYMENTS_HTTP_TIMEOUT", 60)),
+    "fx": HttpClientPolicy(timeout=10, connect_timeout=5, limit_per_host=4, retries=2),
+    "subscriptions": HttpClientPolicy(timeout=5, connect_timeout=3, limit_per_host=50),
+}
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_sessions: dict[str, aiohttp.ClientSession] = {}
+
+
+def get_http_session(name: str = "default") -> aiohttp.ClientSession:
+    """
+    Возвращает общий для приложения aiohttp.ClientSession с keep-alive пулом соединений по хостам.
+
+    Сессия создаётся при первом обращении и живёт до close_http_sessions, поэтому запросы к одному
+    провайдеру переиспользуют DNS-кеш и TLS-соединения. Закрывать её вызывающему коду не нужно.
+    """
+    session = _sessions.get(name)
+    if session is not None and not session.closed:
+        return session
+
+    policy = HTTP_CLIENT_POLICIES.get(name, HTTP_CLIENT_POLICIES["default"])
+    connector = aiohttp.TCPConnector(
+        limit_per_host=policy.limit_per_host,
+        keepalive_timeout=policy.keepalive_timeout,
+        ttl_dns_cache=300,
+    )
+    session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=policy.timeout, sock_connect=policy.connect_timeout),
+    )
+    _sessions[name] = session
+    return session
+
+
+async def request_with_retry(name: str, method: str, url: str, **kwargs: Any) -> tuple[int, bytes]:
+    """
+    Выполняет идемпотентный запрос через сессию name с повторами по политике клиента.
+
+    Повторяются ошибки соединения, таймауты и ответы из RETRY_STATUSES. Возвращает статус и тело ответа.
+    """
+    policy = HTTP_CLIENT_POLICIES.get(name, HTTP_CLIENT_POLICIES["default"])
+    for attempt in range(policy.retries + 1):
+        last_attempt = attempt == policy.retries
+        try:
+            async with get_http_session(name).request(method, url, **kwargs) as resp:
+                body = await resp.read()
+                if resp.status not in RETRY_STATUSES or last_attempt:
+                    return resp.status, body
+                logger.warning(f"[HTTP] {method} {url}: статус {resp.status}, повтор {attempt + 1}/{policy.retries}")
+        except (aiohttp.ClientConnectionError, TimeoutError) as e:
+            if last_attempt:
+                raise
+            logger.warning(f"[HTTP] {method} {url}: {e!r}, повтор {attempt + 1}/{policy.retries}")
+        await asyncio.sleep(policy.retry_backoff * 2**attempt)
+    raise RuntimeError("unreachable")
+
+
+async def close_http_sessions():
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    await asyncio.gather(*(session.close() for session in sessions if not session.closed), return_exceptions=True)
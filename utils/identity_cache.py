@@ -0,0 +1,130 @@
+import time
+
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any
+
+import config as cfg
+
+from config import ADMIN_ID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker
+from database.models import Admin, ManualBan
+
+
+IDENTITY_CACHE_SIZE = getattr(cfg, "IDENTITY_CACHE_SIZE", 50_000)
+ADMIN_CACHE_TTL = getattr(cfg, "ADMIN_CACHE_TTL", 300)
+BAN_CACHE_TTL = getattr(cfg, "BAN_CACHE_TTL", 30)
+USER_CACHE_TTL = getattr(cfg, "USER_CACHE_TTL", 60)
+
+MISSING = object()
+
+CONFIG_ADMIN_IDS: frozenset[int] = frozenset(ADMIN_ID if isinstance(ADMIN_ID, list | tuple) else [ADMIN_ID])
+
+
+class TTLCache:
+    """LRU-кеш ограниченного размера, записи которого живут не дольше ttl секунд."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Any):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+admin_roles = TTLCache(IDENTITY_CACHE_SIZE, ADMIN_CACHE_TTL)
+bans = TTLCache(IDENTITY_CACHE_SIZE, BAN_CACHE_TTL)
+users = TTLCache(IDENTITY_CACHE_SIZE, USER_CACHE_TTL)
+
+
+async def get_admin_role(
+    tg_id: int, session_factory: Callable[[], AsyncSession] = async_session_maker
+) -> str | None:
+    """
+    Возвращает роль администратора или None, если пользователь не админ.
+
+    Промах кеша читается в отдельной короткой сессии, чтобы не занимать соединение сессии хендлера.
+    """
+    if tg_id in CONFIG_ADMIN_IDS:
+        return "superadmin"
+
+    role = admin_roles.get(tg_id)
+    if role is MISSING:
+        async with session_factory() as session:
+            role = await session.scalar(select(Admin.role).where(Admin.tg_id == tg_id))
+        admin_roles.set(tg_id, role)
+    return role
+
+
+async def get_ban(tg_id: int, session_factory: Callable[[], AsyncSession] = async_session_maker) -> dict | None:
+    """Возвращает действующий ручной бан пользователя ({"reason", "until"}) или None."""
+    ban_info = bans.get(tg_id)
+    if ban_info is not MISSING:
+        if ban_info and ban_info["until"] and ban_info["until"] <= datetime.now(timezone.utc):
+            bans.pop(tg_id)
+            return None
+        return ban_info
+
+    async with session_factory() as session:
+        row = (
+            await session.execute(
+                select(ManualBan.reason, ManualBan.until)
+                .where(
+                    ManualBan.tg_id == tg_id,
+                    (ManualBan.until.is_(None)) | (ManualBan.until > datetime.utcnow()),
+                )
+                .limit(1)
+            )
+        ).first()
+    ban_info = {"reason": row.reason or "не указана", "until": row.until} if row else None
+    bans.set(tg_id, ban_info)
+    return ban_info
+
+
+def invalidate_admin(tg_id: int | None = None):
+    """Сбрасывает закешированную роль админа; без tg_id сбрасывает все роли."""
+    if tg_id is None:
+        admin_roles.clear()
+    else:
+        admin_roles.pop(tg_id)
+
+
+def invalidate_ban(tg_id: int | None = None):
+    """Сбрасывает закешированный бан пользователя; без tg_id сбрасывает все баны."""
+    if tg_id is None:
+        bans.clear()
+    else:
+        bans.pop(tg_id)
+
+
+def invalidate_user(tg_id: int | None = None):
+    """Сбрасывает закешированную строку пользователя; без tg_id сбрасывает всех пользователей."""
+    if tg_id is None:
+        users.clear()
+    else:
+        users.pop(tg_id)
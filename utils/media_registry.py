@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import os
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import aiofiles
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import BufferedInputFile
+
+from database import async_session_maker, get_media_file_ids, save_media_file_id
+from logger import logger
+
+
+_file_ids: dict[tuple[str, str], str] = {}
+_hashes: dict[str, tuple[int, int, str]] = {}
+_upload_locks: dict[tuple[str, str], asyncio.Lock] = {}
+_loaded = False
+_load_lock = asyncio.Lock()
+_MISS = object()
+
+
+async def get_content_hash(path: str) -> str:
+    """SHA-256 содержимого файла; пересчитывается только при изменении mtime или размера."""
+    stat = os.stat(path)
+    cached = _hashes.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    async with aiofiles.open(path, "rb") as f:
+        data = await f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    _hashes[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+    return content_hash
+
+
+async def _ensure_loaded():
+    global _loaded
+    if _loaded:
+        return
+    async with _load_lock:
+        if _loaded:
+            return
+        try:
+            async with async_session_maker() as session:
+                _file_ids.update(await get_media_file_ids(session))
+        except Exception as e:
+            logger.warning(f"[Media] Не удалось загрузить сохранённые file_id: {e}")
+        _loaded = True
+
+
+async def _remember_file_id(path: str, content_hash: str, file_id: str, media_type: str):
+    if _file_ids.get((path, content_hash)) == file_id:
+        return
+    _file_ids[(path, content_hash)] = file_id
+    try:
+        async with async_session_maker() as session:
+            await save_media_file_id(session, path, content_hash, file_id, media_type)
+    except Exception as e:
+        logger.warning(f"[Media] Не удалось сохранить file_id для {path}: {e}")
+
+
+def extract_file_id(message: Any) -> str | None:
+    if getattr(message, "photo", None):
+        return message.photo[-1].file_id
+    if getattr(message, "video", None):
+        return message.video.file_id
+    if getattr(message, "animation", None):
+        return message.animation.file_id
+    return None
+
+
+async def _try_send(path: str, send: Callable[[Any], Awaitable[Any]], file_id: str) -> Any:
+    try:
+        return await send(file_id)
+    except (TelegramForbiddenError, TelegramRetryAfter):
+        raise
+    except Exception as e:
+        logger.debug(f"[Media] Не удалось отправить {path} по file_id, загружаем заново: {e}")
+        return _MISS
+
+
+async def _upload(
+    path: str, content_hash: str, send: Callable[[Any], Awaitable[Any]], media_type: str, use_cache: bool
+) -> Any:
+    async with aiofiles.open(path, "rb") as f:
+        data = await f.read()
+    result = await send(BufferedInputFile(data, filename=os.path.basename(path)))
+
+    file_id = extract_file_id(result)
+    if use_cache and file_id:
+        await _remember_file_id(path, content_hash, file_id, media_type)
+    return result
+
+
+async def send_cached_media(
+    path: str,
+    send: Callable[[Any], Awaitable[Any]],
+    media_type: str = "photo",
+    use_cache: bool = True,
+) -> Any:
+    """
+    Отправляет файл через send(media), подставляя сохранённый Telegram file_id вместо загрузки байтов.
+
+    file_id хранится в таблице media_files по пути и хешу содержимого, поэтому переживает перезапуск
+    и сбрасывается при замене файла. Первую загрузку одного файла выполняет только один отправитель,
+    остальные ждут её file_id.
+    """
+    path = os.path.normpath(path)
+    content_hash = await get_content_hash(path)
+    if not use_cache:
+        return await _upload(path, content_hash, send, media_type, use_cache=False)
+
+    await _ensure_loaded()
+    key = (path, content_hash)
+    tried = _file_ids.get(key)
+    if tried:
+        result = await _try_send(path, send, tried)
+        if result is not _MISS:
+            return result
+
+    async with _upload_locks.setdefault(key, asyncio.Lock()):
+        file_id = _file_ids.get(key)
+        if file_id and file_id != tried:
+            result = await _try_send(path, send, file_id)
+            if result is not _MISS:
+                return result
+        return await _upload(path, content_hash, send, media_type, use_cache=True)
@@ -1,8 +1,6 @@
 import base64
 import json
 
-import aiohttp
-
 from aiohttp import web
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
@@ -11,16 +9,17 @@ from cryptography.hazmat.primitives.asymmetric import padding
 from database import add_payment, async_session_maker, update_balance
 from handlers.payments.utils import send_payment_success_notification
 from logger import logger
+from utils.http_clients import get_http_session
 
 
 PUBLIC_KEY_URL = "https://api.wata.pro/api/h2h/public-key"
 
 
 async def get_wata_public_key():
-    async with aiohttp.ClientSession() as session:
-        async with session.get(PUBLIC_KEY_URL) as resp:
-            data = await resp.json()
-            return data["value"].encode()
+    session = get_http_session("payments")
+    async with session.get(PUBLIC_KEY_URL) as resp:
+        data = await resp.json()
+        return data["value"].encode()
 
 
 async def verify_signature(raw_json: bytes, signature: str, public_key_pem: bytes) -> bool: